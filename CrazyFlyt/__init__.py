@@ -1,4 +1,20 @@
 """Library to control a swarm of Crazyflie drones along with a PyFlyt digital twin."""
+from . import formations, sequences  # noqa: F401
+from .distributed import Coordinator, Worker, serve_worker  # noqa: F401
 from .drone_controller import DroneController  # noqa: F401
+from .geofence import Geofence  # noqa: F401
+from .health_monitor import HealthMonitor  # noqa: F401
+from .link_planner import LinkPlanner  # noqa: F401
+from .metrics import MetricsServer  # noqa: F401
+from .network_bridge import GroundStation, RemoteSwarm  # noqa: F401
+from .point_mass import PointMassAviary  # noqa: F401
+from .profiler import Profiler  # noqa: F401
+from .relative_formation import RelativeFormation  # noqa: F401
+from .setpoint_stream import SetpointStream  # noqa: F401
+from .show import Show, ShowRecorder  # noqa: F401
 from .simulator import Simulator  # noqa: F401
+from .state_bus import StateBus  # noqa: F401
+from .state_estimator import StateEstimator  # noqa: F401
 from .swarm_controller import SwarmController  # noqa: F401
+from .system_id import SystemIdentifier, load_flight_log  # noqa: F401
+from .trajectory import Trajectory  # noqa: F401
@@ -0,0 +1,412 @@
+"""Coordinator and workers for sharding one swarm across several ground station processes or hosts."""
+import socket
+import struct
+import time
+
+import numpy as np
+
+from .network_bridge import (
+    ACK,
+    FLAG_POS_CONTROL,
+    HEADER,
+    MAX_PACKET_BYTES,
+    MSG_TELEMETRY,
+)
+
+MSG_TICK = 4
+MSG_PING = 5
+MSG_PONG = 6
+MSG_END = 7
+
+# ticks additionally carry the tick period in seconds, ahead of the (n, 4) setpoints and the (n, ) arm mask
+TICK = struct.Struct("<d")
+
+
+class Worker:
+    """Worker.
+
+    Owns a subset of the swarm, either a SwarmController with its own radios, or a Simulator standing in for one.
+
+    Every tick from the coordinator carries this worker's shard of the setpoints and arm mask, and the time to apply them on this worker's clock,
+    so that all workers switch setpoints at the same instant, and a lost packet never leaves a drone in the wrong arm state for more than a tick.
+    The arm mask is only applied when it changes, so drones disarmed locally, such as on a link loss, stay disarmed until armed again.
+    Simulated shards are also stepped by one tick period per tick, which keeps a simulated fleet in exact lockstep.
+    After applying a tick, the worker answers with its position estimates tagged with the tick number.
+    """
+
+    def __init__(self, swarm, host: str = "127.0.0.1", port: int = 5770):
+        """__init__.
+
+        Args:
+            swarm (SwarmController | Simulator): the drones this worker owns
+            host (str): address to bind to, use "0.0.0.0" to serve the whole LAN
+            port (int): UDP port to bind to
+        """
+        self.swarm = swarm
+        self.simulated = hasattr(swarm, "elapsed_time")
+        self.pos_control = None
+        self.armed = None
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.5)
+
+        self.ticks = 0
+        self.late_ticks = 0
+        self.dropped_packets = 0
+        self.running = True
+
+    @property
+    def address(self):
+        """address."""
+        return self.sock.getsockname()
+
+    def serve(self):
+        """Handles coordinator packets until the coordinator ends the session."""
+        while self.running:
+            try:
+                data, address = self.sock.recvfrom(MAX_PACKET_BYTES)
+            except socket.timeout:
+                continue
+            self._handle(data, address)
+
+    def close(self):
+        """close."""
+        self.running = False
+        self.sock.close()
+
+    def _handle(self, data: bytes, address):
+        """_handle.
+
+        Args:
+            data (bytes): raw packet
+            address: address of the coordinator
+        """
+        if len(data) < HEADER.size:
+            self.dropped_packets += 1
+            return
+        msg_type, flags, num_drones, sequence, send_time = HEADER.unpack_from(data)
+
+        if msg_type == MSG_PING:
+            # answer with our own clock and the size of our shard, echoing the coordinator's send time
+            self.sock.sendto(
+                HEADER.pack(MSG_PONG, 0, self.swarm.num_drones, sequence, time.time())
+                + ACK.pack(sequence, send_time),
+                address,
+            )
+            return
+
+        if msg_type == MSG_END:
+            self.running = False
+            return
+
+        if num_drones != self.swarm.num_drones:
+            print(
+                f"Dropping packet from {address} for {num_drones} drones, owning {self.swarm.num_drones} drones."
+            )
+            self.dropped_packets += 1
+            return
+
+        # a malformed tick is dropped rather than allowed to take the worker down
+        if (
+            msg_type != MSG_TICK
+            or len(data) != HEADER.size + TICK.size + 20 * num_drones
+        ):
+            self.dropped_packets += 1
+            return
+        self._tick(data, flags, num_drones, sequence, send_time, address)
+
+    def _tick(self, data, flags, num_drones, sequence, apply_time, address):
+        """Applies one tick of setpoints at its scheduled time and reports back.
+
+        Args:
+            data (bytes): raw packet
+            flags (int): flags
+            num_drones (int): number of drones in the shard
+            sequence (int): tick number
+            apply_time (float): time to apply the setpoints on this worker's clock
+            address: address of the coordinator
+        """
+        (period,) = TICK.unpack_from(data, HEADER.size)
+        payload = np.frombuffer(data, dtype="<f4", offset=HEADER.size + TICK.size)
+        split = 4 * num_drones
+        setpoints = payload[:split].reshape(num_drones, 4)
+        armed = payload[split:] > 0.5
+
+        wait = apply_time - time.time()
+        if wait > 0.0:
+            time.sleep(wait)
+        else:
+            self.late_ticks += 1
+
+        pos_control = bool(flags & FLAG_POS_CONTROL)
+        if pos_control != self.pos_control:
+            self.swarm.set_pos_control(pos_control)
+            self.pos_control = pos_control
+        self.swarm.set_setpoints(setpoints.astype(np.float64))
+        if self.armed is None or np.any(armed != self.armed):
+            self.swarm.arm(armed)
+            self.armed = armed
+        if self.simulated:
+            self.swarm.sleep(period)
+        self.ticks += 1
+
+        states = np.asarray(self.swarm.position_estimate, dtype="<f4")
+        self.sock.sendto(
+            HEADER.pack(MSG_TELEMETRY, 0, len(states), sequence, time.time())
+            + ACK.pack(sequence, apply_time)
+            + states.tobytes(),
+            address,
+        )
+
+
+def serve_worker(make_swarm, host: str = "127.0.0.1", port: int = 5770):
+    """Builds a swarm and serves it as a worker until the coordinator ends the session, for use as a process target.
+
+    Args:
+        make_swarm: picklable function taking no arguments that returns a SwarmController or Simulator
+        host (str): address to bind to
+        port (int): UDP port to bind to
+    """
+    worker = Worker(make_swarm(), host, port)
+    try:
+        worker.serve()
+    finally:
+        worker.close()
+
+
+class Coordinator:
+    """Coordinator.
+
+    Drives several workers as one swarm, with the same interface as a SwarmController.
+    Drones are numbered worker by worker, in the order the workers are given.
+
+    Each worker's clock offset is measured on startup from the fastest of several ping round trips.
+    Every tick sends each worker its shard of the setpoints together with a common apply time, `lead` seconds ahead,
+    then waits until the next tick is due for every worker's telemetry of that tick.
+    Workers that do not answer in time have their misses counted, and their drones keep their last telemetry.
+    """
+
+    def __init__(
+        self,
+        workers: list[tuple[str, int]],
+        rate_hz: float = 40.0,
+        num_pings: int = 10,
+        timeout: float = 5.0,
+    ):
+        """__init__.
+
+        Args:
+            workers (list[tuple[str, int]]): (host, port) of every worker
+            rate_hz (float): tick rate
+            num_pings (int): round trips used to measure each worker's clock offset
+            timeout (float): seconds to wait for each worker to answer on startup
+        """
+        # resolved, so that they match the addresses telemetry arrives from
+        self.workers = [(socket.gethostbyname(host), port) for host, port in workers]
+        self.period = 1.0 / rate_hz
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.settimeout(0.05)
+
+        # clock offsets and shard sizes, from the ping exchange
+        self.clock_offset = np.zeros((len(self.workers),))
+        self.round_trip = np.full((len(self.workers),), np.inf)
+        shard_sizes = [
+            self._synchronize(i, num_pings, timeout) for i in range(len(self.workers))
+        ]
+        self.shard_offsets = np.concatenate(([0], np.cumsum(shard_sizes)))
+
+        # setpoints are applied a little after they are sent, enough for the slowest worker to receive them
+        self.lead = float(np.max(self.round_trip)) + 0.002
+
+        self.pos_control = False
+        self.setpoints = np.zeros((self.num_drones, 4))
+        self.arm_mask = np.zeros((self.num_drones,), dtype=bool)
+        self.position_estimate = np.full((self.num_drones, 4), np.nan)
+        self.telemetry_tick = np.zeros((len(self.workers),), dtype=np.int64)
+        self.missed_ticks = np.zeros((len(self.workers),), dtype=np.int64)
+        self.tick = 0
+        self.next_tick = time.time()
+
+    def _shard(self, worker: int) -> slice:
+        """Rows of the swarm owned by a worker.
+
+        Args:
+            worker (int): index of the worker
+        """
+        return slice(self.shard_offsets[worker], self.shard_offsets[worker + 1])
+
+    def _synchronize(self, worker: int, num_pings: int, timeout: float) -> int:
+        """Measures a worker's clock offset from the fastest of several ping round trips.
+
+        Args:
+            worker (int): index of the worker
+            num_pings (int): number of round trips
+            timeout (float): seconds to wait for the worker to answer at all
+
+        Returns:
+            int: number of drones the worker owns
+        """
+        num_drones = None
+        deadline = time.time() + timeout
+        pongs = 0
+        while pongs < num_pings:
+            assert (
+                time.time() < deadline
+            ), f"No answer from worker at {self.workers[worker]}."
+
+            sent = time.time()
+            self.sock.sendto(
+                HEADER.pack(MSG_PING, 0, 0, pongs + 1, sent), self.workers[worker]
+            )
+            try:
+                data, address = self.sock.recvfrom(MAX_PACKET_BYTES)
+            except socket.timeout:
+                continue
+            received = time.time()
+
+            if len(data) < HEADER.size + ACK.size:
+                continue
+            msg_type, _, num_drones, _, worker_time = HEADER.unpack_from(data)
+            _, echoed = ACK.unpack_from(data, HEADER.size)
+            if msg_type != MSG_PONG or echoed != sent:
+                continue
+
+            # the worker read its clock roughly halfway through the round trip
+            pongs += 1
+            if received - sent < self.round_trip[worker]:
+                self.round_trip[worker] = received - sent
+                self.clock_offset[worker] = worker_time - (sent + received) / 2.0
+
+        return num_drones or 0
+
+    @property
+    def num_drones(self):
+        """num_drones."""
+        return int(self.shard_offsets[-1])
+
+    @property
+    def connected(self):
+        """(n, ) mask of drones that reported usable telemetry."""
+        return np.all(np.isfinite(self.position_estimate), axis=-1)
+
+    def set_pos_control(self, setting: bool):
+        """set_pos_control.
+
+        Args:
+            setting (bool): whether to set all drones to pos control, applied with the next tick
+        """
+        self.pos_control = setting
+
+    def set_setpoints(self, setpoints: np.ndarray):
+        """set_setpoints.
+
+        Args:
+            setpoints (np.ndarray): (n, 4) array for setpoint corresponding to (x, y, z, yaw) or (vx, vy, vz, vyaw), sent on the next tick
+        """
+        assert (
+            len(setpoints) == self.num_drones
+        ), "number of setpoints must be equal to number of drones"
+        self.setpoints = np.array(setpoints, dtype=np.float64)
+
+    def arm(self, settings: list[bool] | np.ndarray):
+        """Sets the arm mask, carried to every worker with each tick so that a lost packet is made up for by the next one.
+
+        Args:
+            settings (list[bool] | np.ndarray): (n, ) list of booleans corresponding to which drones to arm
+        """
+        assert (
+            len(settings) == self.num_drones
+        ), "masks length must be equal to number of drones"
+        self.arm_mask = np.array(settings, dtype=bool)
+
+    @property
+    def armed(self):
+        """(n, ) mask of drones commanded to be armed."""
+        return self.arm_mask.copy()
+
+    def sleep(self, seconds: float):
+        """Runs ticks for some time.
+
+        Args:
+            seconds (float): seconds
+        """
+        for _ in range(max(int(round(seconds / self.period)), 1)):
+            self._tick()
+
+    def _tick(self):
+        """Sends one tick to every worker and gathers their telemetry until the next tick is due."""
+        self.tick += 1
+        now = time.time()
+        self.next_tick = max(self.next_tick, now)
+        apply_time = self.next_tick + self.lead
+
+        flags = FLAG_POS_CONTROL if self.pos_control else 0
+        setpoints = self.setpoints.astype("<f4")
+        arm_mask = self.arm_mask.astype("<f4")
+        for i, worker in enumerate(self.workers):
+            shard = self._shard(i)
+            self.sock.sendto(
+                HEADER.pack(
+                    MSG_TICK,
+                    flags,
+                    shard.stop - shard.start,
+                    self.tick,
+                    apply_time + self.clock_offset[i],
+                )
+                + TICK.pack(self.period)
+                + setpoints[shard].tobytes()
+                + arm_mask[shard].tobytes(),
+                worker,
+            )
+
+        # lockstep, collect this tick from every worker before starting the next
+        self.next_tick += self.period
+        while np.any(self.telemetry_tick < self.tick):
+            remaining = self.next_tick - time.time()
+            if remaining <= 0.0:
+                break
+            self.sock.settimeout(remaining)
+            try:
+                data, address = self.sock.recvfrom(MAX_PACKET_BYTES)
+            except socket.timeout:
+                break
+            self._receive(data, address)
+
+        self.missed_ticks += self.telemetry_tick < self.tick
+
+        remaining = self.next_tick - time.time()
+        if remaining > 0.0:
+            time.sleep(remaining)
+
+    def _receive(self, data: bytes, address):
+        """Stores a worker's telemetry into its rows of the aggregated estimate.
+
+        Args:
+            data (bytes): raw packet
+            address: address of the worker
+        """
+        if address not in self.workers or len(data) < HEADER.size + ACK.size:
+            return
+        msg_type, _, num_drones, sequence, _ = HEADER.unpack_from(data)
+        worker = self.workers.index(address)
+        if msg_type != MSG_TELEMETRY or sequence <= self.telemetry_tick[worker]:
+            return
+        shard = self._shard(worker)
+        if (
+            num_drones != shard.stop - shard.start
+            or len(data) != HEADER.size + ACK.size + 16 * num_drones
+        ):
+            return
+
+        self.position_estimate[shard] = np.frombuffer(
+            data, dtype="<f4", offset=HEADER.size + ACK.size
+        ).reshape(num_drones, 4)
+        self.telemetry_tick[worker] = sequence
+
+    def end(self):
+        """Ends the session on every worker."""
+        for worker in self.workers:
+            self.sock.sendto(HEADER.pack(MSG_END, 0, 0, 0, time.time()), worker)
+        self.sock.close()
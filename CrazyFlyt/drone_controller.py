@@ -2,16 +2,105 @@
 import math
 import threading
 import time
+from struct import Struct
 
 import cflib.crtp
 import numpy as np
 from cflib.crazyflie import Crazyflie
+from cflib.crazyflie.commander import (
+    SET_SETPOINT_CHANNEL,
+    TYPE_POSITION,
+    TYPE_STOP,
+    TYPE_VELOCITY_WORLD,
+    TYPE_VELOCITY_WORLD_LEGACY,
+)
 from cflib.crazyflie.log import LogConfig
+from cflib.crazyflie.mem import MemoryElement, Poly4D
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+from cflib.crtp.crtpstack import CRTPPacket, CRTPPort
 
 # from cflib.positioning.motion_commander import MotionCommander
 from cflib.utils import uri_helper
 
+# generic commander payloads, the same layout the cflib commander packs on every send
+SETPOINT = Struct("<Bffff")
+STOP_SETPOINT = Struct("<B").pack(TYPE_STOP)
+
+# the position log block, four floats in the order they are added
+POSITION_LOG = Struct("<ffff")
+
+
+def pack_setpoint(
+    setpoint: np.ndarray,
+    rad_to_deg: np.ndarray,
+    pos_control: bool,
+    legacy: bool = False,
+) -> bytes:
+    """Packs a setpoint into a generic commander payload.
+
+    Args:
+        setpoint (np.ndarray): (4, ) array for setpoint corresponding to (x, y, z, yaw) or (vx, vy, vz, vyaw)
+        rad_to_deg (np.ndarray): (4, ) array of unit conversions applied to the setpoint
+        pos_control (bool): whether the setpoint is a position or a velocity
+        legacy (bool): whether the firmware only knows the legacy velocity setpoint, which has its yaw rate flipped
+
+    Returns:
+        bytes: payload for the generic commander port
+    """
+    x, y, z, yaw = (np.asarray(setpoint, dtype=np.float64) * rad_to_deg).tolist()
+    if pos_control:
+        return SETPOINT.pack(TYPE_POSITION, x, y, z, yaw)
+    if legacy:
+        return SETPOINT.pack(TYPE_VELOCITY_WORLD_LEGACY, x, y, z, -yaw)
+    return SETPOINT.pack(TYPE_VELOCITY_WORLD, x, y, z, yaw)
+
+
+def poly4d_pieces(durations: np.ndarray, coefficients: np.ndarray) -> list[Poly4D]:
+    """Lays out one drone's share of a trajectory as pieces of the onboard trajectory memory.
+
+    Args:
+        durations (np.ndarray): (m, ) array of durations for each of the m pieces
+        coefficients (np.ndarray): (m, 4, 8) array of polynomial coefficients for [x, y, z, yaw]
+
+    Returns:
+        list[Poly4D]: pieces, each packing into 132 bytes of trajectory memory
+    """
+    return [
+        Poly4D(float(duration), *[Poly4D.Poly(list(c)) for c in coefficient])
+        for duration, coefficient in zip(durations, coefficients)
+    ]
+
+
+class PositionLogConfig(LogConfig):
+    """PositionLogConfig.
+
+    Position log block that decodes each sample straight into positional floats,
+    skipping the per variable lookups and the dictionary that `LogConfig` builds for every sample.
+    """
+
+    def __init__(self, callback, period_in_ms: int = 10):
+        """__init__.
+
+        Args:
+            callback: called with (timestamp, x, y, z, yaw) for every sample, yaw in degrees as logged
+            period_in_ms (int): logging period
+        """
+        super().__init__(name="Position", period_in_ms=period_in_ms)
+        self.add_variable("stateEstimate.x", "float")
+        self.add_variable("stateEstimate.y", "float")
+        self.add_variable("stateEstimate.z", "float")
+        self.add_variable("stateEstimate.yaw", "float")
+        self.callback = callback
+
+    def unpack_log_data(self, log_data, timestamp):
+        """Decodes one sample.
+
+        Args:
+            log_data: raw sample bytes
+            timestamp: timestamp
+        """
+        self.callback(timestamp, *POSITION_LOG.unpack_from(log_data))
+
 
 class DroneController:
     """DroneController.
@@ -19,33 +108,83 @@ class DroneController:
     Class for controlling a single Crazyflie UAV.
     """
 
-    def __init__(self, URI, in_swarm=False):
+    def __init__(
+        self,
+        URI,
+        in_swarm=False,
+        control_hz: float = 40.0,
+        adaptive: bool = False,
+        setpoint_threshold: float = 0.01,
+        keepalive_period: float = 0.25,
+        link_timeout: float = 1.0,
+        min_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
         """__init__.
 
         Args:
             URI: URI of the drone
             in_swarm: whether the drone is operating in a swarm, this just adds a delay before initialization.
+            control_hz (float): rate at which setpoints are streamed to the drone
+            adaptive (bool): only send setpoints when they change by more than `setpoint_threshold`, or when `keepalive_period` runs out
+            setpoint_threshold (float): smallest change in any setpoint element that triggers a send in adaptive mode
+            keepalive_period (float): longest time between sends in adaptive mode, must be within the onboard commander timeout of 0.5s
+            link_timeout (float): seconds without telemetry after which the link is considered lost
+            min_backoff (float): delay before the first reconnection attempt
+            max_backoff (float): longest delay between reconnection attempts, the delay doubles after every failure
         """
-        self.period = 1 / 40.0
+        self.set_control_rate(control_hz)
+        self.adaptive = adaptive
+        self.setpoint_threshold = setpoint_threshold
+        self.keepalive_period = keepalive_period
+        self.packets_sent = 0
+
+        # counters for `MetricsServer`
+        self.telemetry_samples = 0
+        self.connects = 0
+        self.connect_failures = 0
+        self.link_losses = 0
+        self.connect_time = math.nan
+        self.ticks = 0
+        self.tick_latency = 0.0
         URI = uri_helper.uri_from_env(default=URI)
 
         self.running = False
         self.flow_deck_attached = False
 
         self.position_estimate = np.array([0.0, 0.0, 0.0, 0.0])
+        self.position_timestamp = -math.inf
         self.setpoint = np.array([0.0, 0.0, 0.0, 0.0])
+        self.setpoint_values = (0.0, 0.0, 0.0, 0.0)
+
+        # telemetry samples paired with the setpoint in force, see `start_recording`
+        self.flight_log = None
+
+        self.battery_voltage = math.nan
+        self.rssi = math.nan
+        self.link_quality = math.nan
 
         self.pos_control = False
+        self.high_level = False
         self.rad_to_deg = np.array([1.0, 1.0, 1.0, math.pi / 180.0])
+        self.deg_to_rad = math.pi / 180.0
+
+        # the commander payload is packed once per setpoint or mode change, not on every send
+        self.legacy_velocity = False
+        self.setpoint_packet = pack_setpoint(self.setpoint, self.rad_to_deg, False)
 
-        # make connection
+        # make connection, a failed connection is retried in the background
+        self.URI = URI
         self.scf = None
-        try:
-            cflib.crtp.init_drivers()
-            self.scf = SyncCrazyflie(URI, cf=Crazyflie(rw_cache="./cache"))
-            self.scf.open_link()
-        except Exception as e:
-            print(f"Failed to open link with Flier on {URI}, {e}.")
+        self.health_thread = None
+        self.connection_state = "disconnected"
+        self.connection_lock = threading.Lock()
+        self.link_timeout = link_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = min_backoff
+        cflib.crtp.init_drivers()
+        self._connect()
 
         # update the onboard PIDs
         # self.param_set("posCtlPid", "xKp", 1.2)
@@ -53,43 +192,205 @@ class DroneController:
         # self.param_set("posCtlPid", "zKp", 1.0)
         # self.param_set("posCtlPid", "zKi", 0.2)
 
-        # logging thread
-        self.logging_thread = LogConfig(name="Position", period_in_ms=10)
-        self.logging_thread.add_variable("stateEstimate.x", "float")
-        self.logging_thread.add_variable("stateEstimate.y", "float")
-        self.logging_thread.add_variable("stateEstimate.z", "float")
-        self.logging_thread.add_variable("stateEstimate.yaw", "float")
-        self.scf.cf.log.add_config(  # pyright: ignore [reportOptionalMemberAccess] # noqa: E501
-            self.logging_thread
+        # watch the link and reconnect automatically
+        self.connection_thread = threading.Thread(
+            name="connection", target=self._maintain_connection
         )
-        self.logging_thread.data_received_cb.add_callback(self._log_callback)
-
-        # start the logging thread automatically
-        self.logging_thread.start()
+        self.connection_thread.daemon = True
+        self.connection_thread.start()
 
         # start drone control automatically
+        self.wake = threading.Event()
         self.control_thread = threading.Thread(name="background", target=self._control)
         self.control_thread.setDaemon(True)
         self.control_thread.start()
 
         # delay a bit to let things stabilize if not in swarm
-        print(f"Flier on {URI} ready to rock and roll...")
+        if self.connected:
+            print(f"Flier on {URI} ready to rock and roll...")
         if not in_swarm:
             time.sleep(3)
 
-    def start(self):
-        """Start the drone."""
+    def start(self, wake: bool = True):
+        """Start the drone.
+
+        Args:
+            wake (bool): send the arming setpoint now rather than on the next control tick, see `wake_up`
+        """
         self.running = True
+        if wake:
+            self.wake_up()
 
-    def stop(self):
-        """Stop the drone."""
+    def stop(self, wake: bool = True):
+        """Stop the drone.
+
+        Args:
+            wake (bool): send the stop setpoint now rather than on the next control tick, see `wake_up`
+        """
         self.running = False
+        self.high_level = False
+        if wake:
+            self.wake_up()
+
+    def wake_up(self):
+        """Runs the control loop now instead of waiting out its period, so that swarms can arm and disarm in one batch."""
+        self.wake.set()
 
     def end(self):
         """Stops the drone and closes all connections."""
         self.running = False
-        self.logging_thread.stop()
-        self.scf.close_link()  # pyright: ignore [reportOptionalMemberAccess]
+        with self.connection_lock:
+            connected = self.connected
+            self.connection_state = "closed"
+        if connected:
+            self.logging_thread.stop()
+            if self.health_thread is not None:
+                self.health_thread.stop()
+        self._close_link()
+
+    @property
+    def connected(self):
+        """connected."""
+        return self.connection_state == "connected"
+
+    def _set_connection_state(self, state: str, expected: str | None = None) -> bool:
+        """Changes the connection state under the lock, a closed link is never reopened.
+
+        Args:
+            state (str): new state
+            expected (str | None): only change from this state, None changes from any state but "closed"
+
+        Returns:
+            bool: whether the state was changed
+        """
+        with self.connection_lock:
+            if self.connection_state == "closed":
+                return False
+            if expected is not None and self.connection_state != expected:
+                return False
+            self.connection_state = state
+            return True
+
+    def _lose_link(self, reason: str):
+        """Marks a live link as lost and disarms, so that a drone coming back mid mission waits to be armed again.
+
+        Args:
+            reason (str): why the link was lost
+        """
+        if self._set_connection_state("lost", expected="connected"):
+            self.running = False
+            self.high_level = False
+            print(
+                f"Lost link with Flier on {self.URI}, {reason}, disarmed until armed again."
+            )
+
+    def _connect(self):
+        """Opens the link and starts telemetry logging.
+
+        Returns:
+            bool: whether the connection succeeded
+        """
+        if not self._set_connection_state("connecting"):
+            return False
+        start = time.monotonic()
+        try:
+            self.scf = SyncCrazyflie(self.URI, cf=Crazyflie(rw_cache="./cache"))
+            self.scf.open_link()
+            self.scf.cf.connection_lost.add_callback(self._connection_lost_callback)
+            self.legacy_velocity = self.scf.cf.platform.get_protocol_version() <= 8
+            self._pack_setpoint()
+            self._start_logging()
+        except Exception as e:
+            print(f"Failed to open link with Flier on {self.URI}, {e}.")
+            self.connect_failures += 1
+            self._close_link()
+            self._set_connection_state("disconnected")
+            return False
+
+        # the onboard commander may have dropped out of a trajectory while we were away
+        self.high_level = False
+        self.position_timestamp = time.monotonic()
+        self.backoff = self.min_backoff
+        # `end` may have run while the link was opening, in which case the link is closed again
+        if not self._set_connection_state("connected", expected="connecting"):
+            self._close_link()
+            return False
+        self.connect_time = time.monotonic() - start
+        self.connects += 1
+        return True
+
+    def _close_link(self):
+        """Closes the link, ignoring errors from links that are already dead."""
+        try:
+            self.scf.close_link()  # pyright: ignore [reportOptionalMemberAccess]
+        except Exception:
+            pass
+
+    def _start_logging(self):
+        """Sets up the telemetry log blocks on a freshly opened link."""
+        # logging thread
+        self.logging_thread = PositionLogConfig(self._log_callback, period_in_ms=10)
+        self.scf.cf.log.add_config(  # pyright: ignore [reportOptionalMemberAccess]
+            self.logging_thread
+        )
+
+        # start the logging thread automatically
+        self.logging_thread.start()
+
+        self.scf.cf.link_quality_updated.add_callback(  # pyright: ignore [reportOptionalMemberAccess]
+            self._link_quality_callback
+        )
+        self._start_health_logging()
+
+    def _start_health_logging(self):
+        """Sets up the health log block, firmware without its variables flies on without health data."""
+        # health logging, kept at a low rate to leave the bandwidth for control
+        health_thread = LogConfig(name="Health", period_in_ms=500)
+        health_thread.add_variable("pm.vbat", "float")
+        health_thread.add_variable("radio.rssi", "uint8_t")
+        try:
+            self.scf.cf.log.add_config(  # pyright: ignore [reportOptionalMemberAccess]
+                health_thread
+            )
+        except (KeyError, AttributeError) as e:
+            print(f"No health logging on Flier on {self.URI}, {e}.")
+            self.health_thread = None
+            return
+
+        health_thread.data_received_cb.add_callback(self._health_callback)
+        health_thread.start()
+        self.health_thread = health_thread
+
+    def _maintain_connection(self):
+        """Connection state machine, drops silent links and reconnects with exponential backoff."""
+        while self.connection_state != "closed":
+            if (
+                self.connected
+                and time.monotonic() - self.position_timestamp > self.link_timeout
+            ):
+                self._lose_link("no telemetry")
+
+            if self.connection_state == "lost":
+                self.link_losses += 1
+                self._close_link()
+                self._set_connection_state("disconnected", expected="lost")
+
+            if self.connection_state == "disconnected":
+                time.sleep(self.backoff)
+                self.backoff = min(2.0 * self.backoff, self.max_backoff)
+                if self.connection_state == "disconnected":
+                    self._connect()
+            else:
+                time.sleep(0.1)
+
+    def _connection_lost_callback(self, uri, message):
+        """_connection_lost_callback.
+
+        Args:
+            uri: uri
+            message: message
+        """
+        self._lose_link(message)
 
     def set_pos_control(self, setting):
         """set_pos_control.
@@ -98,14 +399,63 @@ class DroneController:
             setting (bool): whether to set all drones to pos control
         """
         self.pos_control = setting
+        self._pack_setpoint()
+
+    def set_control_rate(self, control_hz: float):
+        """set_control_rate.
 
-    def set_setpoint(self, setpoint: np.ndarray):
+        Args:
+            control_hz (float): rate at which setpoints are streamed to the drone
+        """
+        self.period = 1.0 / control_hz
+
+    def set_setpoint(self, setpoint: np.ndarray, pos_control: bool | None = None):
         """set_setpoint.
 
         Args:
             setpoint (np.ndarray): (4, ) array for setpoint corresponding to (x, y, z, yaw) or (vx, vy, vz, vyaw)
+            pos_control (bool | None): mode the setpoint is in, switched together with the setpoint so that no packet mixes the two, None keeps the current mode
         """
         self.setpoint = setpoint
+        if pos_control is not None:
+            self.pos_control = bool(pos_control)
+        self._pack_setpoint()
+
+    def _pack_setpoint(self):
+        """Packs the current setpoint into its commander payload, see `pack_setpoint`."""
+        self.setpoint_values = tuple(
+            np.asarray(self.setpoint, dtype=np.float64).tolist()
+        )
+        self.setpoint_packet = pack_setpoint(
+            self.setpoint, self.rad_to_deg, self.pos_control, self.legacy_velocity
+        )
+
+    def start_recording(self):
+        """Starts pairing every telemetry sample with the setpoint in force, for fitting the digital twin with `SystemIdentifier`."""
+        self.flight_log = []
+
+    def stop_recording(self, path: str | None = None) -> dict:
+        """Stops recording and returns the flight log.
+
+        Args:
+            path (str | None): if given, the log is also saved here as a .npz file
+
+        Returns:
+            dict: arrays of `time` (k, ), `states` (k, 4), `setpoints` (k, 4), `pos_control` (k, ) and `armed` (k, )
+        """
+        samples = np.array(self.flight_log or [], dtype=np.float64).reshape(-1, 11)
+        self.flight_log = None
+
+        log = dict(
+            time=samples[:, 0],
+            states=samples[:, 1:5],
+            setpoints=samples[:, 5:9],
+            pos_control=samples[:, 9].astype(bool),
+            armed=samples[:, 10].astype(bool),
+        )
+        if path is not None:
+            np.savez(path, **log)
+        return log
 
     def sleep(self, seconds: float):
         """sleep.
@@ -115,36 +465,166 @@ class DroneController:
         """
         time.sleep(seconds)
 
+    def upload_trajectory(
+        self, durations: np.ndarray, coefficients: np.ndarray, trajectory_id: int = 1
+    ):
+        """Uploads a piecewise polynomial trajectory into the onboard trajectory memory.
+
+        Args:
+            durations (np.ndarray): (m, ) array of durations for each of the m pieces
+            coefficients (np.ndarray): (m, 4, 8) array of polynomial coefficients for [x, y, z, yaw]
+            trajectory_id (int): id to register the trajectory under in the high-level commander
+        """
+        trajectory_mem = (
+            self.scf.cf.mem.get_mems(  # pyright: ignore [reportOptionalMemberAccess]
+                MemoryElement.TYPE_TRAJ
+            )[0]
+        )
+        trajectory_mem.trajectory = poly4d_pieces(durations, coefficients)
+
+        if not trajectory_mem.write_data_sync():
+            raise RuntimeError(f"Failed to upload trajectory to Flier {self.scf}.")
+
+        self.scf.cf.param.set_value(  # pyright: ignore [reportOptionalMemberAccess]
+            "commander.enHighLevel", "1"
+        )
+        self.scf.cf.high_level_commander.define_trajectory(  # pyright: ignore [reportOptionalMemberAccess]
+            trajectory_id, 0, len(trajectory_mem.trajectory)
+        )
+
+    def start_trajectory(self, trajectory_id: int = 1, time_scale: float = 1.0):
+        """Hands control to the onboard high-level commander and starts flying an uploaded trajectory.
+
+        The background control thread stops streaming setpoints until `stop_trajectory` or `stop` is called.
+
+        Args:
+            trajectory_id (int): id of a previously uploaded trajectory
+            time_scale (float): time factor, >1.0 is slower, <1.0 is faster
+        """
+        self.high_level = True
+        self.scf.cf.commander.send_notify_setpoint_stop()  # pyright: ignore [reportOptionalMemberAccess]
+        self.scf.cf.high_level_commander.start_trajectory(  # pyright: ignore [reportOptionalMemberAccess]
+            trajectory_id, time_scale
+        )
+
+    def stop_trajectory(self):
+        """Returns control to the streamed setpoints."""
+        self.high_level = False
+
     def _control(self):
         """_control."""
-        while True:
-            if self.running:
-                if self.pos_control:
-                    self.scf.cf.commander.send_position_setpoint(  # pyright: ignore [reportOptionalMemberAccess]
-                        *(self.setpoint * self.rad_to_deg)
-                    )
-                else:
-                    self.scf.cf.commander.send_velocity_world_setpoint(  # pyright: ignore [reportOptionalMemberAccess]
-                        *(self.setpoint * self.rad_to_deg)
-                    )
+        last_command = None
+        # compared against in adaptive mode, updated in place so that sends do not allocate
+        last_setpoint = np.array(self.setpoint, dtype=np.float64)
+        last_packet = None
+        last_send = -math.inf
+        tick_due = time.monotonic()
+
+        while self.connection_state != "closed":
+            if not self.connected:
+                # nothing to send on a dead link, resend everything once it is back
+                last_command = None
+            elif self.running and self.high_level:
+                # the onboard high-level commander is flying, stay out of the loop
+                last_command = None
             else:
-                self.scf.cf.commander.send_stop_setpoint()  # pyright: ignore [reportOptionalMemberAccess]
+                # in adaptive mode, only send on mode changes, large setpoint changes, or keepalives
+                command = (self.running, self.pos_control)
+                packet = self.setpoint_packet
+                now = time.monotonic()
+                if (
+                    not self.adaptive
+                    or command != last_command
+                    or now - last_send >= self.keepalive_period
+                    or (
+                        packet is not last_packet
+                        and np.any(
+                            np.abs(self.setpoint - last_setpoint)
+                            > self.setpoint_threshold
+                        )
+                    )
+                ):
+                    if self.adaptive:
+                        last_setpoint[:] = self.setpoint
+                    last_packet = packet
+                    try:
+                        self._send_setpoint(packet)
+                        self.tick_latency += time.monotonic() - tick_due
+                        self.ticks += 1
+                    except Exception as e:
+                        self._lose_link(str(e))
+                    last_command = command
+                    last_send = now
+
+            # a tick is due at the end of its period, or as soon as it is woken
+            wait_start = time.monotonic()
+            woken = self.wake.wait(self.period)
+            self.wake.clear()
+            tick_due = time.monotonic() if woken else wait_start + self.period
+
+    def _send_setpoint(self, packet: bytes):
+        """_send_setpoint.
+
+        Args:
+            packet (bytes): packed commander payload of the setpoint, sent only while running
+        """
+        pk = CRTPPacket()
+        pk.port = CRTPPort.COMMANDER_GENERIC
+        pk.channel = SET_SETPOINT_CHANNEL
+        pk.data = packet if self.running else STOP_SETPOINT
+        self.scf.cf.send_packet(pk)  # pyright: ignore [reportOptionalMemberAccess]
 
-            time.sleep(self.period)
+        self.packets_sent += 1
 
-    def _log_callback(self, timestamp, data, logconf):
+    def _log_callback(self, timestamp, x, y, z, yaw):
         """_log_callback.
 
+        Args:
+            timestamp: timestamp
+            x: x
+            y: y
+            z: z
+            yaw: yaw in degrees
+        """
+        # """logging callback, NOT to be called in main"""
+        yaw *= self.deg_to_rad
+        self.position_estimate[:] = (x, y, z, yaw)
+        self.position_timestamp = time.monotonic()
+        self.telemetry_samples += 1
+
+        # onboard trajectories are not streamed setpoints, so they are left out of the log
+        if self.flight_log is not None and not self.high_level:
+            self.flight_log.append(
+                (
+                    self.position_timestamp,
+                    x,
+                    y,
+                    z,
+                    yaw,
+                    *self.setpoint_values,
+                    self.pos_control,
+                    self.running,
+                )
+            )
+
+    def _health_callback(self, timestamp, data, logconf):
+        """_health_callback.
+
         Args:
             timestamp: timestamp
             data: data
             logconf: logconf
         """
-        # """logging callback, NOT to be called in main"""
-        self.position_estimate[0] = data["stateEstimate.x"]
-        self.position_estimate[1] = data["stateEstimate.y"]
-        self.position_estimate[2] = data["stateEstimate.z"]
-        self.position_estimate[3] = data["stateEstimate.yaw"] / 180.0 * math.pi
+        self.battery_voltage = data["pm.vbat"]
+        self.rssi = data["radio.rssi"]
+
+    def _link_quality_callback(self, quality):
+        """_link_quality_callback.
+
+        Args:
+            quality: percentage of packets acknowledged on the first try
+        """
+        self.link_quality = quality
 
     def _update_param_callback(self, name, value):
         """_update_param_callback.
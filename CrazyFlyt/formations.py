@@ -0,0 +1,207 @@
+"""Cached generators for common swarm formations.
+
+Every formation is returned as a read-only (n, 4) array of [x, y, z, yaw] that can be passed straight to `reshuffle` or `set_setpoints`.
+Formations are memoized by their parameters, so tuples should be used for vector arguments.
+"""
+import functools
+
+import numpy as np
+
+
+def _as_formation(xyz: np.ndarray) -> np.ndarray:
+    """Appends a zero yaw column and freezes the array so that cached formations cannot be modified.
+
+    Args:
+        xyz (np.ndarray): (n, 3) array of positions
+    """
+    formation = np.concatenate((xyz, np.zeros((len(xyz), 1))), axis=-1)
+    formation.setflags(write=False)
+    return formation
+
+
+@functools.lru_cache(maxsize=128)
+def grid(
+    shape: tuple[int, int, int],
+    spacing: tuple[float, float, float] = (1.0, 1.0, 1.0),
+    center: tuple[float, float, float] = (0.0, 0.0, 1.0),
+) -> np.ndarray:
+    """A regular 3D grid of drones.
+
+    Args:
+        shape (tuple[int, int, int]): number of drones along x, y and z
+        spacing (tuple[float, float, float]): distance between drones along x, y and z
+        center (tuple[float, float, float]): center of the grid
+    """
+    axes = [
+        (np.arange(num) - (num - 1) / 2.0) * gap + offset
+        for num, gap, offset in zip(shape, spacing, center)
+    ]
+    grid_x, grid_y, grid_z = np.meshgrid(*axes)
+
+    return _as_formation(
+        np.stack([grid_x.flatten(), grid_y.flatten(), grid_z.flatten()], axis=-1)
+    )
+
+
+@functools.lru_cache(maxsize=128)
+def cube(
+    num_per_side: int,
+    half_length: float,
+    center: tuple[float, float, float] = (0.0, 0.0, 1.0),
+) -> np.ndarray:
+    """A cube of num_per_side**3 drones.
+
+    Args:
+        num_per_side (int): number of drones along each edge
+        half_length (float): distance from the center of the cube to each face
+        center (tuple[float, float, float]): center of the cube
+    """
+    spacing = 2.0 * half_length / max(num_per_side - 1, 1)
+    return grid((num_per_side,) * 3, (spacing,) * 3, center)
+
+
+@functools.lru_cache(maxsize=128)
+def circle(
+    num_drones: int,
+    radius: float,
+    center: tuple[float, float, float] = (0.0, 0.0, 1.0),
+    phase: float = 0.0,
+) -> np.ndarray:
+    """Drones evenly spaced on a horizontal circle.
+
+    Args:
+        num_drones (int): number of drones
+        radius (float): radius of the circle
+        center (tuple[float, float, float]): center of the circle
+        phase (float): angle of the first drone in radians
+    """
+    theta = np.linspace(0.0, 2.0 * np.pi, num_drones, endpoint=False) + phase
+    xyz = np.stack(
+        [radius * np.cos(theta), radius * np.sin(theta), np.zeros_like(theta)],
+        axis=-1,
+    )
+
+    return _as_formation(xyz + np.array(center))
+
+
+@functools.lru_cache(maxsize=128)
+def line(
+    num_drones: int,
+    start: tuple[float, float, float],
+    end: tuple[float, float, float],
+) -> np.ndarray:
+    """Drones evenly spaced on a line segment, including both ends.
+
+    Args:
+        num_drones (int): number of drones
+        start (tuple[float, float, float]): position of the first drone
+        end (tuple[float, float, float]): position of the last drone
+    """
+    fraction = np.linspace(0.0, 1.0, num_drones)[:, None]
+    return _as_formation(np.array(start) + fraction * (np.array(end) - np.array(start)))
+
+
+@functools.lru_cache(maxsize=128)
+def sphere(
+    num_drones: int,
+    radius: float,
+    center: tuple[float, float, float] = (0.0, 0.0, 1.5),
+) -> np.ndarray:
+    """Drones spread almost evenly over the surface of a sphere using a Fibonacci lattice.
+
+    Args:
+        num_drones (int): number of drones
+        radius (float): radius of the sphere
+        center (tuple[float, float, float]): center of the sphere
+    """
+    index = np.arange(num_drones) + 0.5
+    polar = np.arccos(1.0 - 2.0 * index / num_drones)
+    azimuth = np.pi * (1.0 + np.sqrt(5.0)) * index
+
+    xyz = radius * np.stack(
+        [
+            np.cos(azimuth) * np.sin(polar),
+            np.sin(azimuth) * np.sin(polar),
+            np.cos(polar),
+        ],
+        axis=-1,
+    )
+
+    return _as_formation(xyz + np.array(center))
+
+
+def _load_obj(path: str):
+    """Reads the vertices and triangulated faces of a Wavefront .obj file.
+
+    Args:
+        path (str): path to the .obj file
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (v, 3) array of vertices and (f, 3) array of vertex indices
+    """
+    vertices = []
+    faces = []
+    with open(path) as f:
+        for row in f:
+            tokens = row.split()
+            if not tokens:
+                continue
+            if tokens[0] == "v":
+                vertices.append([float(x) for x in tokens[1:4]])
+            elif tokens[0] == "f":
+                # obj indices are 1-based, or negative relative to the end, and may carry /texture/normal suffixes
+                corners = [int(token.split("/")[0]) for token in tokens[1:]]
+                corners = [c - 1 if c > 0 else len(vertices) + c for c in corners]
+                faces += [
+                    [corners[0], corners[i], corners[i + 1]]
+                    for i in range(1, len(corners) - 1)
+                ]
+
+    return np.array(vertices), np.array(faces)
+
+
+@functools.lru_cache(maxsize=16)
+def mesh(
+    path: str,
+    num_drones: int,
+    scale: float = 1.0,
+    center: tuple[float, float, float] = (0.0, 0.0, 1.5),
+    oversample: int = 20,
+    seed: int = 0,
+) -> np.ndarray:
+    """Drones spread over the surface of a mesh, for shapes, logos and extruded text.
+
+    The surface is sampled uniformly by area, then thinned out with farthest point sampling so that drones are evenly spaced.
+
+    Args:
+        path (str): path to a Wavefront .obj file
+        num_drones (int): number of drones
+        scale (float): scale applied to the mesh
+        center (tuple[float, float, float]): where to place the center of the mesh bounding box
+        oversample (int): number of surface samples per drone to pick from
+        seed (int): seed for the surface sampling
+    """
+    vertices, faces = _load_obj(path)
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+
+    # sample points uniformly over the surface
+    rng = np.random.default_rng(seed)
+    areas = 0.5 * np.linalg.norm(np.cross(b - a, c - a), axis=-1)
+    chosen = rng.choice(len(areas), size=num_drones * oversample, p=areas / areas.sum())
+    r1 = np.sqrt(rng.random((len(chosen), 1)))
+    r2 = rng.random((len(chosen), 1))
+    points = (1.0 - r1) * a[chosen] + r1 * (1.0 - r2) * b[chosen] + r1 * r2 * c[chosen]
+
+    # farthest point sampling to spread the drones evenly
+    selected = np.zeros((num_drones,), dtype=np.int64)
+    distances = np.linalg.norm(points - points[0], axis=-1)
+    for i in range(1, num_drones):
+        selected[i] = np.argmax(distances)
+        distances = np.minimum(
+            distances, np.linalg.norm(points - points[selected[i]], axis=-1)
+        )
+    xyz = points[selected]
+
+    # center the bounding box on the requested center
+    xyz = (xyz - (xyz.min(axis=0) + xyz.max(axis=0)) / 2.0) * scale
+    return _as_formation(xyz + np.array(center))
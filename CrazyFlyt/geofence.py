@@ -0,0 +1,168 @@
+"""Vectorized workspace bounds for swarm setpoints."""
+import numpy as np
+
+
+class Geofence:
+    """Geofence.
+
+    Keeps every setpoint batch inside a box and an optional convex polytope, and within speed limits that depend on the mode.
+
+    Position setpoints are projected into the workspace and can be rate limited to a top speed.
+    Velocity setpoints are clipped to a top speed, and lose any component pointing out of the workspace once the drone is at its edge.
+    Drones whose setpoints were changed are counted as violations, and in reject mode they hold their last accepted setpoint instead.
+    """
+
+    def __init__(
+        self,
+        lower: np.ndarray = np.array([-np.inf, -np.inf, -np.inf]),
+        upper: np.ndarray = np.array([np.inf, np.inf, np.inf]),
+        planes: np.ndarray | None = None,
+        max_velocity: np.ndarray | None = None,
+        max_position_rate: np.ndarray | None = None,
+        reject: bool = False,
+    ):
+        """__init__.
+
+        Args:
+            lower (np.ndarray): (3, ) lower corner of the box in [x, y, z]
+            upper (np.ndarray): (3, ) upper corner of the box in [x, y, z]
+            planes (np.ndarray | None): (m, 4) half spaces [a_x, a_y, a_z, b] of a convex polytope where a . p <= b
+            max_velocity (np.ndarray | None): (4, ) largest [vx, vy, vz, vyaw] allowed in velocity control
+            max_position_rate (np.ndarray | None): (4, ) fastest [x, y, z, yaw] position setpoints may move in position control
+            reject (bool): hold the last accepted setpoint of violating drones instead of clamping their new one
+        """
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.max_velocity = max_velocity
+        self.max_position_rate = max_position_rate
+        self.reject = reject
+
+        # unit normals, so that projections are a single multiply
+        self.normals = None
+        self.offsets = None
+        if planes is not None:
+            planes = np.asarray(planes, dtype=np.float64)
+            norms = np.linalg.norm(planes[:, :3], axis=-1, keepdims=True)
+            self.normals = planes[:, :3] / norms
+            self.offsets = planes[:, 3] / norms[:, 0]
+
+        # per drone state, sized on the first batch
+        self.violations = None
+        self.last = None
+        self.last_pos_control = None
+        self.last_time = -np.inf
+
+    def _reset(self, num_drones: int):
+        """Sizes the per drone counters and history for a swarm.
+
+        Args:
+            num_drones (int): number of drones
+        """
+        self.violations = np.zeros((num_drones,), dtype=np.int64)
+        self.last = None
+        self.last_pos_control = None
+        self.last_time = -np.inf
+
+    def _contain(self, xyz: np.ndarray) -> np.ndarray:
+        """Projects positions into the box and the polytope.
+
+        Args:
+            xyz (np.ndarray): (n, 3) array of positions, modified in place
+        """
+        np.clip(xyz, self.lower, self.upper, out=xyz)
+        if self.normals is None:
+            return xyz
+
+        # a few rounds of projections onto the violated planes, then the box again for the corners
+        for _ in range(3):
+            excess = np.maximum(xyz @ self.normals.T - self.offsets, 0.0)
+            if not np.any(excess):
+                break
+            xyz -= excess @ self.normals
+        np.clip(xyz, self.lower, self.upper, out=xyz)
+        return xyz
+
+    def excess(self, xyz: np.ndarray) -> np.ndarray:
+        """Distance of each position outside the workspace, zero inside it.
+
+        Args:
+            xyz (np.ndarray): (n, 3) array of positions
+
+        Returns:
+            np.ndarray: (n, ) array of distances
+        """
+        xyz = np.asarray(xyz, dtype=np.float64)
+        return np.linalg.norm(self._contain(xyz.copy()) - xyz, axis=-1)
+
+    def apply(
+        self,
+        setpoints: np.ndarray,
+        pos_control: bool | np.ndarray,
+        now: float,
+        positions: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """Filters a batch of setpoints.
+
+        Args:
+            setpoints (np.ndarray): (n, 4) array of setpoints, (x, y, z, yaw) or (vx, vy, vz, vyaw)
+            pos_control (bool | np.ndarray): whether the setpoints are positions or velocities, for the whole swarm or (n, ) for each drone
+            now (float): current time, used to rate limit position setpoints
+            positions (np.ndarray | None): (n, 4) array of current states, used to stop velocities leading out of the workspace
+
+        Returns:
+            np.ndarray: (n, 4) array of filtered setpoints
+        """
+        setpoints = np.asarray(setpoints, dtype=np.float64)
+        num_drones = len(setpoints)
+        if self.violations is None or len(self.violations) != num_drones:
+            self._reset(num_drones)
+        pos_control = np.broadcast_to(pos_control, (num_drones,))
+
+        # position control, limit how fast the targets move from the last position setpoints, then contain them
+        targets = setpoints.copy()
+        if self.max_position_rate is not None and self.last is not None:
+            step = np.asarray(self.max_position_rate) * (now - self.last_time)
+            limited = np.clip(targets, self.last - step, self.last + step)
+            targets = np.where(self.last_pos_control[:, None], limited, targets)
+        self._contain(targets[:, :3])
+
+        # velocity control, limit the speed and stop at the edges of the workspace
+        velocities = setpoints.copy()
+        if self.max_velocity is not None:
+            np.clip(velocities, -self.max_velocity, self.max_velocity, out=velocities)
+        if positions is not None:
+            xyz, vel = positions[:, :3], velocities[:, :3]
+            vel[(xyz >= self.upper) & (vel > 0.0)] = 0.0
+            vel[(xyz <= self.lower) & (vel < 0.0)] = 0.0
+            if self.normals is not None:
+                outward = (xyz @ self.normals.T >= self.offsets) * np.maximum(
+                    vel @ self.normals.T, 0.0
+                )
+                vel -= outward @ self.normals
+
+        filtered = np.where(pos_control[:, None], targets, velocities)
+        violated = np.any(np.abs(filtered - setpoints) > 1e-9, axis=-1)
+
+        # rejected drones keep their last setpoint, as long as it was given in the same mode
+        if self.reject and self.last is not None:
+            hold = violated & (self.last_pos_control == pos_control)
+            filtered[hold] = self.last[hold]
+
+        self.violations += violated
+        self.last = filtered
+        self.last_pos_control = pos_control.copy()
+        self.last_time = now
+        return filtered
+
+    def permute(self, order: np.ndarray):
+        """Reorders the per drone counters and history, for use after a reshuffle.
+
+        Args:
+            order (np.ndarray): (n, ) array of old indices for each new index
+        """
+        if self.violations is None:
+            return
+        self.violations = self.violations[order]
+        if self.last is not None:
+            self.last = self.last[order]
+            self.last_pos_control = self.last_pos_control[order]
@@ -0,0 +1,123 @@
+"""Fleet health monitoring and battery aware formation scheduling."""
+import threading
+import time
+
+import numpy as np
+
+
+class HealthMonitor:
+    """HealthMonitor.
+
+    Polls the health of every drone in a SwarmController or Simulator from a background thread,
+    and keeps it as one (n, 4) array of [battery voltage, link quality percentage, rssi, seconds since the last telemetry].
+
+    The scheduler assumes the first k drones of the swarm fly the formation and the rest are spares,
+    and uses `reshuffle` to hand the formation slots of unfit drones to fit spares.
+    """
+
+    def __init__(
+        self,
+        swarm,
+        period: float = 0.5,
+        min_battery: float = 3.4,
+        min_link_quality: float = 50.0,
+        link_timeout: float = 1.0,
+    ):
+        """__init__.
+
+        Args:
+            swarm (SwarmController | Simulator): swarm to monitor
+            period (float): time between polls
+            min_battery (float): battery voltage below which a drone is rotated out
+            min_link_quality (float): link quality percentage below which a drone is rotated out
+            link_timeout (float): seconds without telemetry after which a drone is considered lost
+        """
+        self.swarm = swarm
+        self.period = period
+        self.min_battery = min_battery
+        self.min_link_quality = min_link_quality
+        self.link_timeout = link_timeout
+
+        self.poll()
+
+        self.running = True
+        self.monitor_thread = threading.Thread(name="health", target=self._monitor)
+        self.monitor_thread.daemon = True
+        self.monitor_thread.start()
+
+    def poll(self):
+        """Refreshes the fleet health arrays now."""
+        self.health = self.swarm.get_health()
+
+    def _monitor(self):
+        """_monitor."""
+        while self.running:
+            self.poll()
+            time.sleep(self.period)
+
+    def end(self):
+        """Stops the background polling."""
+        self.running = False
+
+    @property
+    def battery_voltage(self):
+        """battery_voltage."""
+        return self.health[:, 0]
+
+    @property
+    def link_quality(self):
+        """link_quality."""
+        return self.health[:, 1]
+
+    @property
+    def rssi(self):
+        """rssi."""
+        return self.health[:, 2]
+
+    @property
+    def telemetry_age(self):
+        """telemetry_age."""
+        return self.health[:, 3]
+
+    @property
+    def fit(self):
+        """(n, ) mask of drones that are fit to fly in a formation, drones with no readings yet count as unfit."""
+        health = self.health
+        return (
+            (health[:, 0] >= self.min_battery)
+            & (health[:, 1] >= self.min_link_quality)
+            & (health[:, 3] <= self.link_timeout)
+        )
+
+    def rotate(self, formation: np.ndarray, parking: np.ndarray, force: bool = False):
+        """Hands the formation slots of unfit drones to fit spares.
+
+        After a rotation, the first k drones fly the formation and the rest are sent to the parking positions,
+        so later setpoints should keep the formation in the first k rows.
+
+        Args:
+            formation (np.ndarray): (k, 4) array of formation slots
+            parking (np.ndarray): (n - k, 4) array of positions for spare and rotated out drones
+            force (bool): reassign even if every drone in the formation is fit
+
+        Returns:
+            bool: whether the drones were reassigned
+        """
+        assert (
+            len(formation) + len(parking) == self.swarm.num_drones
+        ), f"formation and parking must have {self.swarm.num_drones} positions in total, got {len(formation)} and {len(parking)}."
+
+        self.poll()
+        fit = self.fit
+        num_slots = len(formation)
+
+        # only rotate if someone in the formation is unfit and a fit spare can take over
+        if not force and (np.all(fit[:num_slots]) or not np.any(fit[num_slots:])):
+            return False
+
+        # unfit drones are kept out of formation slots whenever there are enough fit drones
+        penalty = np.zeros((self.swarm.num_drones, self.swarm.num_drones))
+        penalty[:num_slots, ~fit] = 1e6
+
+        self.swarm.reshuffle(np.concatenate((formation, parking), axis=0), penalty)
+        return True
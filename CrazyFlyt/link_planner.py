@@ -0,0 +1,245 @@
+"""Balancing of Crazyflie links across Crazyradio dongles and channels."""
+import threading
+import time
+
+import cflib.crtp
+import numpy as np
+from cflib.crazyflie import Crazyflie
+from cflib.crazyflie.mem import MemoryElement
+from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+from cflib.utils.power_switch import PowerSwitch
+from scipy.optimize import linear_sum_assignment
+
+
+def parse_uri(URI: str):
+    """Splits a radio URI into its parts.
+
+    Args:
+        URI (str): URI such as radio://0/80/2M/E7E7E7E7E7
+
+    Returns:
+        tuple[int, int, str, str]: dongle index, channel, datarate and address, the address is empty if the URI has none
+    """
+    assert URI.startswith("radio://"), f"only radio URIs can be planned, got {URI}."
+    parts = URI.split("/")[2:]
+    assert (
+        len(parts) >= 3
+    ), f"radio URI must name a dongle, channel and datarate, got {URI}."
+
+    return int(parts[0]), int(parts[1]), parts[2], parts[3] if len(parts) > 3 else ""
+
+
+def make_uri(dongle: int, channel: int, datarate: str, address: str = "") -> str:
+    """Builds a radio URI from its parts.
+
+    Args:
+        dongle (int): index of the Crazyradio
+        channel (int): radio channel, 0 to 125
+        datarate (str): 250K, 1M or 2M
+        address (str): radio address, left out if empty
+    """
+    URI = f"radio://{dongle}/{channel}/{datarate}"
+    return f"{URI}/{address}" if address else URI
+
+
+class LinkPlanner:
+    """LinkPlanner.
+
+    Spreads drones evenly over the available Crazyradio dongles, and optionally over channels.
+
+    A dongle talks to its drones one packet at a time, so its packet rate is shared by every drone assigned to it,
+    and switching channels between packets costs it extra time.
+    Moving a drone to another dongle only changes its URI on this side,
+    while moving it to another channel means rewriting the channel stored on the drone, see `apply`.
+    """
+
+    def __init__(
+        self,
+        URIs: list[str],
+        dongles: list[int] | None = None,
+        channels: list[int] | None = None,
+        packet_rate: float = 1000.0,
+    ):
+        """__init__.
+
+        Args:
+            URIs (list[str]): current URIs of the drones
+            dongles (list[int] | None): indices of the available Crazyradio dongles, defaults to those already in use
+            channels (list[int] | None): channels the planner may move drones to, defaults to those already in use
+            packet_rate (float): acknowledged packets per second a dongle manages on a clean channel
+        """
+        self.URIs = list(URIs)
+        self.links = [parse_uri(URI) for URI in self.URIs]
+        self.dongles = sorted(dongles or {link[0] for link in self.links})
+        self.channels = sorted(channels or {link[1] for link in self.links})
+        self.packet_rate = packet_rate
+
+        # measured link statistics, see `measure`
+        self.update_rate = np.full((len(self.URIs),), np.nan)
+        self.ack_rate = np.full((len(self.URIs),), np.nan)
+
+    @property
+    def num_drones(self):
+        """num_drones."""
+        return len(self.URIs)
+
+    def _slots(self) -> np.ndarray:
+        """Dongle of every slot when the drones are spread as evenly as possible over the dongles."""
+        counts = np.full((len(self.dongles),), self.num_drones // len(self.dongles))
+        counts[: self.num_drones % len(self.dongles)] += 1
+        return np.repeat(self.dongles, counts)
+
+    def channel_quality(self) -> dict:
+        """Mean measured ack rate of each channel, channels without measurements count as clean."""
+        channels = np.array([link[1] for link in self.links])
+        quality = {}
+        for channel in self.channels:
+            measured = self.ack_rate[(channels == channel) & np.isfinite(self.ack_rate)]
+            quality[channel] = float(np.mean(measured)) if len(measured) else 1.0
+        return quality
+
+    def plan(self, change_channels: bool = False) -> list[str]:
+        """Plans new URIs that balance the drones over the dongles.
+
+        Without channel changes, drones sharing a channel are kept on the same dongles to keep channel switching low.
+        With channel changes, every dongle gets its own channel, picked from the best measured channels,
+        and drones are moved between channels as little as possible.
+
+        Args:
+            change_channels (bool): whether drones may be moved to other channels
+
+        Returns:
+            list[str]: planned URI of each drone, in the same order as the current URIs
+        """
+        slots = self._slots()
+        dongle = np.array([link[0] for link in self.links])
+        channel = np.array([link[1] for link in self.links])
+
+        if change_channels:
+            # best channels first, one per dongle, reused only if there are more dongles than channels
+            quality = self.channel_quality()
+            ranked = sorted(self.channels, key=lambda c: -quality[c])
+            home = {d: ranked[i % len(ranked)] for i, d in enumerate(self.dongles)}
+            slot_channel = np.array([home[d] for d in slots])
+        else:
+            # deal the drones out channel by channel so each dongle sees as few channels as possible
+            slot_channel = np.sort(channel)
+
+        # rewriting a channel is expensive, moving to another dongle is cheap but still avoided when free
+        cost = 10.0 * (channel[None, :] != slot_channel[:, None])
+        cost += 1.0 * (dongle[None, :] != slots[:, None])
+        slot_of_drone = np.empty((self.num_drones,), dtype=np.int64)
+        rows, cols = linear_sum_assignment(cost)
+        slot_of_drone[cols] = rows
+
+        return [
+            make_uri(slots[s], slot_channel[s], datarate, address)
+            for s, (_, _, datarate, address) in zip(slot_of_drone, self.links)
+        ]
+
+    def expected_rate(self, URIs: list[str] | None = None) -> np.ndarray:
+        """Update rate each drone should achieve, from the dongle packet rate shared among its drones and its channel's ack rate.
+
+        Args:
+            URIs (list[str] | None): URIs to evaluate, defaults to the current URIs
+
+        Returns:
+            np.ndarray: (n, ) updates per second for each drone
+        """
+        links = self.links if URIs is None else [parse_uri(URI) for URI in URIs]
+        dongles = np.array([link[0] for link in links])
+        quality = self.channel_quality()
+
+        rates = np.zeros((len(links),))
+        for i, (dongle, channel, _, _) in enumerate(links):
+            on_dongle = dongles == dongle
+            num_channels = len({links[j][1] for j in np.flatnonzero(on_dongle)})
+
+            # every extra channel on a dongle costs roughly one packet slot per switch
+            share = self.packet_rate / (np.sum(on_dongle) + num_channels - 1)
+            rates[i] = share * quality.get(channel, 1.0)
+
+        return rates
+
+    def measure(self, swarm, duration: float = 2.0) -> dict:
+        """Measures the achieved update rate and ack rate of every drone while the swarm is flying or idling.
+
+        Args:
+            swarm (SwarmController): swarm using the current URIs, in the same order
+            duration (float): seconds to measure over
+
+        Returns:
+            dict: per drone `update_rate` (n, ) in packets per second and `ack_rate` (n, ) as a fraction,
+            and per dongle `throughput` in packets per second
+        """
+        assert (
+            swarm.num_drones == self.num_drones
+        ), f"swarm has {swarm.num_drones} drones, planner has {self.num_drones}."
+
+        start_packets = swarm.packets_sent.copy()
+        start = time.monotonic()
+        time.sleep(duration)
+        elapsed = time.monotonic() - start
+
+        self.update_rate = (swarm.packets_sent - start_packets) / elapsed
+        self.ack_rate = swarm.get_health()[:, 1] / 100.0
+
+        dongles = np.array([link[0] for link in self.links])
+        return dict(
+            update_rate=self.update_rate,
+            ack_rate=self.ack_rate,
+            throughput={
+                d: float(np.sum(self.update_rate[dongles == d])) for d in self.dongles
+            },
+        )
+
+    @property
+    def achieved_rate(self) -> np.ndarray:
+        """(n, ) update rate of each drone from the last `measure`, NaN before any measurement."""
+        return self.update_rate
+
+    def apply(self, URIs: list[str], timeout: float = 5.0) -> list[str]:
+        """Rewrites the stored channel of every drone whose planned channel differs from its current one, then reboots it.
+
+        This must be done while no SwarmController holds the links.
+
+        Args:
+            URIs (list[str]): planned URIs from `plan`, in the same order as the current URIs
+            timeout (float): seconds to wait for each drone's configuration to read and write
+
+        Returns:
+            list[str]: the planned URIs, with drones that could not be rewritten left on their current URI
+        """
+        cflib.crtp.init_drivers()
+
+        applied = list(URIs)
+        for i, (current, planned) in enumerate(zip(self.URIs, URIs)):
+            if parse_uri(current)[1] == parse_uri(planned)[1]:
+                continue
+
+            try:
+                with SyncCrazyflie(current, cf=Crazyflie(rw_cache="./cache")) as scf:
+                    eeprom = scf.cf.mem.get_mems(MemoryElement.TYPE_I2C)[0]
+
+                    done = threading.Event()
+                    eeprom.update(lambda *_: done.set())
+                    if not done.wait(timeout):
+                        raise TimeoutError("timed out reading the configuration")
+
+                    done.clear()
+                    eeprom.elements["radio_channel"] = parse_uri(planned)[1]
+                    eeprom.write_data(lambda *_: done.set())
+                    if not done.wait(timeout):
+                        raise TimeoutError("timed out writing the configuration")
+
+                # the new channel only takes effect after a restart
+                PowerSwitch(current).stm_power_cycle()
+                print(f"Moved Flier on {current} to {planned}.")
+            except Exception as e:
+                print(f"Failed to move Flier on {current} to {planned}, {e}.")
+                dongle, _, datarate, address = parse_uri(planned)
+                applied[i] = make_uri(dongle, parse_uri(current)[1], datarate, address)
+
+        self.URIs = applied
+        self.links = [parse_uri(URI) for URI in applied]
+        return applied
@@ -0,0 +1,208 @@
+"""OpenMetrics export of swarm health and timing for long running sessions."""
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# every exported metric, its type and its help text
+METRICS = {
+    "connected": ("gauge", "Whether the drone has a live link."),
+    "battery_volts": ("gauge", "Battery voltage."),
+    "link_quality_percent": ("gauge", "Percentage of packets acknowledged on the first try."),
+    "packet_loss_ratio": ("gauge", "Fraction of packets not acknowledged on the first try."),
+    "radio_rssi": ("gauge", "Radio signal strength as reported by the drone."),
+    "telemetry_age_seconds": ("gauge", "Seconds since the last telemetry sample."),
+    "telemetry_rate_hz": ("gauge", "Telemetry samples per second over the last sampling period."),
+    "telemetry_samples": ("counter", "Telemetry samples received."),
+    "packets_sent": ("counter", "Setpoint packets sent."),
+    "connects": ("counter", "Successful connections."),
+    "connect_failures": ("counter", "Failed connection attempts."),
+    "link_losses": ("counter", "Links dropped after connecting."),
+    "connect_seconds": ("gauge", "Time taken by the last successful connection."),
+    "tick_latency_seconds": ("summary", "Time from a control tick falling due to its setpoint being sent."),
+    "reshuffle_seconds": ("summary", "Time taken to solve reshuffle assignments."),
+    "sim_time_seconds": ("gauge", "Simulated time."),
+    "real_time_factor": ("gauge", "Simulated seconds per wall clock second over the last sampling period."),
+}  # fmt: skip
+
+
+def _format(value) -> str:
+    """Formats a sample value, OpenMetrics spells out non finite numbers.
+
+    Args:
+        value: number to format
+    """
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def render(metrics: dict, labels: list[str], prefix: str = "crazyflyt") -> str:
+    """Renders metrics in the OpenMetrics text format.
+
+    Args:
+        metrics (dict): values keyed by names from `METRICS`, (n, ) arrays for each drone or scalars for the swarm,
+            summaries are (sum, count) pairs of either
+        labels (list[str]): label set of each drone, such as 'drone="0"'
+        prefix (str): prefix of every metric name
+
+    Returns:
+        str: the exposition, terminated by `# EOF`
+    """
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        if name not in metrics:
+            continue
+        family = f"{prefix}_{name}"
+        lines.append(f"# TYPE {family} {kind}")
+        lines.append(f"# HELP {family} {help_text}")
+
+        value = metrics[name]
+        if kind == "summary":
+            samples = [("_sum", value[0]), ("_count", value[1])]
+        elif kind == "counter":
+            samples = [("_total", value)]
+        else:
+            samples = [("", value)]
+
+        for suffix, values in samples:
+            if np.ndim(values) == 0:
+                lines.append(f"{family}{suffix} {_format(values)}")
+                continue
+            for label, sample in zip(labels, values):
+                lines.append(f"{family}{suffix}{{{label}}} {_format(sample)}")
+
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """MetricsServer.
+
+    Samples `get_metrics` of a SwarmController or Simulator on a background thread at a fixed period,
+    and serves the last rendered sample over HTTP in the OpenMetrics text format for Prometheus to scrape.
+
+    Scrapes only ever read the cached text, so their cost on the swarm is bounded by the sampling period however often they come.
+    Drones are labelled by their index in the swarm, and by their URI when they have one, since a reshuffle changes the indices.
+    """
+
+    def __init__(
+        self,
+        swarm,
+        host: str = "127.0.0.1",
+        port: int = 9464,
+        period: float = 1.0,
+        prefix: str = "crazyflyt",
+    ):
+        """__init__.
+
+        Args:
+            swarm (SwarmController | Simulator): swarm to export
+            host (str): address to serve on, keep it local unless the network is trusted
+            port (int): port to serve on, 0 picks a free one
+            period (float): seconds between samples of the swarm
+            prefix (str): prefix of every metric name
+        """
+        self.swarm = swarm
+        self.period = period
+        self.prefix = prefix
+        self.text = render({}, [], prefix).encode()
+
+        # counters of the last sample, for the rates
+        self.last_time = None
+        self.last_samples = None
+        self.last_sim_time = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Serves the cached exposition on any path."""
+
+            def do_GET(self):
+                """do_GET."""
+                body = server.text
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                """Scrapes are not worth a line each."""
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+        self.running = True
+        self.sample()
+        self.sample_thread = threading.Thread(name="metrics", target=self._sample_loop)
+        self.sample_thread.daemon = True
+        self.sample_thread.start()
+        self.serve_thread = threading.Thread(
+            name="metrics_server", target=self.httpd.serve_forever
+        )
+        self.serve_thread.daemon = True
+        self.serve_thread.start()
+
+    @property
+    def url(self):
+        """url."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def sample(self):
+        """Takes one sample of the swarm and renders it."""
+        metrics = dict(self.swarm.get_metrics())
+        now = time.monotonic()
+
+        # drones are followed by URI where there is one, so that rates survive a reshuffle
+        URIs = metrics.pop("uri", None)
+        keys = list(range(self.swarm.num_drones)) if URIs is None else list(URIs)
+        labels = [f'drone="{i}"' for i in range(self.swarm.num_drones)]
+        if URIs is not None:
+            labels = [f'{label},uri="{URI}"' for label, URI in zip(labels, URIs)]
+
+        if "link_quality_percent" in metrics:
+            metrics["packet_loss_ratio"] = 1.0 - metrics["link_quality_percent"] / 100.0
+
+        # rates over the last sampling period
+        samples = metrics.get("telemetry_samples")
+        sim_time = metrics.get("sim_time_seconds")
+        if self.last_time is not None:
+            elapsed = now - self.last_time
+            if samples is not None:
+                metrics["telemetry_rate_hz"] = np.array(
+                    [
+                        (sample - self.last_samples.get(key, math.nan)) / elapsed
+                        for key, sample in zip(keys, samples)
+                    ]
+                )
+            if sim_time is not None:
+                metrics["real_time_factor"] = (sim_time - self.last_sim_time) / elapsed
+        self.last_time = now
+        self.last_samples = {} if samples is None else dict(zip(keys, samples))
+        self.last_sim_time = sim_time
+
+        self.text = render(metrics, labels, self.prefix).encode()
+
+    def _sample_loop(self):
+        """_sample_loop."""
+        while self.running:
+            time.sleep(self.period)
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Failed to sample metrics, {e}.")
+
+    def close(self):
+        """Stops sampling and serving."""
+        self.running = False
+        self.httpd.shutdown()
+        self.httpd.server_close()
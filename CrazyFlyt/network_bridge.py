@@ -0,0 +1,333 @@
+"""Ground station server and client for driving a swarm over the local network."""
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+# every packet starts with: message type, flags, number of drones, sequence number, send time
+HEADER = struct.Struct("<BBHId")
+# telemetry additionally echoes the sequence number and send time of the last setpoints received
+ACK = struct.Struct("<Id")
+
+MSG_SUBSCRIBE = 0
+MSG_SETPOINTS = 1
+MSG_ARM = 2
+MSG_TELEMETRY = 3
+
+FLAG_POS_CONTROL = 0x01
+
+# float32 payload values per drone of each message type
+PAYLOAD_FLOATS = {MSG_SETPOINTS: 5, MSG_ARM: 1, MSG_TELEMETRY: 4}
+
+MAX_PACKET_BYTES = 65507
+
+
+class GroundStation:
+    """GroundStation.
+
+    Serves a SwarmController or Simulator over UDP.
+    Clients send batched setpoints and arm commands in, and get position telemetry streamed back out.
+
+    Packets are a `HEADER` followed by a float32 payload:
+        MSG_SUBSCRIBE: no payload, registers the sender for telemetry, and keeps the subscription alive when repeated
+        MSG_SETPOINTS: (n, 4) setpoints followed by the (n, ) mask of drones in position control, the rest are in velocity control
+        MSG_ARM: (n, ) arm mask
+        MSG_TELEMETRY: `ACK` followed by (n, 4) position estimates
+
+    Subscribers that send nothing for `subscriber_timeout` seconds are dropped.
+    """
+
+    def __init__(
+        self,
+        swarm,
+        host: str = "127.0.0.1",
+        port: int = 5760,
+        telemetry_hz: float = 50.0,
+        subscriber_timeout: float = 1.0,
+    ):
+        """__init__.
+
+        Args:
+            swarm (SwarmController | Simulator): swarm to serve
+            host (str): address to bind to, use "0.0.0.0" to serve the whole LAN
+            port (int): UDP port to bind to
+            telemetry_hz (float): rate at which telemetry is streamed to subscribers
+            subscriber_timeout (float): seconds of silence after which a subscriber is dropped, should span a few telemetry periods and client keepalives
+        """
+        self.swarm = swarm
+        self.period = 1.0 / telemetry_hz
+        self.subscriber_timeout = subscriber_timeout
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+
+        # last time each subscriber was heard from, on the `time.monotonic` clock
+        self.subscribers = {}
+        self.sequence = 0
+        self.dropped_packets = 0
+
+        # last setpoint sequence number and send time accepted from each client, sequences are per client
+        self.acks = {}
+
+    @property
+    def address(self):
+        """address."""
+        return self.sock.getsockname()
+
+    def poll(self):
+        """Applies all pending commands from clients, then publishes one telemetry packet."""
+        while True:
+            try:
+                data, address = self.sock.recvfrom(MAX_PACKET_BYTES)
+            except BlockingIOError:
+                break
+            self._handle(data, address)
+
+        now = time.monotonic()
+        for subscriber, heard in list(self.subscribers.items()):
+            if now - heard > self.subscriber_timeout:
+                del self.subscribers[subscriber]
+                self.acks.pop(subscriber, None)
+
+        if not self.subscribers:
+            return
+
+        self.sequence += 1
+        states = np.asarray(self.swarm.position_estimate, dtype="<f4")
+        header = HEADER.pack(MSG_TELEMETRY, 0, len(states), self.sequence, time.time())
+        payload = states.tobytes()
+        for subscriber in self.subscribers:
+            ack = ACK.pack(*self.acks.get(subscriber, (0, 0.0)))
+            self.sock.sendto(header + ack + payload, subscriber)
+
+    def spin(self, seconds: float):
+        """Serves clients while stepping the swarm for some wall clock time.
+
+        Headless simulations step faster than real time, so every step is also paced to the wall clock.
+
+        Args:
+            seconds (float): seconds
+        """
+        deadline = time.monotonic()
+        for _ in range(max(int(seconds / self.period), 1)):
+            self.poll()
+            self.swarm.sleep(self.period)
+            deadline += self.period
+            time.sleep(max(deadline - time.monotonic(), 0.0))
+
+    def close(self):
+        """close."""
+        self.sock.close()
+
+    def _handle(self, data: bytes, address):
+        """_handle.
+
+        Args:
+            data (bytes): raw packet
+            address: address of the sender
+        """
+        if len(data) < HEADER.size:
+            self.dropped_packets += 1
+            return
+        msg_type, flags, num_drones, sequence, send_time = HEADER.unpack_from(data)
+
+        if msg_type == MSG_SUBSCRIBE:
+            # a new or expired client counts its sequence numbers from scratch, a repeat only keeps it alive
+            if address not in self.subscribers:
+                self.acks[address] = (0, 0.0)
+            self.subscribers[address] = time.monotonic()
+            return
+        if address in self.subscribers:
+            self.subscribers[address] = time.monotonic()
+
+        if num_drones != self.swarm.num_drones:
+            print(
+                f"Dropping packet from {address} for {num_drones} drones, serving {self.swarm.num_drones} drones."
+            )
+            self.dropped_packets += 1
+            return
+
+        # short, long or unknown packets are dropped rather than allowed to reach the swarm
+        size = PAYLOAD_FLOATS.get(msg_type, -1) * num_drones * 4
+        if len(data) - HEADER.size != size:
+            self.dropped_packets += 1
+            return
+
+        payload = np.frombuffer(data, dtype="<f4", offset=HEADER.size)
+        if msg_type == MSG_SETPOINTS:
+            # stale or reordered setpoints are dropped
+            if sequence <= self.acks.get(address, (0, 0.0))[0]:
+                return
+            # the modes travel with every batch, so nothing cached here goes stale when the swarm changes them itself
+            split = 4 * num_drones
+            self.swarm.set_setpoints(
+                payload[:split].reshape(num_drones, 4).astype(np.float64),
+                payload[split:] > 0.5,
+            )
+            self.acks[address] = (sequence, send_time)
+        elif msg_type == MSG_ARM:
+            self.swarm.arm(payload > 0.5)
+
+
+class RemoteSwarm:
+    """RemoteSwarm.
+
+    Client for a GroundStation, with the same interface as a SwarmController.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 5760,
+        timeout: float = 5.0,
+        keepalive_period: float = 0.25,
+    ):
+        """__init__.
+
+        Args:
+            host (str): address of the ground station
+            port (int): UDP port of the ground station
+            timeout (float): seconds to wait for the first telemetry packet
+            keepalive_period (float): time between subscriptions that keep telemetry flowing, must be within the station's `subscriber_timeout`
+        """
+        self.server = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.settimeout(min(keepalive_period, 0.5))
+        self.keepalive_period = keepalive_period
+
+        self.modes = False
+        self.sequence = 0
+        self.position_estimate = np.zeros((0, 4))
+        self.telemetry_sequence = 0
+        self.ack_sequence = 0
+        self.latency = np.nan
+
+        self.running = True
+        self.telemetry_thread = threading.Thread(name="telemetry", target=self._receive)
+        self.telemetry_thread.daemon = True
+        self.telemetry_thread.start()
+
+        # keep subscribing until the first telemetry arrives
+        deadline = time.time() + timeout
+        while self.telemetry_sequence == 0:
+            assert (
+                time.time() < deadline
+            ), f"No telemetry from ground station at {self.server}."
+            self._send(MSG_SUBSCRIBE, b"")
+            time.sleep(0.05)
+
+    @property
+    def num_drones(self):
+        """num_drones."""
+        return len(self.position_estimate)
+
+    def set_pos_control(self, setting: bool | np.ndarray):
+        """set_pos_control.
+
+        Args:
+            setting (bool | np.ndarray): whether to set all drones to pos control, or (n, ) mask of drones in pos control, applied with the next setpoints
+        """
+        self.modes = setting
+
+    @property
+    def pos_control(self):
+        """(n, ) mask of drones in pos control."""
+        return np.broadcast_to(np.asarray(self.modes, dtype=bool), (self.num_drones,))
+
+    def set_setpoints(self, setpoints: np.ndarray, modes: np.ndarray | None = None):
+        """set_setpoints.
+
+        Args:
+            setpoints (np.ndarray): (n, 4) array for setpoint corresponding to (x, y, z, yaw) or (vx, vy, vz, vyaw)
+            modes (np.ndarray | None): (n, ) mask of drones whose setpoints are positions, the rest are velocities, None keeps the current modes
+        """
+        assert (
+            len(setpoints) == self.num_drones
+        ), "number of setpoints must be equal to number of drones"
+        if modes is not None:
+            self.set_pos_control(np.array(modes, dtype=bool))
+
+        self._send(
+            MSG_SETPOINTS,
+            np.asarray(setpoints, dtype="<f4").tobytes()
+            + self.pos_control.astype("<f4").tobytes(),
+        )
+
+    def arm(self, settings: list[bool] | np.ndarray):
+        """arm.
+
+        Args:
+            settings (list[bool] | np.ndarray): (n, ) list of booleans corresponding to which drones to arm
+        """
+        assert (
+            len(settings) == self.num_drones
+        ), "masks length must be equal to number of drones"
+
+        self._send(MSG_ARM, np.asarray(settings, dtype="<f4").tobytes())
+
+    def sleep(self, seconds: float):
+        """sleep.
+
+        Args:
+            seconds (float): seconds
+        """
+        time.sleep(seconds)
+
+    def end(self):
+        """end."""
+        self.running = False
+        self.telemetry_thread.join()
+        self.sock.close()
+
+    def _send(self, msg_type: int, payload: bytes, flags: int = 0):
+        """_send.
+
+        Args:
+            msg_type (int): message type
+            payload (bytes): payload
+            flags (int): flags
+        """
+        self.sequence += 1
+        header = HEADER.pack(
+            msg_type, flags, self.num_drones, self.sequence, time.time()
+        )
+        self.sock.sendto(header + payload, self.server)
+
+    def _receive(self):
+        """Receives telemetry, and keeps the subscription alive while doing so."""
+        last_subscribe = time.monotonic()
+        while self.running:
+            if time.monotonic() - last_subscribe > self.keepalive_period:
+                last_subscribe = time.monotonic()
+                self.sock.sendto(
+                    HEADER.pack(MSG_SUBSCRIBE, 0, 0, 0, time.time()), self.server
+                )
+
+            try:
+                data = self.sock.recv(MAX_PACKET_BYTES)
+            except socket.timeout:
+                continue
+
+            if len(data) < HEADER.size + ACK.size:
+                continue
+            msg_type, _, num_drones, sequence, _ = HEADER.unpack_from(data)
+            if msg_type != MSG_TELEMETRY or sequence <= self.telemetry_sequence:
+                continue
+            if len(data) - HEADER.size - ACK.size != 16 * num_drones:
+                continue
+
+            ack_sequence, ack_time = ACK.unpack_from(data, HEADER.size)
+            if ack_sequence > self.ack_sequence:
+                # round trip from sending setpoints to seeing them acknowledged
+                self.latency = time.time() - ack_time
+                self.ack_sequence = ack_sequence
+
+            self.position_estimate = (
+                np.frombuffer(data, dtype="<f4", offset=HEADER.size + ACK.size)
+                .reshape(num_drones, 4)
+                .astype(np.float64)
+            )
+            self.telemetry_sequence = sequence
@@ -0,0 +1,279 @@
+"""Vectorized point mass model of the Crazyflie position controller, for previsualizing large swarms."""
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import yaml
+
+
+class PointMassAviary:
+    """PointMassAviary.
+
+    Drop in replacement for the parts of PyFlyt's `Aviary` that the Simulator uses,
+    where every drone is a point mass with yaw, and the whole swarm is stepped as batched array operations.
+
+    The cascade mirrors the PyFlyt QuadX controller in modes 6 and 7 using the gains from the model yaml file:
+    position P loops give velocity commands, velocity PID loops give a tilt and a collective thrust,
+    tilt follows its command through the angular position loop, and the motors follow the thrust with a first order lag.
+
+    `apply_params` can give each drone its own parameters, which lets parameter searches evaluate many candidates in one swarm.
+    """
+
+    gravity = 9.81
+    air_density = 1.225
+
+    def __init__(
+        self,
+        start_pos: np.ndarray,
+        start_orn: np.ndarray,
+        model_dir: str,
+        drone_model: str = "cf2x",
+        control_hz: int = 120,
+        physics_hz: int = 240,
+    ):
+        """__init__.
+
+        Args:
+            start_pos (np.ndarray): (n, 3) array of starting positions
+            start_orn (np.ndarray): (n, 3) array of starting orientations, only the yaw is used
+            model_dir (str): directory holding the drone model folders
+            drone_model (str): name of the drone model folder, holding <drone_model>.yaml and <drone_model>.urdf, see `params_path`
+            control_hz (int): rate of the controllers, one step runs one control update
+            physics_hz (int): rate of the integration
+        """
+        self.num_drones = len(start_pos)
+        self.update_period = 1.0 / control_hz
+        self.physics_period = 1.0 / physics_hz
+        self.substeps = max(int(physics_hz / control_hz), 1)
+
+        self.load_params(
+            self.params_path(model_dir, drone_model),
+            os.path.join(model_dir, drone_model, f"{drone_model}.urdf"),
+        )
+
+        n = self.num_drones
+        self.pos = np.array(start_pos, dtype=np.float64)
+        self.vel = np.zeros((n, 3))
+        self.yaw = np.array(start_orn, dtype=np.float64)[:, -1].copy()
+        self.yaw_rate = np.zeros((n,))
+        # tilt towards +x and +y, that is pitch and negative roll
+        self.tilt = np.zeros((n, 2))
+        self.throttle = np.zeros((n,))
+
+        self.setpoints = np.zeros((n, 4))
+        self.modes = np.full((n,), 7)
+        self.armed = np.zeros((n,), dtype=bool)
+
+        # controller memory, integrals and previous errors of the velocity PIDs
+        self.xy_integral = np.zeros((n, 2))
+        self.xy_error = np.zeros((n, 2))
+        self.z_integral = np.zeros((n,))
+        self.z_error = np.zeros((n,))
+
+        # commands held between control updates
+        self.tilt_cmd = np.zeros((n, 2))
+        self.throttle_cmd = np.zeros((n,))
+        self.yaw_rate_cmd = np.zeros((n,))
+
+    @staticmethod
+    def params_path(model_dir: str, drone_model: str) -> str:
+        """Path of the yaml file the point mass model reads its parameters from.
+
+        Parameters fitted on this model, see `SystemIdentifier`, live in <drone_model>.point_mass.yaml next to the PyBullet yaml,
+        since its gains do not mean the same thing as in the full controller cascade. Models without one use <drone_model>.yaml.
+
+        Args:
+            model_dir (str): directory holding the drone model folders
+            drone_model (str): name of the drone model folder
+        """
+        path = os.path.join(model_dir, drone_model, f"{drone_model}.point_mass.yaml")
+        if os.path.exists(path):
+            return path
+        return os.path.join(model_dir, drone_model, f"{drone_model}.yaml")
+
+    def load_params(self, yaml_path: str, urdf_path: str):
+        """Reads the controller gains, thrust and drag from the model yaml, and the mass from the urdf.
+
+        Args:
+            yaml_path (str): path to the model yaml file
+            urdf_path (str): path to the model urdf file
+        """
+        # the first inertial block is the body, the rest are massless
+        mass = ET.parse(urdf_path).find(".//inertial/mass")
+        assert mass is not None, f"no inertial mass found in {urdf_path}."
+        self.mass = float(mass.get("value", 0.0))
+
+        with open(yaml_path) as f:
+            self.params = yaml.safe_load(f)
+        self.apply_params(self.params)
+
+    def apply_params(self, params: dict):
+        """Sets the controller gains, thrust and drag.
+
+        Args:
+            params (dict): parameters laid out like the model yaml, any value may be an array with a leading (n, ) axis to give each drone its own
+        """
+        control = params["control_params"]
+
+        def gains(name):
+            return [
+                np.asarray(control[name][k], dtype=np.float64)
+                for k in ("kp", "ki", "kd", "lim")
+            ]
+
+        self.lin_pos = gains("lin_pos")
+        self.lin_vel = gains("lin_vel")
+        self.ang_pos = gains("ang_pos")
+        self.z_pos = gains("z_pos")
+        self.z_vel = gains("z_vel")
+
+        self.total_thrust = np.asarray(params["motor_params"]["total_thrust"])
+        self.motor_tau = np.asarray(params["motor_params"]["tau"])
+        drag = params["drag_params"]
+        self.drag = (
+            0.5
+            * self.air_density
+            * np.asarray(drag["drag_coef_xyz"])
+            * np.asarray(drag["drag_area_xyz"])
+        )
+
+    @property
+    def all_states(self) -> np.ndarray:
+        """(n, 4, 3) array of [ang_vel, ang_pos, lin_vel, lin_pos] in the same layout as the Aviary."""
+        states = np.zeros((self.num_drones, 4, 3))
+        states[:, 0, 2] = self.yaw_rate
+        states[:, 1, 0] = -self.tilt[:, 1]
+        states[:, 1, 1] = self.tilt[:, 0]
+        states[:, 1, 2] = self.yaw
+        states[:, 2] = self.vel
+        states[:, 3] = self.pos
+        return states
+
+    def set_mode(self, flight_modes: int | list[int]):
+        """set_mode.
+
+        Args:
+            flight_modes (int | list[int]): 6 for velocity control or 7 for position control, for all drones or for each drone
+        """
+        modes = np.broadcast_to(np.asarray(flight_modes), (self.num_drones,))
+        assert np.all(
+            np.isin(modes, (6, 7))
+        ), f"only modes 6 and 7 are modelled, got {flight_modes}."
+        self.modes = modes.copy()
+
+    def set_armed(self, settings: int | bool | list[int] | list[bool]):
+        """set_armed.
+
+        Args:
+            settings (int | bool | list[int] | list[bool]): arm state for all drones or for each drone
+        """
+        self.armed = np.broadcast_to(
+            np.asarray(settings, dtype=bool), (self.num_drones,)
+        ).copy()
+
+        # disarmed drones lose their controller memory
+        self.xy_integral[~self.armed] = 0.0
+        self.z_integral[~self.armed] = 0.0
+
+    def set_all_setpoints(self, setpoints: np.ndarray):
+        """set_all_setpoints.
+
+        Args:
+            setpoints (np.ndarray): (n, 4) array of setpoints in the Aviary order of [x, y, yaw, z] or [vx, vy, vyaw, vz]
+        """
+        self.setpoints = np.array(setpoints, dtype=np.float64)
+
+    def reorder(self, order: np.ndarray):
+        """Reorders the drones, the equivalent of reordering `Aviary.drones`.
+
+        Args:
+            order (np.ndarray): (n, ) array of old indices for each new index
+        """
+        for name in (
+            "pos", "vel", "yaw", "yaw_rate", "tilt", "throttle", "setpoints", "modes", "armed",
+            "xy_integral", "xy_error", "z_integral", "z_error", "tilt_cmd", "throttle_cmd", "yaw_rate_cmd",
+        ):  # fmt: skip
+            setattr(self, name, getattr(self, name)[order])
+
+    def update_control(self):
+        """Runs the controller cascade for all drones at once."""
+        pos_mode = self.modes == 7
+        period = self.update_period
+
+        # position loops give velocity commands, velocity mode takes them straight from the setpoints
+        kp, _, _, lim = self.lin_pos
+        xy_vel_cmd = np.where(
+            pos_mode[:, None],
+            np.clip(kp * (self.setpoints[:, :2] - self.pos[:, :2]), -lim, lim),
+            self.setpoints[:, :2],
+        )
+        kp, _, _, lim = self.z_pos
+        z_vel_cmd = np.where(
+            pos_mode,
+            np.clip(kp * (self.setpoints[:, 3] - self.pos[:, 2]), -lim, lim),
+            self.setpoints[:, 3],
+        )
+        kp, _, _, lim = self.ang_pos
+        yaw_error = (self.setpoints[:, 2] - self.yaw + np.pi) % (2.0 * np.pi) - np.pi
+        self.yaw_rate_cmd = np.where(
+            pos_mode,
+            np.clip(kp[..., 2] * yaw_error, -lim[..., 2], lim[..., 2]),
+            self.setpoints[:, 2],
+        )
+
+        # velocity PIDs give tilt commands and collective throttle
+        error = xy_vel_cmd - self.vel[:, :2]
+        kp, ki, kd, lim = self.lin_vel
+        self.xy_integral += error * period
+        self.tilt_cmd = np.clip(
+            kp * error + ki * self.xy_integral + kd * (error - self.xy_error) / period,
+            -lim,
+            lim,
+        )
+        self.xy_error = error
+
+        error = z_vel_cmd - self.vel[:, 2]
+        kp, ki, kd, lim = self.z_vel
+        self.z_integral += error * period
+        self.throttle_cmd = np.clip(
+            kp * error + ki * self.z_integral + kd * (error - self.z_error) / period,
+            0.0,
+            lim,
+        )
+        self.z_error = error
+
+        # disarmed drones have their motors off
+        self.throttle_cmd[~self.armed] = 0.0
+
+    def update_physics(self):
+        """Integrates the point mass dynamics of all drones for one physics period."""
+        dt = self.physics_period
+        kp, _, _, lim = self.ang_pos
+
+        # attitude and motors follow their commands
+        tilt_rate = kp[..., :2] * (self.tilt_cmd - self.tilt)
+        self.tilt += np.clip(tilt_rate, -lim[..., :2], lim[..., :2]) * dt
+        self.yaw_rate = self.yaw_rate_cmd * self.armed
+        self.yaw += self.yaw_rate * dt
+        self.throttle += dt / self.motor_tau * (self.throttle_cmd - self.throttle)
+
+        # thrust scales with the square of the throttle, tilted along the tilt commands
+        thrust = self.total_thrust * self.throttle**2 / self.mass
+        accel = np.zeros_like(self.vel)
+        accel[:, :2] = thrust[:, None] * np.tan(self.tilt)
+        accel[:, 2] = thrust - self.gravity
+        accel -= np.expand_dims(self.drag / self.mass, -1) * np.abs(self.vel) * self.vel
+
+        # semi-implicit euler, with the ground stopping anything below it
+        self.vel += accel * dt
+        self.pos += self.vel * dt
+        grounded = self.pos[:, 2] <= 0.0
+        self.pos[grounded, 2] = 0.0
+        self.vel[grounded, :2] = 0.0
+        self.vel[grounded, 2] = np.maximum(self.vel[grounded, 2], 0.0)
+
+    def step(self):
+        """Steps the swarm by one control period."""
+        self.update_control()
+        for _ in range(self.substeps):
+            self.update_physics()
@@ -0,0 +1,106 @@
+"""Lightweight phase timers with Chrome trace export."""
+import collections
+import contextlib
+import json
+import time
+
+
+class Profiler:
+    """Profiler.
+
+    Accumulates wall clock time per named phase, and keeps a bounded ring of events that can be exported as a Chrome trace.
+    The trace can be opened in chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self, max_events: int = 100000):
+        """__init__.
+
+        Args:
+            max_events (int): number of most recent events to keep for the trace
+        """
+        self.totals = collections.defaultdict(float)
+        self.counts = collections.defaultdict(int)
+        self.events = collections.deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+
+    def record(self, name: str, start: float, duration: float):
+        """record.
+
+        Args:
+            name (str): name of the phase
+            start (float): `time.perf_counter` time the phase started at
+            duration (float): duration of the phase in seconds
+        """
+        self.totals[name] += duration
+        self.counts[name] += 1
+        self.events.append((name, start, duration))
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Times the body of a with block.
+
+        Args:
+            name (str): name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start)
+
+    def wrap(self, function, name: str):
+        """Returns a version of `function` that times every call.
+
+        Args:
+            function: function to time
+            name (str): name of the phase
+        """
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, start, time.perf_counter() - start)
+
+        return timed
+
+    def summary(self) -> dict:
+        """Total seconds, number of calls and mean seconds per call for every phase."""
+        return {
+            name: dict(
+                total=total,
+                count=self.counts[name],
+                mean=total / max(self.counts[name], 1),
+            )
+            for name, total in self.totals.items()
+        }
+
+    def export_json(self, path: str):
+        """Writes the summary as JSON.
+
+        Args:
+            path (str): output path
+        """
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def export_chrome_trace(self, path: str):
+        """Writes the recorded events in the Chrome trace event format.
+
+        Args:
+            path (str): output path
+        """
+        events = [
+            dict(
+                name=name,
+                ph="X",
+                ts=(start - self.origin) * 1e6,
+                dur=duration * 1e6,
+                pid=0,
+                tid=0,
+            )
+            for name, start, duration in self.events
+        ]
+        with open(path, "w") as f:
+            json.dump(dict(traceEvents=events, displayTimeUnit="ms"), f)
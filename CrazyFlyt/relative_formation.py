@@ -0,0 +1,115 @@
+"""Formations held relative to a moving virtual leader."""
+import numpy as np
+
+
+class RelativeFormation:
+    """RelativeFormation.
+
+    Drones holding fixed [x, y, z, yaw] offsets in the frame of a virtual leader.
+    The formation transform turns the offsets with the leader's yaw and scales them about the leader,
+    so that moving, turning or growing the whole formation only takes a new leader pose.
+
+    Between leader updates, the leader is carried along its last velocity,
+    so the drones' absolute setpoints can be resolved at every control tick from a leader trajectory sent at a lower rate.
+    """
+
+    def __init__(self, offsets: np.ndarray, centroid: bool = False):
+        """__init__.
+
+        Args:
+            offsets (np.ndarray): (n, 4) array of [x, y, z, yaw] offsets of each drone in the leader's frame
+            centroid (bool): shift the offsets so that the leader sits at their centroid
+        """
+        offsets = np.array(offsets, dtype=np.float64)
+        assert (
+            offsets.ndim == 2 and offsets.shape[1] == 4
+        ), f"offsets must be a (n, 4) array, got {offsets.shape}."
+        if centroid:
+            offsets[:, :3] -= np.mean(offsets[:, :3], axis=0)
+        self.offsets = offsets
+
+        # leader pose and velocity, and when the pose was given
+        self.pose = np.zeros((4,))
+        self.velocity = np.zeros((4,))
+        self.scale = 1.0
+        self.stamp = 0.0
+
+    @classmethod
+    def from_positions(cls, positions: np.ndarray, leader: np.ndarray | None = None):
+        """Builds a formation holding the drones where they are relative to a leader pose.
+
+        Args:
+            positions (np.ndarray): (n, 4) array of [x, y, z, yaw] positions of the drones, such as a formation from `formations`
+            leader (np.ndarray | None): [x, y, z, yaw] pose of the leader, defaults to the centroid of the positions with no yaw
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        if leader is None:
+            leader = np.zeros((4,))
+            leader[:3] = np.mean(positions[:, :3], axis=0)
+        leader = np.asarray(leader, dtype=np.float64)
+
+        # world offsets turned back into the leader's frame
+        c, s = np.cos(leader[3]), np.sin(leader[3])
+        delta = positions - leader
+        offsets = delta.copy()
+        offsets[:, 0] = c * delta[:, 0] + s * delta[:, 1]
+        offsets[:, 1] = -s * delta[:, 0] + c * delta[:, 1]
+
+        formation = cls(offsets)
+        formation.set_leader(leader)
+        return formation
+
+    @property
+    def num_drones(self):
+        """num_drones."""
+        return len(self.offsets)
+
+    def set_leader(
+        self,
+        pose: np.ndarray,
+        velocity: np.ndarray | None = None,
+        scale: float = 1.0,
+        now: float = 0.0,
+    ):
+        """Moves the leader.
+
+        Args:
+            pose (np.ndarray): [x, y, z, yaw] pose of the leader
+            velocity (np.ndarray | None): [vx, vy, vz, vyaw] velocity to carry the leader along until the next update, None holds it still
+            scale (float): factor applied to the offsets
+            now (float): time of the pose, on the same clock later passed to `resolve`
+        """
+        self.pose = np.asarray(pose, dtype=np.float64)
+        self.velocity = (
+            np.zeros((4,)) if velocity is None else np.asarray(velocity, np.float64)
+        )
+        self.scale = scale
+        self.stamp = now
+
+    def leader(self, now: float = 0.0) -> np.ndarray:
+        """[x, y, z, yaw] pose of the leader at a given time.
+
+        Args:
+            now (float): time on the same clock passed to `set_leader`
+        """
+        return self.pose + self.velocity * max(now - self.stamp, 0.0)
+
+    def resolve(self, now: float = 0.0) -> np.ndarray:
+        """Absolute setpoints of every drone at a given time.
+
+        Args:
+            now (float): time on the same clock passed to `set_leader`
+
+        Returns:
+            np.ndarray: (n, 4) array of [x, y, z, yaw] setpoints
+        """
+        leader = self.leader(now)
+        c, s = np.cos(leader[3]), np.sin(leader[3])
+
+        setpoints = self.offsets * self.scale
+        x, y = setpoints[:, 0].copy(), setpoints[:, 1].copy()
+        setpoints[:, 0] = c * x - s * y
+        setpoints[:, 1] = s * x + c * y
+        setpoints[:, 3] = self.offsets[:, 3]
+        setpoints += leader
+        return setpoints
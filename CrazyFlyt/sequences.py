@@ -0,0 +1,212 @@
+"""Synchronized takeoff and landing sequences for a SwarmController or Simulator.
+
+Drones are split into waves so that no two drones in the same wave are close enough horizontally to sit in each other's downwash,
+and each wave starts its altitude ramp `stagger` seconds after the one before.
+Arming and disarming are issued as single batches, and landing is finished from telemetry rather than timers.
+
+Both sequences need a local swarm, as they read the current setpoints, arming and link state straight off it.
+A Coordinator or RemoteSwarm does not expose those, so run the sequences on the SwarmController or Simulator behind them instead.
+"""
+import time
+
+import numpy as np
+
+LOCAL_ATTRIBUTES = ("setpoints", "armed", "connected", "estimate_state")
+
+
+def _clock(swarm):
+    """Clock of the swarm, simulated time for a Simulator and wall-clock time for hardware.
+
+    Args:
+        swarm (SwarmController | Simulator): swarm to time
+
+    Returns:
+        Callable[[], float]: function returning the current time in seconds
+    """
+    assert all(
+        hasattr(swarm, attribute) for attribute in LOCAL_ATTRIBUTES
+    ), f"sequences need a local SwarmController or Simulator, got {type(swarm).__name__}."
+
+    if hasattr(swarm, "elapsed_time"):
+        return lambda: swarm.elapsed_time
+    return time.monotonic
+
+
+def _waves(xy: np.ndarray, order: np.ndarray, radius: float) -> np.ndarray:
+    """Greedily assigns drones to the earliest wave without a drone within `radius` horizontally.
+
+    Args:
+        xy (np.ndarray): (n, 2) array of horizontal positions
+        order (np.ndarray): (n, ) order in which drones pick their waves
+        radius (float): horizontal distance below which two drones may not share a wave
+
+    Returns:
+        np.ndarray: (n, ) wave index of each drone
+    """
+    waves = np.full((len(xy),), -1)
+    for i in order:
+        near = np.linalg.norm(xy - xy[i], axis=-1) < radius
+        taken = set(waves[near & (waves >= 0)])
+        wave = 0
+        while wave in taken:
+            wave += 1
+        waves[i] = wave
+    return waves
+
+
+def _start(swarm, active: np.ndarray) -> np.ndarray:
+    """Where each drone starts its ramp, drones without telemetry hold their current setpoint instead of a made up position.
+
+    Args:
+        swarm (SwarmController | Simulator): swarm to read
+        active (np.ndarray): (n, ) mask of drones with a live link and usable telemetry
+    """
+    return np.where(
+        active[:, None],
+        np.nan_to_num(swarm.position_estimate),
+        np.asarray(swarm.setpoints, dtype=np.float64),
+    )
+
+
+def _active(swarm) -> np.ndarray:
+    """(n, ) mask of drones with a live link and usable telemetry.
+
+    Args:
+        swarm (SwarmController | Simulator): swarm to check
+    """
+    return swarm.connected & np.all(np.isfinite(swarm.position_estimate), axis=-1)
+
+
+def takeoff(
+    swarm,
+    height: float = 1.0,
+    speed: float = 0.5,
+    stagger: float = 0.5,
+    downwash_radius: float = 0.3,
+    tolerance: float = 0.1,
+    rate_hz: float = 20.0,
+    timeout: float = 20.0,
+) -> np.ndarray:
+    """Arms the swarm in one batch and ramps every drone up to `height` above its starting point, wave by wave.
+
+    Drones without a live link or telemetry are left disarmed and out of the ramp.
+
+    Args:
+        swarm (SwarmController | Simulator): swarm to take off
+        height (float): climb above the starting position of each drone
+        speed (float): climb rate of each drone's altitude setpoint
+        stagger (float): delay between the start of successive waves
+        downwash_radius (float): horizontal distance below which two drones are put in different waves
+        tolerance (float): distance to the target altitude at which a drone counts as airborne
+        rate_hz (float): setpoint update rate
+        timeout (float): longest time to wait, measured on the swarm's own clock
+
+    Returns:
+        np.ndarray: (n, ) mask of drones that reached their target altitude
+    """
+    now = _clock(swarm)
+    active = _active(swarm)
+    start = _start(swarm, active)
+    targets = start.copy()
+    targets[:, 2] += height
+
+    # any order works for takeoff, since every drone starts on the ground
+    waves = _waves(start[:, :2], np.arange(swarm.num_drones), downwash_radius)
+    launch = waves * stagger
+
+    swarm.set_pos_control(True)
+    swarm.set_setpoints(start)
+    swarm.arm(active)
+
+    period = 1.0 / rate_hz
+    begin = now()
+    elapsed = 0.0
+    airborne = ~active
+    while elapsed < timeout:
+        climb = np.where(active, np.clip(speed * (elapsed - launch), 0.0, height), 0.0)
+        setpoints = start.copy()
+        setpoints[:, 2] += climb
+        swarm.set_setpoints(setpoints)
+
+        airborne = ~active | (
+            (climb >= height)
+            & (np.abs(swarm.position_estimate[:, 2] - targets[:, 2]) < tolerance)
+        )
+        if np.all(airborne):
+            break
+
+        swarm.sleep(period)
+        elapsed = now() - begin
+
+    return active & airborne
+
+
+def land(
+    swarm,
+    ground: float = 0.0,
+    speed: float = 0.5,
+    stagger: float = 0.5,
+    downwash_radius: float = 0.3,
+    touchdown_height: float = 0.05,
+    touchdown_speed: float = 0.05,
+    rate_hz: float = 20.0,
+    timeout: float = 30.0,
+) -> float:
+    """Ramps every drone down to the ground, lowest drones first, and disarms each batch of drones as they touch down.
+
+    Drones without a live link or telemetry are left out of the ramp and hold their current setpoint.
+
+    Args:
+        swarm (SwarmController | Simulator): swarm to land
+        ground (float): altitude of the ground
+        speed (float): descent rate of each drone's altitude setpoint
+        stagger (float): delay between the start of successive waves
+        downwash_radius (float): horizontal distance below which two drones are put in different waves
+        touchdown_height (float): height above the ground below which a drone may count as landed
+        touchdown_speed (float): vertical speed below which a drone may count as landed
+        rate_hz (float): setpoint update rate
+        timeout (float): longest time to wait before disarming every drone regardless, measured on the swarm's own clock
+
+    Returns:
+        float: time taken until the last drone was disarmed
+    """
+    now = _clock(swarm)
+    active = _active(swarm) & swarm.armed
+    start = _start(swarm, active)
+
+    # drones below others land first, so that nobody descends through someone else's downwash
+    waves = _waves(start[:, :2], np.argsort(start[:, 2]), downwash_radius)
+    descend = waves * stagger
+    drop = np.where(active, np.maximum(start[:, 2] - ground, 0.0), 0.0)
+
+    swarm.set_pos_control(True)
+
+    period = 1.0 / rate_hz
+    begin = now()
+    elapsed = 0.0
+    landed = ~active
+    while elapsed < timeout:
+        setpoints = start.copy()
+        setpoints[:, 2] -= np.minimum(speed * np.maximum(elapsed - descend, 0.0), drop)
+        swarm.set_setpoints(setpoints)
+
+        # touchdown is read off the telemetry, low enough and no longer sinking
+        positions, velocities = swarm.estimate_state()
+        touched = (positions[:, 2] - ground < touchdown_height) & (
+            np.abs(velocities[:, 2]) < touchdown_speed
+        )
+        newly_landed = active & ~landed & touched
+        if np.any(newly_landed):
+            landed |= newly_landed
+            swarm.arm(swarm.armed & ~newly_landed)
+        if np.all(landed):
+            return elapsed
+
+        swarm.sleep(period)
+        elapsed = now() - begin
+
+    print(
+        f"Landing timed out after {timeout} seconds, disarming {np.sum(~landed)} drones in the air."
+    )
+    swarm.arm(np.zeros((swarm.num_drones,), dtype=bool))
+    return elapsed
@@ -0,0 +1,140 @@
+"""Bounded prefetching of setpoint frames from lazy sources."""
+import asyncio
+import queue
+import threading
+import time
+
+import numpy as np
+
+# marks the end of the source in the prefetch queue
+_END = object()
+
+
+class SetpointStream:
+    """SetpointStream.
+
+    Pulls (n, 4) setpoint frames from an iterator, generator or async iterator on a background thread,
+    keeping at most `max_prefetch` frames ahead of the consumer so that long shows never sit in memory at once.
+
+    When the consumer asks for a frame and none is ready, the stream under-runs:
+    the last frame is handed out again so the swarm holds its setpoints, and the under-run is counted.
+    """
+
+    def __init__(self, source, max_prefetch: int = 64):
+        """__init__.
+
+        Args:
+            source: iterable or async iterable of (n, 4) setpoint frames
+            max_prefetch (int): most frames to buffer ahead of the consumer, the source is paused while the buffer is full
+        """
+        assert max_prefetch > 0, f"max_prefetch must be positive, got {max_prefetch}."
+
+        self.source = source
+        self.buffer = queue.Queue(maxsize=max_prefetch)
+        self.last_frame = None
+        self.finished = False
+        self.error = None
+
+        # statistics
+        self.frames = 0
+        self.underruns = 0
+        self.underrun = False
+
+        self.running = True
+        self.prefetch_thread = threading.Thread(name="prefetch", target=self._prefetch)
+        self.prefetch_thread.daemon = True
+        self.prefetch_thread.start()
+
+    def _put(self, item) -> bool:
+        """Blocks until there is room in the buffer, or the stream is closed.
+
+        Args:
+            item: frame or end marker to buffer
+
+        Returns:
+            bool: whether the item was buffered
+        """
+        while self.running:
+            try:
+                self.buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _prefetch(self):
+        """_prefetch."""
+        try:
+            if hasattr(self.source, "__aiter__"):
+
+                async def drain():
+                    async for frame in self.source:
+                        if not self._put(np.array(frame, dtype=np.float64)):
+                            return
+
+                asyncio.run(drain())
+            else:
+                for frame in self.source:
+                    if not self._put(np.array(frame, dtype=np.float64)):
+                        return
+        except Exception as e:
+            self.error = e
+
+        self._put(_END)
+
+    def prefill(self, timeout: float = 1.0):
+        """Waits for the buffer to fill, or the source to run out, so that playback starts with frames in hand.
+
+        Args:
+            timeout (float): longest time to wait
+        """
+        deadline = time.monotonic() + timeout
+        while (
+            self.buffer.qsize() < self.buffer.maxsize
+            and self.prefetch_thread.is_alive()
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.001)
+
+    def next_frame(self) -> np.ndarray | None:
+        """Takes the next frame without waiting, holding the last frame if none is ready.
+
+        Only the very first frame is waited for, since there is nothing to hold before it.
+
+        Returns:
+            np.ndarray | None: (n, 4) setpoints, or None once the source is exhausted
+        """
+        if self.finished:
+            return None
+
+        try:
+            item = self.buffer.get(block=self.last_frame is None)
+        except queue.Empty:
+            if not self.underrun:
+                print(
+                    f"Setpoint stream under-run after {self.frames} frames, holding the last setpoints."
+                )
+            self.underrun = True
+            self.underruns += 1
+            return self.last_frame
+
+        if item is _END:
+            self.finished = True
+            if self.error is not None:
+                raise self.error
+            return None
+
+        self.underrun = False
+        self.frames += 1
+        self.last_frame = item
+        return item
+
+    @property
+    def buffered(self) -> int:
+        """Number of frames currently prefetched."""
+        return self.buffer.qsize()
+
+    def close(self):
+        """Stops pulling from the source."""
+        self.running = False
+        self.finished = True
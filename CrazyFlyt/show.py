@@ -0,0 +1,493 @@
+"""Offline compilation, validation and storage of drone shows."""
+import zlib
+from struct import Struct
+from typing import Callable
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial import cKDTree
+
+from .geofence import Geofence
+from .trajectory import Trajectory
+
+# magic, version, num_drones, num_frames, rate_hz, crc32 of the frame data
+HEADER = Struct("<6sHIIdI")
+MAGIC = b"CFSHOW"
+VERSION = 1
+
+
+def _check(worst: float, limit: float, failed: np.ndarray, period: float) -> dict:
+    """Summarizes one show check.
+
+    Args:
+        worst (float): worst value seen over the show
+        limit (float): allowed limit of the value
+        failed (np.ndarray): (k, n) mask of drones failing the check at each frame
+        period (float): seconds between frames
+
+    Returns:
+        dict: whether the check `passed`, the `worst` value and its `limit`,
+        and the `first_time` and `drones` where it failed
+    """
+    frames = np.flatnonzero(np.any(failed, axis=-1))
+    return dict(
+        passed=len(frames) == 0,
+        worst=float(worst),
+        limit=float(limit),
+        first_time=float(frames[0] * period) if len(frames) else None,
+        drones=np.flatnonzero(np.any(failed, axis=0)),
+    )
+
+
+def _nearest(xyz: np.ndarray) -> np.ndarray:
+    """Distance from every drone to its nearest neighbour.
+
+    Args:
+        xyz (np.ndarray): (n, 3) array of positions
+
+    Returns:
+        np.ndarray: (n, ) array of distances, infinite for a lone drone
+    """
+    if len(xyz) < 2:
+        return np.full((len(xyz),), np.inf)
+    distances, _ = cKDTree(xyz).query(xyz, k=2)
+    return distances[:, 1]
+
+
+class Show:
+    """Show.
+
+    A show is a fixed rate sequence of (n, 4) [x, y, z, yaw] setpoint frames, drone i flies column i of every frame.
+
+    On disk, frames are stored as little-endian int16 millimetres and milliradians after a small versioned header,
+    which fits shows within 32 meters of the origin at an eighth of the size of float64 frames.
+    Loaded shows are memory mapped, so that long shows are only read as they are played.
+    """
+
+    # int16 quantization of the stored frames, millimetres for position and milliradians for yaw
+    scale = np.array([1000.0, 1000.0, 1000.0, 1000.0])
+
+    def __init__(self, frames: np.ndarray, rate_hz: float = 50.0):
+        """__init__.
+
+        Args:
+            frames (np.ndarray): (k, n, 4) array of [x, y, z, yaw] setpoints for k frames and n drones
+            rate_hz (float): frames per second
+        """
+        frames = np.asarray(frames, dtype=np.float64)
+        assert (
+            frames.ndim == 3 and frames.shape[-1] == 4
+        ), f"frames must be a (k, n, 4) array, got {frames.shape}."
+        assert rate_hz > 0.0, f"rate_hz must be positive, got {rate_hz}."
+
+        quantized = np.round(frames * self.scale)
+        limit = np.iinfo(np.int16).max
+        assert np.all(
+            np.abs(quantized) <= limit
+        ), f"show frames must stay within {limit / self.scale[0]} meters and radians of zero."
+
+        self.data = quantized.astype("<i2")
+        self.rate_hz = float(rate_hz)
+
+    @classmethod
+    def _from_data(cls, data: np.ndarray, rate_hz: float):
+        """Wraps already quantized frames without copying them.
+
+        Args:
+            data (np.ndarray): (k, n, 4) int16 array of quantized frames
+            rate_hz (float): frames per second
+        """
+        show = cls.__new__(cls)
+        show.data = data
+        show.rate_hz = float(rate_hz)
+        return show
+
+    @classmethod
+    def from_function(
+        cls,
+        function: Callable[[float], np.ndarray],
+        duration: float,
+        rate_hz: float = 50.0,
+    ):
+        """Compiles a function of time into a show by sampling it at every frame.
+
+        Args:
+            function (Callable[[float], np.ndarray]): function mapping time in seconds to an (n, 4) array of [x, y, z, yaw] setpoints
+            duration (float): total duration of the show in seconds
+            rate_hz (float): frames per second
+        """
+        times = np.arange(int(round(duration * rate_hz)) + 1) / rate_hz
+        return cls(np.stack([function(t) for t in times]), rate_hz)
+
+    @classmethod
+    def from_trajectory(cls, trajectory: Trajectory, rate_hz: float = 50.0):
+        """Compiles a piecewise polynomial trajectory into a show.
+
+        Args:
+            trajectory (Trajectory): trajectory for all drones
+            rate_hz (float): frames per second
+        """
+        return cls.from_function(trajectory.evaluate, trajectory.duration, rate_hz)
+
+    @classmethod
+    def from_keyframes(
+        cls, times: np.ndarray, keyframes: np.ndarray, rate_hz: float = 50.0
+    ):
+        """Compiles timed keyframes into a show, moving smoothly between them and resting at both ends.
+
+        Args:
+            times (np.ndarray): (k, ) strictly increasing array of times for each keyframe
+            keyframes (np.ndarray): (k, n, 4) array of [x, y, z, yaw] keyframes for n drones
+            rate_hz (float): frames per second
+        """
+        keyframes = np.asarray(keyframes, dtype=np.float64)
+        trajectory = Trajectory.from_waypoints(times, keyframes.transpose(1, 0, 2))
+        return cls.from_trajectory(trajectory, rate_hz)
+
+    @classmethod
+    def from_script(
+        cls,
+        script: Callable,
+        start_states: np.ndarray,
+        rate_hz: float = 50.0,
+        max_speed: float | None = None,
+    ):
+        """Compiles an imperative show script by running it against a `ShowRecorder` instead of a swarm.
+
+        Args:
+            script (Callable): function taking a swarm, using only `set_pos_control`, `set_setpoints`, `reshuffle`, `arm` and `sleep`
+            start_states (np.ndarray): (n, 4) array of starting states for the drones in terms of [x, y, z, yaw]
+            rate_hz (float): frames per second
+            max_speed (float | None): top speed at which the recorded setpoints follow jumps in the commanded ones, None records jumps as they are
+        """
+        recorder = ShowRecorder(start_states, rate_hz, max_speed)
+        script(recorder)
+        return recorder.show()
+
+    @property
+    def num_frames(self):
+        """num_frames."""
+        return self.data.shape[0]
+
+    @property
+    def num_drones(self):
+        """num_drones."""
+        return self.data.shape[1]
+
+    @property
+    def duration(self):
+        """duration."""
+        return (self.num_frames - 1) / self.rate_hz
+
+    @property
+    def frames(self) -> np.ndarray:
+        """(k, n, 4) array of all frames, this reads the whole show into memory."""
+        return self.data / self.scale
+
+    def frame(self, index: int) -> np.ndarray:
+        """(n, 4) array of setpoints at one frame.
+
+        Args:
+            index (int): index of the frame
+        """
+        return self.data[index] / self.scale
+
+    def __len__(self):
+        """__len__."""
+        return self.num_frames
+
+    def __iter__(self):
+        """Yields the frames one at a time, suitable for `play`."""
+        for index in range(self.num_frames):
+            yield self.frame(index)
+
+    def save(self, path: str):
+        """Writes the show to a binary show file.
+
+        Args:
+            path (str): path of the show file
+        """
+        data = np.ascontiguousarray(self.data, dtype="<i2")
+        with open(path, "wb") as f:
+            f.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    self.num_drones,
+                    self.num_frames,
+                    self.rate_hz,
+                    zlib.crc32(data),
+                )
+            )
+            f.write(data.tobytes())
+
+    @classmethod
+    def load(cls, path: str, verify: bool = True):
+        """Memory maps a binary show file.
+
+        Args:
+            path (str): path of the show file
+            verify (bool): check the frame data against the stored checksum, which reads the whole file once
+        """
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        assert len(header) == HEADER.size, f"{path} is too short to be a show file."
+
+        magic, version, num_drones, num_frames, rate_hz, crc = HEADER.unpack(header)
+        assert magic == MAGIC, f"{path} is not a show file."
+        assert (
+            version == VERSION
+        ), f"{path} is a version {version} show file, only version {VERSION} is supported."
+
+        data = np.memmap(
+            path,
+            dtype="<i2",
+            mode="r",
+            offset=HEADER.size,
+            shape=(num_frames, num_drones, 4),
+        )
+        assert not verify or zlib.crc32(data) == crc, f"{path} is corrupted."
+
+        return cls._from_data(data, rate_hz)
+
+    def validate(
+        self,
+        min_separation: float = 0.3,
+        geofence: Geofence | None = None,
+        max_velocity: float = 2.0,
+        max_acceleration: float = 4.0,
+        endurance: float = 420.0,
+        battery_reserve: float = 0.25,
+        overhead: float = 30.0,
+        window: float = 0.1,
+    ) -> dict:
+        """Checks the whole show against separation, workspace, dynamics and battery limits.
+
+        Args:
+            min_separation (float): smallest allowed distance between any two drones
+            geofence (Geofence | None): workspace every setpoint must lie in, None skips the check
+            max_velocity (float): top speed of any drone between frames
+            max_acceleration (float): top acceleration of any drone between frames
+            endurance (float): seconds of flight from a full to an empty battery
+            battery_reserve (float): fraction of the battery that must be left after landing
+            overhead (float): seconds of flight spent outside the show, such as taking off, forming up and landing
+            window (float): seconds over which velocity and acceleration are measured
+
+        Returns:
+            dict: a `_check` result for each of `separation`, `geofence`, `velocity`, `acceleration` and `battery`
+        """
+        report = dict()
+        period = 1.0 / self.rate_hz
+
+        # separation, from the nearest neighbour of every drone at every frame
+        nearest = np.stack([_nearest(self.frame(i)[:, :3]) for i in range(len(self))])
+        report["separation"] = _check(
+            np.min(nearest), min_separation, nearest < min_separation, period
+        )
+
+        xyz = self.frames[..., :3]
+
+        # workspace
+        if geofence is not None:
+            excess = geofence.excess(xyz.reshape(-1, 3)).reshape(xyz.shape[:2])
+            report["geofence"] = _check(
+                np.max(excess), 0.0, excess > 1.0 / self.scale[0], period
+            )
+
+        # dynamics, from differences over a short window so that the millimetre steps of the file do not show up as jerks
+        stride = max(1, int(round(window * self.rate_hz)))
+        velocity = (xyz[stride:] - xyz[:-stride]) / (stride * period)
+        speed = np.linalg.norm(velocity, axis=-1)
+        too_fast = np.zeros((self.num_frames, self.num_drones), dtype=bool)
+        too_fast[stride:] = speed > max_velocity
+        report["velocity"] = _check(
+            np.max(speed, initial=0.0), max_velocity, too_fast, period
+        )
+
+        acceleration = np.linalg.norm(
+            (velocity[stride:] - velocity[:-stride]) / (stride * period), axis=-1
+        )
+        too_hard = np.zeros((self.num_frames, self.num_drones), dtype=bool)
+        stop = stride + len(acceleration)
+        too_hard[stride:stop] = acceleration > max_acceleration
+        report["acceleration"] = _check(
+            np.max(acceleration, initial=0.0), max_acceleration, too_hard, period
+        )
+
+        # battery, every drone flies for the whole show
+        flight_time = self.duration + overhead
+        budget = endurance * (1.0 - battery_reserve)
+        over_budget = np.zeros((self.num_frames, self.num_drones), dtype=bool)
+        if flight_time > budget:
+            empty = min(int(max(budget - overhead, 0.0) * self.rate_hz), len(self) - 1)
+            over_budget[empty:] = True
+        report["battery"] = _check(flight_time, budget, over_budget, period)
+
+        return report
+
+    def simulate(
+        self,
+        backend: str = "point_mass",
+        settle: float = 3.0,
+        min_separation: float = 0.15,
+        max_error: float = 0.5,
+        **simulator_kwargs,
+    ) -> dict:
+        """Flies the show in a `Simulator` as fast as it runs, headless by default, starting in the air at the first frame.
+
+        Args:
+            backend (str): "point_mass" for a fast check, or "pybullet" for the full digital twin
+            settle (float): seconds spent holding the first frame before the show starts
+            min_separation (float): smallest allowed distance between any two simulated drones
+            max_error (float): largest allowed distance between a simulated drone and its setpoint
+            simulator_kwargs: other arguments to the `Simulator`, such as `render`
+
+        Returns:
+            dict: a `_check` result for each of `separation` and `tracking`
+        """
+        # imported here since the simulator itself imports this module
+        from .simulator import Simulator
+
+        # headless unless asked otherwise
+        simulator_kwargs.setdefault("render", False)
+        UAVs = Simulator(self.frame(0), backend=backend, **simulator_kwargs)
+        UAVs.set_pos_control(True)
+        UAVs.arm([True] * self.num_drones)
+        UAVs.set_setpoints(self.frame(0))
+        UAVs.sleep(settle)
+
+        period = 1.0 / self.rate_hz
+        nearest = np.zeros((self.num_frames, self.num_drones))
+        error = np.zeros((self.num_frames, self.num_drones))
+        deadline = UAVs.elapsed_time
+        for index, frame in enumerate(self):
+            UAVs.set_setpoints(frame)
+            deadline += period
+            UAVs.sleep(max(deadline - UAVs.elapsed_time, 0.0) + 1e-9)
+
+            xyz = UAVs.get_states()[:, :3]
+            error[index] = np.linalg.norm(xyz - frame[:, :3], axis=-1)
+            nearest[index] = _nearest(xyz)
+
+        if backend == "pybullet":
+            UAVs.env.disconnect()
+
+        return dict(
+            separation=_check(
+                np.min(nearest), min_separation, nearest < min_separation, period
+            ),
+            tracking=_check(np.max(error), max_error, error > max_error, period),
+        )
+
+
+class ShowRecorder:
+    """ShowRecorder.
+
+    Stands in for a SwarmController or Simulator so that imperative show scripts can be compiled offline.
+    Every `sleep` records the current setpoints at a fixed frame rate, without waiting in real time.
+
+    Drones keep their column in the recorded show across `reshuffle`, which only changes which drone the script's indices refer to.
+    """
+
+    def __init__(
+        self,
+        start_states: np.ndarray,
+        rate_hz: float = 50.0,
+        max_speed: float | None = None,
+    ):
+        """__init__.
+
+        Args:
+            start_states (np.ndarray): (n, 4) array of starting states for the drones in terms of [x, y, z, yaw]
+            rate_hz (float): frames per second
+            max_speed (float | None): top speed at which the recorded setpoints follow jumps in the commanded ones, None records jumps as they are
+        """
+        self.rate_hz = rate_hz
+        self.max_speed = max_speed
+
+        self.setpoints = np.array(start_states, dtype=np.float64)
+        self.current = self.setpoints.copy()
+        self.order = np.arange(len(self.setpoints))
+        self.armed = np.zeros((self.num_drones,), dtype=bool)
+        self.frames = []
+
+        # frame times are kept exact, sleeps that do not land on a frame carry over
+        self.elapsed_time = 0.0
+        self.recorded_time = 0.0
+
+    @property
+    def num_drones(self):
+        """num_drones."""
+        return len(self.setpoints)
+
+    @property
+    def position_estimate(self):
+        """The recorded setpoints in the script's order, standing in for telemetry."""
+        return self.current[self.order]
+
+    def set_pos_control(self, setting: bool):
+        """Only position control can be compiled into a show.
+
+        Args:
+            setting (bool): must be True
+        """
+        assert setting, "shows can only be compiled from position setpoints."
+
+    def set_setpoints(self, setpoints: np.ndarray):
+        """set_setpoints.
+
+        Args:
+            setpoints (np.ndarray): (n, 4) array of [x, y, z, yaw] setpoints in the script's order
+        """
+        self.setpoints[self.order] = setpoints
+
+    def reshuffle(self, new_pos: np.ndarray, penalty: np.ndarray | None = None):
+        """Assigns target positions to drones the same way the swarm does.
+
+        Args:
+            new_pos (np.ndarray): (n, 4) array for the target position to assign to all the drones
+            penalty (np.ndarray | None): (n, n) array of extra cost for assigning each target position (rows) to each drone (columns)
+        """
+        cost = np.sum(
+            np.abs(self.position_estimate[None, :, :3] - new_pos[:, None, :3]), axis=-1
+        )
+        _, reassignment = linear_sum_assignment(
+            cost if penalty is None else cost + penalty
+        )
+        self.order = self.order[reassignment]
+        self.set_setpoints(new_pos)
+
+    def arm(self, settings: list[bool] | np.ndarray):
+        """Arming is left to the show runner, this only keeps track of it.
+
+        Args:
+            settings (list[bool] | np.ndarray): arm setting for each drone in the script's order
+        """
+        self.armed[self.order] = np.asarray(settings, dtype=bool)
+
+    def sleep(self, seconds: float = 0.0):
+        """Records frames for the given time.
+
+        Args:
+            seconds (float): seconds to hold the current setpoints for
+        """
+        period = 1.0 / self.rate_hz
+        self.elapsed_time += seconds
+        while self.recorded_time <= self.elapsed_time + 1e-9:
+            if self.max_speed is None:
+                self.current = self.setpoints.copy()
+            else:
+                step = self.setpoints - self.current
+                distance = np.linalg.norm(step[:, :3], axis=-1, keepdims=True)
+                scale = np.minimum(
+                    1.0, self.max_speed * period / np.maximum(distance, 1e-9)
+                )
+                self.current[:, :3] += step[:, :3] * scale
+                self.current[:, 3] = self.setpoints[:, 3]
+
+            self.frames.append(self.current.copy())
+            self.recorded_time += period
+
+    def show(self) -> Show:
+        """Compiles everything recorded so far into a show."""
+        return Show(np.stack(self.frames), self.rate_hz)
@@ -1,4 +1,5 @@
 """Virtual version of the swarm_controller or drone_controller code."""
+import contextlib
 import copy
 import os
 import time
@@ -7,6 +8,16 @@ import numpy as np
 from PyFlyt.core import Aviary
 from scipy.optimize import linear_sum_assignment
 
+from .geofence import Geofence
+from .point_mass import PointMassAviary
+from .profiler import Profiler
+from .relative_formation import RelativeFormation
+from .setpoint_stream import SetpointStream
+from .show import Show
+from .state_bus import StateBus
+from .state_estimator import StateEstimator
+from .trajectory import Trajectory
+
 
 class Simulator:
     """Simulator.
@@ -20,18 +31,43 @@ class Simulator:
         x, y, z, r
     """
 
-    def __init__(self, start_states: np.ndarray):
+    def __init__(
+        self,
+        start_states: np.ndarray,
+        control_hz: float | list[float] | None = None,
+        adaptive: bool = False,
+        setpoint_threshold: float = 0.01,
+        keepalive_period: float = 0.25,
+        backend: str = "pybullet",
+        render: bool = True,
+        model_dir: str | None = None,
+        drone_model: str = "cf2x",
+    ):
         """__init__.
 
         Args:
             start_states (np.ndarray): (n, 4) array of starting states for the drones in terms of [x, y, z, yaw]
+            control_hz (float | list[float] | None): rate at which setpoints reach each drone to mirror the radio link, None passes them through every step
+            adaptive (bool): only send setpoints when they change by more than `setpoint_threshold`, or when `keepalive_period` runs out
+            setpoint_threshold (float): smallest change in any setpoint element that triggers a send in adaptive mode
+            keepalive_period (float): longest time between sends in adaptive mode
+            backend (str): "pybullet" for the full PyFlyt digital twin, or "point_mass" for the vectorized model meant for swarms of hundreds of drones
+            render (bool): whether to open the PyBullet GUI, the point mass backend never renders
+            model_dir (str | None): directory holding the drone model folders, defaults to the bundled models
+            drone_model (str): name of the drone model, such as one fitted and written by `SystemIdentifier`
         """
+        assert backend in (
+            "pybullet",
+            "point_mass",
+        ), f"backend must be 'pybullet' or 'point_mass', got {backend}."
+        self.backend = backend
+
         # we use a custom drone that is accurate to the real model
         drone_options = dict()
-        drone_options["model_dir"] = os.path.join(
+        drone_options["model_dir"] = model_dir or os.path.join(
             os.path.dirname(os.path.realpath(__file__)), "./models/"
         )
-        drone_options["drone_model"] = "cf2x"
+        drone_options["drone_model"] = drone_model
 
         # splice out the state into something that we can pass to aviary
         start_pos = start_states[:, :3]
@@ -39,24 +75,71 @@ class Simulator:
         start_orn[:, -1] = start_states[:, -1]
 
         # instantiate the digital twin
-        self.env = Aviary(
-            drone_type="quadx",
-            start_pos=start_pos,
-            start_orn=start_orn,
-            render=True,
-            drone_options=drone_options,
-        )
+        if backend == "point_mass":
+            self.env = PointMassAviary(
+                start_pos=start_pos, start_orn=start_orn, **drone_options
+            )
+        else:
+            self.env = Aviary(
+                drone_type="quadx",
+                start_pos=start_pos,
+                start_orn=start_orn,
+                render=render,
+                drone_options=drone_options,
+            )
+
+        # setpoint stream, rate limited per drone to mirror the radio link
+        self.setpoints = np.zeros((self.num_drones, 4))
+        self.sent_setpoints = np.zeros((self.num_drones, 4))
+        self.last_sent = np.full((self.num_drones,), -np.inf)
+        self.packets_sent = np.zeros((self.num_drones,), dtype=np.int64)
+        self.adaptive = adaptive
+        self.setpoint_threshold = setpoint_threshold
+        self.keepalive_period = keepalive_period
+        self.set_control_rate(control_hz)
+
+        self.estimator = StateEstimator(self.num_drones)
         self.set_pos_control(True)
         self.env.set_armed([0] * self.env.num_drones)
 
+        # crude battery model, voltage drops linearly with time spent armed
+        self.armed = np.zeros((self.num_drones,), dtype=bool)
+        self.flight_time = np.zeros((self.num_drones,))
+
         # keep track of runtime
         self.steps = 0
 
-    def reshuffle(self, new_pos):
+        # reshuffle solve times, for `get_metrics`
+        self.reshuffle_time = 0.0
+        self.reshuffles = 0
+
+        # shared memory bus for external consumers, see `publish_state`
+        self.state_bus = None
+        self.geofence = None
+
+        # profiling hooks, see `enable_profiling` and `add_step_callback`
+        self.profiler = None
+        self.profiled_calls = None
+        self.step_callbacks = []
+        self.last_sleep_end = None
+
+        # trajectory flown in place of streamed setpoints, mirrors the onboard high-level commander
+        self.trajectory = None
+        self.trajectory_start = 0.0
+        self.trajectory_time_scale = 1.0
+        self.trajectory_running = False
+
+        # formation held relative to a virtual leader in place of streamed setpoints, see `set_formation`
+        self.formation = None
+
+    def reshuffle(self, new_pos, penalty: np.ndarray | None = None):
         """reshuffle.
 
+        While a formation is held, its offsets are reordered along with the drones and it keeps control of the setpoints.
+
         Args:
             new_pos (np.ndarray): (n, 4) array for the target position to assign to all the drones
+            penalty (np.ndarray | None): (n, n) array of extra cost for assigning each target position (rows) to each drone (columns)
         """
         # if start pos is given, reassign to get drones to their positions automatically
         assert (
@@ -67,6 +150,7 @@ class Simulator:
         ), f"start pos must have 4 dimensions for [x, y, z, yaw], got {new_pos[0].shape[0]} dimensions."
 
         # compute cost matrix
+        start = time.perf_counter()
         cost = abs(
             np.expand_dims(self.position_estimate[:, :3], axis=0)
             - np.expand_dims(new_pos[:, :3], axis=1)
@@ -74,35 +158,145 @@ class Simulator:
         cost = np.sum(cost, axis=-1)
 
         # compute optimal assignment using Hungarian algo
-        _, reassignment = linear_sum_assignment(cost)
-        self.env.drones = [self.env.drones[i] for i in reassignment]
+        _, reassignment = linear_sum_assignment(
+            cost if penalty is None else cost + penalty
+        )
+        self.reshuffle_time += time.perf_counter() - start
+        self.reshuffles += 1
+        if self.backend == "point_mass":
+            self.env.reorder(reassignment)
+        else:
+            self.env.drones = [self.env.drones[i] for i in reassignment]
+        self.control_period = self.control_period[reassignment]
+        self.packets_sent = self.packets_sent[reassignment]
+        self.armed = self.armed[reassignment]
+        self.flight_time = self.flight_time[reassignment]
+        self.estimator.permute(reassignment)
+        if self.geofence is not None:
+            self.geofence.permute(reassignment)
+        if self.formation is not None:
+            self.formation.offsets = self.formation.offsets[reassignment]
 
-        # send setpoints
+        # send setpoints, a held formation keeps every drone in its own slot
         self.set_pos_control(True)
-        self.set_setpoints(new_pos)
+        if self.formation is None:
+            self.set_setpoints(new_pos)
+        else:
+            self.set_setpoints(self.formation.resolve(self.elapsed_time))
 
         cost = np.choose(reassignment, cost.T)
         return cost
 
-    def set_setpoints(self, setpoints: np.ndarray):
+    def set_geofence(self, geofence: Geofence | None):
+        """Filters every later setpoint batch through a geofence, None removes it.
+
+        Args:
+            geofence (Geofence | None): geofence to apply, its `violations` counts the filtered setpoints of each drone
+        """
+        self.geofence = geofence
+
+    def set_setpoints(self, setpoints: np.ndarray, modes: np.ndarray | None = None):
         """set_setpoints.
 
         Args:
             setpoints (np.ndarray): (n, 4) array for setpoint corresponding to (x, y, z, yaw) or (vx, vy, vz, vyaw)
+            modes (np.ndarray | None): (n, ) mask of drones whose setpoints are positions, the rest are velocities, None keeps the current modes
         """
-        # the setpoints in the digital twin has the last two dims flipped
-        corrected_setpoints = copy.deepcopy(setpoints)
-        corrected_setpoints[:, -2] = setpoints[:, -1]
-        corrected_setpoints[:, -1] = setpoints[:, -2]
-        self.env.set_all_setpoints(corrected_setpoints)
+        if modes is not None:
+            modes = np.broadcast_to(np.asarray(modes, dtype=bool), (self.num_drones,))
+            if np.any(modes != self.pos_control):
+                self.set_pos_control(modes.copy())
+
+        self.setpoints = np.array(setpoints, dtype=np.float64)
+        if self.geofence is not None:
+            self.setpoints = self.geofence.apply(
+                self.setpoints, self.pos_control, self.elapsed_time, self.get_states()
+            )
+        self._stream_setpoints()
+
+    def set_control_rate(self, control_hz: float | list[float] | np.ndarray | None):
+        """set_control_rate.
+
+        Args:
+            control_hz (float | list[float] | np.ndarray | None): rate at which setpoints reach each drone, None passes them through every step
+        """
+        if control_hz is None:
+            self.control_period = np.zeros((self.num_drones,))
+        else:
+            self.control_period = 1.0 / np.broadcast_to(
+                np.asarray(control_hz, dtype=np.float64), (self.num_drones,)
+            )
 
-    def set_pos_control(self, setting: bool):
+    def set_pos_control(self, setting: bool | np.ndarray):
         """set_pos_control.
 
         Args:
-            setting (bool): whether to set all drones to pos control
+            setting (bool | np.ndarray): whether to set all drones to pos control, or (n, ) mask of drones in pos control with the rest in velocity control
+        """
+        if np.ndim(setting) == 0:
+            self.env.set_mode(7 if setting else 6)
+        else:
+            # per drone modes within the one simulation, the Aviary only takes them as a list
+            self.env.set_mode(np.where(setting, 7, 6).tolist())
+        self.pos_control = setting
+
+        # a mode change is always sent immediately
+        self.last_sent[:] = -np.inf
+
+    def _stream_setpoints(self):
+        """Forwards the latest setpoints to the drones that are due for an update."""
+        due = self.elapsed_time - self.last_sent >= self.control_period - 1e-9
+        if self.adaptive:
+            changed = np.any(
+                np.abs(self.setpoints - self.sent_setpoints) > self.setpoint_threshold,
+                axis=-1,
+            )
+            due &= changed | (
+                self.elapsed_time - self.last_sent >= self.keepalive_period
+            )
+
+        if not np.any(due):
+            return
+
+        self.sent_setpoints[due] = self.setpoints[due]
+        self.last_sent[due] = self.elapsed_time
+        self.packets_sent += due
+
+        # the setpoints in the digital twin has the last two dims flipped
+        self.env.set_all_setpoints(self.sent_setpoints[:, [0, 1, 3, 2]])
+
+    def play(
+        self, source, rate_hz: float | None = None, max_prefetch: int = 64
+    ) -> SetpointStream:
+        """Streams setpoint frames from a lazy source at a fixed rate of simulated time, mirrors the SwarmController.
+
+        Args:
+            source: iterable or async iterable of (n, 4) setpoint frames
+            rate_hz (float | None): frames consumed per simulated second, defaults to the fastest control rate in the swarm
+            max_prefetch (int): most frames to buffer ahead
+
+        Returns:
+            SetpointStream: the finished stream, holding the frame and under-run counts
         """
-        self.env.set_mode(7 if setting else 6)
+        period = (
+            max(np.min(self.control_period), self.env.update_period)
+            if rate_hz is None
+            else 1.0 / rate_hz
+        )
+        stream = SetpointStream(source, max_prefetch)
+        stream.prefill()
+
+        # frames are due on an absolute schedule of simulated time, so rounding to whole steps does not drift
+        deadline = self.elapsed_time
+        try:
+            while (frame := stream.next_frame()) is not None:
+                self.set_setpoints(frame)
+                deadline += period
+                self.sleep(max(deadline - self.elapsed_time, 0.0) + 1e-9)
+        finally:
+            stream.close()
+
+        return stream
 
     def get_states(self):
         """get_states."""
@@ -121,21 +315,260 @@ class Simulator:
         """
         num_steps = 1 if seconds is None else int(seconds / self.env.update_period)
 
+        # whatever happened since the last sleep is the user's own code
+        if self.profiler is not None and self.last_sleep_end is not None:
+            start = time.perf_counter()
+            self.profiler.record(
+                "user", self.last_sleep_end, start - self.last_sleep_end
+            )
+
         for _ in range(num_steps):
-            self.steps += 1
-            self.env.step()
+            with self._phase("setpoints"):
+                if self.trajectory_running:
+                    self.set_setpoints(
+                        self.trajectory.evaluate(  # pyright: ignore [reportOptionalMemberAccess]
+                            (self.elapsed_time - self.trajectory_start)
+                            / self.trajectory_time_scale
+                        )
+                    )
+                elif self.formation is not None:
+                    self.set_setpoints(self.formation.resolve(self.elapsed_time))
+                else:
+                    self._stream_setpoints()
+
+            # `step` covers all of env.step, of which `control` and `physics` are parts
+            with self._phase("step"):
+                self.steps += 1
+                self.env.step()
+                self.flight_time += self.armed * self.env.update_period
+
+            with self._phase("telemetry"):
+                states = self.position_estimate
+                self.estimator.update(
+                    states, np.full((self.num_drones,), self.elapsed_time)
+                )
+                if self.state_bus is not None:
+                    self.state_bus.publish(
+                        states, self.sent_setpoints, self.elapsed_time
+                    )
+
+            with self._phase("callbacks"):
+                for callback in self.step_callbacks:
+                    callback(self)
+
+        if self.profiler is not None:
+            self.last_sleep_end = time.perf_counter()
 
-    def arm(self, settings: list[bool]):
+    def _phase(self, name: str):
+        """Times a phase of the step if profiling is enabled.
+
+        Args:
+            name (str): name of the phase
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(name)
+
+    def enable_profiling(self, max_events: int = 100000) -> Profiler:
+        """Starts timing each step, split into setpoint handling, PyFlyt control, physics, telemetry, callbacks and user code.
+
+        Args:
+            max_events (int): number of most recent events to keep for the Chrome trace
+
+        Returns:
+            Profiler: the profiler, use `summary`, `export_json` or `export_chrome_trace` to read it out
+        """
+        self.profiler = Profiler(max_events)
+        self.last_sleep_end = None
+
+        # the original callables are kept, so that enabling again replaces the wrappers instead of stacking on them
+        if self.profiled_calls is None:
+            if self.backend == "point_mass":
+                # the point mass backend steps the whole swarm in one control and one physics call
+                targets = [
+                    (self.env, "update_control", "control"),
+                    (self.env, "update_physics", "physics"),
+                ]
+            else:
+                # the per drone controllers and the physics engine
+                targets = [(self.env, "stepSimulation", "physics")]
+                for drone in self.env.drones:
+                    targets += [
+                        (drone, "update_control", "control"),
+                        (drone, "update_physics", "physics"),
+                        (drone, "update_state", "physics"),
+                    ]
+            self.profiled_calls = [
+                (owner, attribute, getattr(owner, attribute), phase)
+                for owner, attribute, phase in targets
+            ]
+
+        # instrument them in place
+        for owner, attribute, original, phase in self.profiled_calls:
+            setattr(owner, attribute, self.profiler.wrap(original, phase))
+
+        return self.profiler
+
+    def add_step_callback(self, callback):
+        """Registers a function that is called with the simulator after every step.
+
+        Args:
+            callback: function taking the Simulator as its only argument
+        """
+        self.step_callbacks.append(callback)
+
+    def estimate_state(self, now: float | None = None):
+        """Extrapolates the latest states of every drone using the current setpoints, mirrors the SwarmController.
+
+        Args:
+            now (float | None): simulation time to predict the states at, defaults to the current simulation time
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (n, 4) arrays of the predicted positions and velocities
+        """
+        return self.estimator.predict(
+            self.elapsed_time if now is None else now,
+            self.sent_setpoints,
+            self.pos_control,
+        )
+
+    def publish_state(self, name: str):
+        """Publishes the swarm state and setpoints on a shared memory bus after every step.
+
+        Args:
+            name (str): name of the shared memory block, readers attach with `StateBus(name)`
+        """
+        self.state_bus = StateBus(name, self.num_drones)
+
+    def play_show(self, show: Show | str, max_prefetch: int = 64) -> SetpointStream:
+        """Plays a compiled show at its own frame rate, see `Show`.
+
+        The swarm should already be armed and holding the first frame of the show.
+
+        Args:
+            show (Show | str): show, or path of a binary show file
+            max_prefetch (int): most frames to buffer ahead
+
+        Returns:
+            SetpointStream: the finished stream, holding the frame and under-run counts
+        """
+        if isinstance(show, str):
+            show = Show.load(show)
+        assert (
+            show.num_drones == self.num_drones
+        ), f"show is for {show.num_drones} drones, swarm has {self.num_drones}."
+
+        return self.play(show, show.rate_hz, max_prefetch)
+
+    def upload_trajectory(self, trajectory: Trajectory, trajectory_id: int = 1):
+        """Stores a trajectory for all drones, mirroring the upload to the onboard trajectory memory.
+
+        Args:
+            trajectory (Trajectory): trajectory for all drones, drone i flies trajectory.coefficients[i]
+            trajectory_id (int): unused, kept for parity with the SwarmController
+        """
+        assert (
+            trajectory.num_drones == self.num_drones
+        ), f"trajectory must be for {self.num_drones} drones, got {trajectory.num_drones}."
+
+        self.trajectory = trajectory
+
+    def start_trajectory(self, trajectory_id: int = 1, time_scale: float = 1.0):
+        """Starts the uploaded trajectory on all drones at once.
+
+        Args:
+            trajectory_id (int): unused, kept for parity with the SwarmController
+            time_scale (float): time factor, >1.0 is slower, <1.0 is faster
+        """
+        assert (
+            self.trajectory is not None
+        ), "must upload a trajectory before starting it."
+
+        self.set_pos_control(True)
+        self.trajectory_start = self.elapsed_time
+        self.trajectory_time_scale = time_scale
+        self.trajectory_running = True
+
+    def stop_trajectory(self):
+        """Returns all drones to streamed setpoints."""
+        self.trajectory_running = False
+
+    def set_formation(self, formation: RelativeFormation | None):
+        """Holds the drones in a formation relative to a virtual leader, resolving their setpoints at every step.
+
+        Args:
+            formation (RelativeFormation | None): formation to hold, None returns to streamed setpoints
+        """
+        if formation is not None:
+            assert (
+                formation.num_drones == self.num_drones
+            ), f"formation is for {formation.num_drones} drones, swarm has {self.num_drones}."
+            self.set_pos_control(True)
+        self.formation = formation
+
+    def set_leader(
+        self, pose: np.ndarray, velocity: np.ndarray | None = None, scale: float = 1.0
+    ):
+        """Moves the virtual leader of the formation, see `RelativeFormation.set_leader`.
+
+        Args:
+            pose (np.ndarray): [x, y, z, yaw] pose of the leader
+            velocity (np.ndarray | None): [vx, vy, vz, vyaw] velocity to carry the leader along until the next update
+            scale (float): factor applied to the formation offsets
+        """
+        assert (
+            self.formation is not None
+        ), "must set a formation before moving its leader."
+        self.formation.set_leader(pose, velocity, scale, self.elapsed_time)
+        self.set_setpoints(self.formation.resolve(self.elapsed_time))
+
+    def arm(self, settings: list[bool] | np.ndarray):
         """arm.
 
         Args:
-            settings (list[bool]): setting for arming all drones in the simulation
+            settings (list[bool] | np.ndarray): setting for arming all drones in the simulation
         """
-        self.env.set_armed(settings)
+        self.armed = np.array(settings, dtype=bool)
+        self.env.set_armed(self.armed.tolist())
+
+    def get_health(self, endurance: float = 420.0):
+        """Gathers the health of every drone into one array, mirrors the SwarmController.
+
+        Args:
+            endurance (float): seconds of flight from a full to an empty battery
+
+        Returns:
+            np.ndarray: (n, 4) array of [battery voltage, link quality percentage, rssi, seconds since the last telemetry]
+        """
+        health = np.zeros((self.num_drones, 4))
+        health[:, 0] = 4.2 - 1.2 * np.clip(self.flight_time / endurance, 0.0, 1.0)
+        health[:, 1] = 100.0
+        return health
+
+    def get_metrics(self) -> dict:
+        """Gathers per drone and swarm counters for a `MetricsServer`, mirrors the SwarmController.
+
+        Every step is one telemetry sample, and the real time factor is worked out from `sim_time_seconds`.
+
+        Returns:
+            dict: values keyed by the names in `metrics.METRICS`
+        """
+        health = self.get_health()
+        return dict(
+            connected=self.connected,
+            battery_volts=health[:, 0],
+            link_quality_percent=health[:, 1],
+            telemetry_samples=np.full((self.num_drones,), self.steps),
+            packets_sent=self.packets_sent,
+            reshuffle_seconds=(self.reshuffle_time, self.reshuffles),
+            sim_time_seconds=self.elapsed_time,
+        )
 
     def end(self):
         """end."""
         self.arm([False] * self.num_drones)
+        if self.state_bus is not None:
+            self.state_bus.close()
         time.sleep(3)
         exit()
 
@@ -144,6 +577,11 @@ class Simulator:
         """position_estimate."""
         return self.get_states()
 
+    @property
+    def connected(self):
+        """(n, ) mask of drones with a live link, always all of them in simulation."""
+        return np.ones((self.num_drones,), dtype=bool)
+
     @property
     def num_drones(self):
         """num_drones."""
@@ -152,4 +590,4 @@ class Simulator:
     @property
     def elapsed_time(self):
         """elapsed_time."""
-        return self.env.physics_period * self.steps
+        return self.env.update_period * self.steps
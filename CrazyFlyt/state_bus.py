@@ -0,0 +1,126 @@
+"""Shared memory bus for publishing swarm state to other processes on the same host."""
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+class StateBus:
+    """StateBus.
+
+    Fixed layout shared memory block holding the latest swarm state and setpoints, protected by a seqlock.
+    One process publishes, any number of processes on the same host can read without locks or sockets.
+
+    Layout, all little endian:
+        int64 sequence, odd while a write is in progress
+        int64 number of drones
+        float64 timestamp
+        float64 (n, 4) states [x, y, z, yaw]
+        float64 (n, 4) setpoints
+    """
+
+    header_bytes = 16
+
+    def __init__(self, name: str, num_drones: int | None = None):
+        """__init__.
+
+        Args:
+            name (str): name of the shared memory block
+            num_drones (int | None): creates a new bus for this many drones, or attaches to an existing bus if None
+        """
+        self.owner = num_drones is not None
+
+        if num_drones is not None:
+            size = self.header_bytes + 8 * (1 + 8 * num_drones)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # readers must not unlink the block when they exit, only the publisher owns it,
+            # the tracker only exists on POSIX, where it knows the block by its name with a leading slash
+            if os.name == "posix":
+                resource_tracker.unregister(f"/{self.shm.name}", "shared_memory")
+
+        self._header = np.ndarray((2,), dtype="<i8", buffer=self.shm.buf)
+        if self.owner:
+            self._header[:] = (0, num_drones)
+        n = int(self._header[1])
+
+        data = np.ndarray(
+            (1 + 8 * n,), dtype="<f8", buffer=self.shm.buf, offset=self.header_bytes
+        )
+        split = 1 + 4 * n
+        self._timestamp = data[:1]
+        self.states = data[1:split].reshape(n, 4)
+        self.setpoints = data[split:].reshape(n, 4)
+
+    @property
+    def num_drones(self):
+        """num_drones."""
+        return len(self.states)
+
+    @property
+    def sequence(self):
+        """Number of completed publishes times two, readers can poll this to detect new data."""
+        return int(self._header[0])
+
+    def publish(self, states: np.ndarray, setpoints: np.ndarray, timestamp: float):
+        """publish.
+
+        Args:
+            states (np.ndarray): (n, 4) array of [x, y, z, yaw] states
+            setpoints (np.ndarray): (n, 4) array of the current setpoints
+            timestamp (float): time the states were sampled at
+        """
+        self.begin(timestamp)
+        self.states[:] = states
+        self.setpoints[:] = setpoints
+        self.commit()
+
+    def begin(self, timestamp: float):
+        """Opens a publish, readers retry until `commit`, so `states` and `setpoints` may be written in place in between.
+
+        Args:
+            timestamp (float): time the states were sampled at
+        """
+        self._header[0] += 1
+        self._timestamp[0] = timestamp
+
+    def commit(self):
+        """Closes a publish opened by `begin`."""
+        self._header[0] += 1
+
+    def read(self, timeout: float = 1.0):
+        """Reads a consistent snapshot of the bus, retrying if a publish happens midway.
+
+        Args:
+            timeout (float): longest time to keep retrying, a publish left open this long means the publisher died midway
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, float]: copies of the states, the setpoints, and the timestamp
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"No consistent snapshot of state bus {self.shm.name} within {timeout} seconds."
+                )
+
+            sequence = int(self._header[0])
+            if sequence & 1:
+                time.sleep(0)
+                continue
+
+            states = self.states.copy()
+            setpoints = self.setpoints.copy()
+            timestamp = float(self._timestamp[0])
+
+            if int(self._header[0]) == sequence:
+                return states, setpoints, timestamp
+
+    def close(self):
+        """Detaches from the bus, the publisher also frees the shared memory."""
+        del self._header, self._timestamp, self.states, self.setpoints
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
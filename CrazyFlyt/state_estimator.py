@@ -0,0 +1,132 @@
+"""Vectorized swarm state estimator that extrapolates telemetry to the current time."""
+import numpy as np
+
+
+class StateEstimator:
+    """StateEstimator.
+
+    Alpha-beta filter over [x, y, z, yaw] for every drone in a swarm.
+    Telemetry samples correct the position and velocity estimates,
+    and between samples the state is extrapolated using a first order model of how the onboard controller tracks the commanded setpoints.
+    """
+
+    def __init__(
+        self,
+        num_drones: int,
+        alpha: float = 0.7,
+        beta: float = 0.2,
+        tau: float = 0.3,
+        pos_gain: np.ndarray = np.array([1.0, 1.0, 5.0, 2.0]),
+        vel_limit: np.ndarray = np.array([0.5, 0.5, 5.0, 3.0]),
+        max_horizon: float = 0.5,
+    ):
+        """__init__.
+
+        Args:
+            num_drones (int): number of drones
+            alpha (float): how much each sample corrects the position estimate
+            beta (float): how much each sample corrects the velocity estimate
+            tau (float): time constant of the velocity response to a commanded velocity
+            pos_gain (np.ndarray): (4, ) proportional gains from position error to commanded velocity, defaults match the cf2x twin
+            vel_limit (np.ndarray): (4, ) limits on the commanded velocity in position control, defaults match the cf2x twin
+            max_horizon (float): longest time to extrapolate past the last sample
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.tau = tau
+        self.pos_gain = pos_gain
+        self.vel_limit = vel_limit
+        self.max_horizon = max_horizon
+
+        self.positions = np.zeros((num_drones, 4))
+        self.velocities = np.zeros((num_drones, 4))
+        self.timestamps = np.full((num_drones,), -np.inf)
+
+    @staticmethod
+    def _wrap_yaw(delta: np.ndarray) -> np.ndarray:
+        """Wraps the yaw column of a difference of states into [-pi, pi).
+
+        Args:
+            delta (np.ndarray): (n, 4) array of state differences
+        """
+        delta[:, -1] = (delta[:, -1] + np.pi) % (2.0 * np.pi) - np.pi
+        return delta
+
+    def update(self, measurements: np.ndarray, timestamps: np.ndarray):
+        """Corrects the estimate of every drone that has a sample newer than its last one.
+
+        Args:
+            measurements (np.ndarray): (n, 4) array of [x, y, z, yaw] telemetry
+            timestamps (np.ndarray): (n, ) array of times each sample was received
+        """
+        # drones with no usable sample, such as those with a dead link, are left alone
+        new = (timestamps > self.timestamps) & np.all(
+            np.isfinite(measurements), axis=-1
+        )
+        if not np.any(new):
+            return
+
+        # the first sample of each drone initializes it at rest
+        first = new & np.isinf(self.timestamps)
+        self.positions[first] = measurements[first]
+        self.velocities[first] = 0.0
+        self.timestamps[first] = timestamps[first]
+
+        new &= ~first
+        if not np.any(new):
+            return
+
+        dt = (timestamps[new] - self.timestamps[new])[:, None]
+        predicted = self.positions[new] + self.velocities[new] * dt
+        residual = self._wrap_yaw(measurements[new] - predicted)
+
+        self.positions[new] = predicted + self.alpha * residual
+        self.velocities[new] += self.beta / dt * residual
+        self.timestamps[new] = timestamps[new]
+
+    def predict(
+        self,
+        now: float,
+        setpoints: np.ndarray,
+        pos_control: bool | np.ndarray,
+    ):
+        """Extrapolates every drone's state to `now`, without modifying the estimate.
+
+        Args:
+            now (float): time to predict the states at, on the same clock as the sample timestamps
+            setpoints (np.ndarray): (n, 4) array of the current setpoints
+            pos_control (bool | np.ndarray): whether the setpoints are positions or velocities, for the whole swarm or (n, ) for each drone
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (n, 4) arrays of the predicted positions and velocities, NaN for drones with no samples yet
+        """
+        dt = np.clip(now - self.timestamps, 0.0, self.max_horizon)[:, None]
+        pos_control = np.broadcast_to(pos_control, (len(dt),))[:, None]
+
+        # velocity the onboard controller is steering towards
+        tracking = self.pos_gain * self._wrap_yaw(setpoints - self.positions)
+        commanded = np.where(
+            pos_control, np.clip(tracking, -self.vel_limit, self.vel_limit), setpoints
+        )
+
+        # first order response towards the commanded velocity, positions integrated with the trapezoid rule
+        response = 1.0 - np.exp(-dt / self.tau)
+        velocities = self.velocities + (commanded - self.velocities) * response
+        positions = self.positions + 0.5 * (self.velocities + velocities) * dt
+
+        # a drone that has never reported is unknown, not resting at the origin
+        unknown = np.isinf(self.timestamps)
+        positions[unknown] = np.nan
+        velocities[unknown] = np.nan
+
+        return positions, velocities
+
+    def permute(self, order: np.ndarray):
+        """Reorders the drones, for use after a reshuffle.
+
+        Args:
+            order (np.ndarray): (n, ) array of old indices for each new index
+        """
+        self.positions = self.positions[order]
+        self.velocities = self.velocities[order]
+        self.timestamps = self.timestamps[order]
@@ -1,4 +1,5 @@
 """Class for controlling a swarm of Crazyflie UAVs."""
+import threading
 import time
 from typing import List
 
@@ -6,6 +7,13 @@ import numpy as np
 from scipy.optimize import linear_sum_assignment
 
 from .drone_controller import DroneController
+from .geofence import Geofence
+from .relative_formation import RelativeFormation
+from .setpoint_stream import SetpointStream
+from .show import Show
+from .state_bus import StateBus
+from .state_estimator import StateEstimator
+from .trajectory import Trajectory
 
 
 class SwarmController:
@@ -14,22 +22,80 @@ class SwarmController:
     Class for controlling a swarm of Crazyflie UAVs.
     """
 
-    def __init__(self, URIs: List[str]):
+    def __init__(
+        self,
+        URIs: List[str],
+        control_hz: float | List[float] = 40.0,
+        adaptive: bool = False,
+        setpoint_threshold: float = 0.01,
+        keepalive_period: float = 0.25,
+        estimator_hz: float = 100.0,
+    ):
         """__init__.
 
         Args:
             URIs (List[str]): list of URIs for the drones
+            control_hz (float | List[float]): rate at which setpoints are streamed, either for the whole swarm or for each drone
+            adaptive (bool): only send setpoints when they change by more than `setpoint_threshold`, or when `keepalive_period` runs out
+            setpoint_threshold (float): smallest change in any setpoint element that triggers a send in adaptive mode
+            keepalive_period (float): longest time between sends in adaptive mode, must be within the onboard commander timeout of 0.5s
+            estimator_hz (float): rate at which telemetry is fed into the state estimator, should match the telemetry rate
         """
-        self.UAVs = [DroneController(URI, in_swarm=True) for URI in URIs]
+        if not isinstance(control_hz, list):
+            control_hz = [control_hz] * len(URIs)
+        assert len(control_hz) == len(
+            URIs
+        ), "control_hz length must be equal to number of drones"
+
+        self.UAVs = [
+            DroneController(
+                URI,
+                in_swarm=True,
+                control_hz=hz,
+                adaptive=adaptive,
+                setpoint_threshold=setpoint_threshold,
+                keepalive_period=keepalive_period,
+            )
+            for URI, hz in zip(URIs, control_hz)
+        ]
+        self.state_bus = None
+        self.geofence = None
+        self.estimator = StateEstimator(self.num_drones)
+
+        # the estimator takes in telemetry at a fixed rate, however often `estimate_state` is called,
+        # the lock keeps its rows in step with the drones across a reshuffle
+        self.estimator_lock = threading.Lock()
+        self.estimating = True
+        self.estimator_thread = threading.Thread(
+            name="estimator", target=self._estimate, args=(1.0 / estimator_hz,)
+        )
+        self.estimator_thread.daemon = True
+        self.estimator_thread.start()
+
+        # reshuffle solve times, for `get_metrics`
+        self.reshuffle_time = 0.0
+        self.reshuffles = 0
+
+        # formation held relative to a virtual leader, see `set_formation`
+        self.formation = None
+        self.formation_thread = None
+        self.formation_stop = threading.Event()
+
+        # setpoint batches come from the caller and the formation thread, and the geofence keeps state between them
+        self.setpoint_lock = threading.RLock()
+
         time.sleep(1)
         print(f"Swarm with {self.num_drones} drones ready to go...")
         time.sleep(1)
 
-    def reshuffle(self, new_pos):
+    def reshuffle(self, new_pos, penalty: np.ndarray | None = None):
         """reshuffle.
 
+        While a formation is held, its offsets are reordered along with the drones and it keeps control of the setpoints.
+
         Args:
             new_pos (np.ndarray): (n, 4) array for the target position to assign to all the drones
+            penalty (np.ndarray | None): (n, n) array of extra cost for assigning each target position (rows) to each drone (columns)
         """
         # if start pos is given, reassign to get drones to their positions automatically
         assert (
@@ -39,20 +105,40 @@ class SwarmController:
             new_pos[0].shape[0] == 4
         ), f"start pos must have 4 dimensions for [x, y, z, yaw], got {new_pos[0].shape[0]} dimensions."
 
-        # compute cost matrix
+        # compute cost matrix from latency compensated positions
+        start = time.perf_counter()
+        positions, _ = self.estimate_state()
         cost = abs(
-            np.expand_dims(self.position_estimate[:, :3], axis=0)
+            np.expand_dims(positions[:, :3], axis=0)
             - np.expand_dims(new_pos[:, :3], axis=1)
         )
         cost = np.sum(cost, axis=-1)
 
+        # drones without a live link are assigned last
+        cost = np.nan_to_num(cost, nan=1e6)
+
         # compute optimal assignment using Hungarian algo
-        _, reassignment = linear_sum_assignment(cost)
-        self.UAVs = [self.UAVs[i] for i in reassignment]
+        _, reassignment = linear_sum_assignment(
+            cost if penalty is None else cost + penalty
+        )
+        self.reshuffle_time += time.perf_counter() - start
+        self.reshuffles += 1
+        # the formation thread must never resolve offsets against drones in the other order
+        with self.setpoint_lock:
+            with self.estimator_lock:
+                self.UAVs = [self.UAVs[i] for i in reassignment]
+                self.estimator.permute(reassignment)
+            if self.geofence is not None:
+                self.geofence.permute(reassignment)
+            if self.formation is not None:
+                self.formation.offsets = self.formation.offsets[reassignment]
 
-        # send setpoints
-        self.set_pos_control(True)
-        self.set_setpoints(new_pos)
+            # send setpoints, a held formation keeps every drone in its own slot
+            self.set_pos_control(True)
+            if self.formation is None:
+                self.set_setpoints(new_pos)
+            else:
+                self.set_setpoints(self.formation.resolve(time.monotonic()))
 
         cost = np.choose(reassignment, cost.T)
         return cost
@@ -62,19 +148,177 @@ class SwarmController:
         """num_drones."""
         return len(self.UAVs)
 
+    @property
+    def connected(self):
+        """(n, ) mask of drones with a live link."""
+        return np.array([UAV.connected for UAV in self.UAVs])
+
     @property
     def position_estimate(self):
-        """position_estimate."""
-        return np.stack([UAV.position_estimate for UAV in self.UAVs], axis=0)
+        """position_estimate, rows of drones without a live link are NaN."""
+        position_estimate = np.stack(
+            [UAV.position_estimate for UAV in self.UAVs], axis=0
+        )
+        position_estimate[~self.connected] = np.nan
+        return position_estimate
+
+    @property
+    def packets_sent(self):
+        """packets_sent."""
+        return np.array([UAV.packets_sent for UAV in self.UAVs])
+
+    def get_metrics(self) -> dict:
+        """Gathers per drone and swarm counters for a `MetricsServer`.
+
+        Returns:
+            dict: values keyed by the names in `metrics.METRICS`, and the `uri` of each drone
+        """
+        health = self.get_health()
+        return dict(
+            uri=[UAV.URI for UAV in self.UAVs],
+            connected=self.connected,
+            battery_volts=health[:, 0],
+            link_quality_percent=health[:, 1],
+            radio_rssi=health[:, 2],
+            telemetry_age_seconds=health[:, 3],
+            telemetry_samples=np.array([UAV.telemetry_samples for UAV in self.UAVs]),
+            packets_sent=self.packets_sent,
+            connects=np.array([UAV.connects for UAV in self.UAVs]),
+            connect_failures=np.array([UAV.connect_failures for UAV in self.UAVs]),
+            link_losses=np.array([UAV.link_losses for UAV in self.UAVs]),
+            connect_seconds=np.array([UAV.connect_time for UAV in self.UAVs]),
+            tick_latency_seconds=(
+                np.array([UAV.tick_latency for UAV in self.UAVs]),
+                np.array([UAV.ticks for UAV in self.UAVs]),
+            ),
+            reshuffle_seconds=(self.reshuffle_time, self.reshuffles),
+        )
+
+    def set_control_rate(self, control_hz: float | List[float] | np.ndarray):
+        """set_control_rate.
+
+        Args:
+            control_hz (float | List[float] | np.ndarray): rate at which setpoints are streamed, either for the whole swarm or for each drone
+        """
+        control_hz = np.broadcast_to(control_hz, (self.num_drones,))
+        for hz, UAV in zip(control_hz, self.UAVs):
+            UAV.set_control_rate(float(hz))
+
+    def estimate_state(self, now: float | None = None):
+        """Extrapolates the latest telemetry of every drone to the present using the current setpoints.
+
+        Args:
+            now (float | None): time on the `time.monotonic` clock to predict the states at, defaults to the current time
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (n, 4) arrays of the predicted positions and velocities, NaN for drones without a live link or without telemetry yet
+        """
+        with self.estimator_lock:
+            positions, velocities = self.estimator.predict(
+                time.monotonic() if now is None else now,
+                self.setpoints,
+                self.pos_control,
+            )
 
-    def set_pos_control(self, setting: bool):
+        connected = self.connected
+        positions[~connected] = np.nan
+        velocities[~connected] = np.nan
+        return positions, velocities
+
+    def _estimate(self, period: float):
+        """Feeds the latest telemetry of every drone into the state estimator at a fixed rate.
+
+        Args:
+            period (float): time between updates
+        """
+        while self.estimating:
+            with self.estimator_lock:
+                # drones that have never reported have no sample to give
+                self.estimator.update(
+                    self.position_estimate,
+                    np.array(
+                        [
+                            UAV.position_timestamp
+                            if UAV.telemetry_samples > 0
+                            else -np.inf
+                            for UAV in self.UAVs
+                        ]
+                    ),
+                )
+            time.sleep(period)
+
+    def get_health(self):
+        """Gathers the health of every drone into one array.
+
+        Returns:
+            np.ndarray: (n, 4) array of [battery voltage, link quality percentage, rssi, seconds since the last telemetry]
+        """
+        now = time.monotonic()
+        return np.array(
+            [
+                [
+                    UAV.battery_voltage,
+                    UAV.link_quality,
+                    UAV.rssi,
+                    now - UAV.position_timestamp,
+                ]
+                for UAV in self.UAVs
+            ]
+        )
+
+    @property
+    def setpoints(self):
+        """setpoints."""
+        return np.stack([UAV.setpoint for UAV in self.UAVs], axis=0)
+
+    def publish_state(self, name: str, rate_hz: float = 100.0):
+        """Publishes the swarm state and setpoints on a shared memory bus from a background thread.
+
+        Args:
+            name (str): name of the shared memory block, readers attach with `StateBus(name)`
+            rate_hz (float): publishing rate
+        """
+        self.state_bus = StateBus(name, self.num_drones)
+        self.publish_thread = threading.Thread(
+            name="state_bus", target=self._publish, args=(1.0 / rate_hz,)
+        )
+        self.publish_thread.daemon = True
+        self.publish_thread.start()
+
+    def _publish(self, period: float):
+        """_publish.
+
+        Args:
+            period (float): time between publishes
+        """
+        while (state_bus := self.state_bus) is not None:
+            # rows are written straight into the shared block, nothing is stacked per publish
+            state_bus.begin(time.time())
+            for state, setpoint, UAV in zip(
+                state_bus.states, state_bus.setpoints, self.UAVs
+            ):
+                if UAV.connected:
+                    state[:] = UAV.position_estimate
+                else:
+                    state[:] = np.nan
+                setpoint[:] = UAV.setpoint
+            state_bus.commit()
+            time.sleep(period)
+
+    def set_pos_control(self, setting: bool | np.ndarray):
         """set_pos_control.
 
         Args:
-            setting (bool): whether to set all drones to pos control
+            setting (bool | np.ndarray): whether to set all drones to pos control, or (n, ) mask of drones in pos control with the rest in velocity control
         """
-        for UAV in self.UAVs:
-            UAV.set_pos_control(setting)
+        settings = np.broadcast_to(np.asarray(setting, dtype=bool), (self.num_drones,))
+        for mode, UAV in zip(settings.tolist(), self.UAVs):
+            UAV.set_pos_control(mode)
+
+    @property
+    def pos_control(self):
+        """(n, ) mask of drones in pos control."""
+        return np.array([UAV.pos_control for UAV in self.UAVs])
 
     def arm(self, settings: list[bool] | np.ndarray):
         """arm.
@@ -86,30 +330,240 @@ class SwarmController:
             self.UAVs
         ), "masks length must be equal to number of drones"
 
+        # flip every flag first, then wake every control loop back to back, so all the packets leave together
         for mask, UAV in zip(settings, self.UAVs):
             if mask:
-                UAV.start()
+                UAV.start(wake=False)
             else:
-                UAV.stop()
+                UAV.stop(wake=False)
+        for UAV in self.UAVs:
+            UAV.wake_up()
+
+    @property
+    def armed(self):
+        """(n, ) mask of armed drones."""
+        return np.array([UAV.running for UAV in self.UAVs])
 
     def end(self):
         """Disarms each drone and closes all connections."""
+        state_bus, self.state_bus = self.state_bus, None
+        self.estimating = False
+        self.set_formation(None)
         for UAV in self.UAVs:
             UAV.end()
         time.sleep(1)
+        if state_bus is not None:
+            state_bus.close()
+
+    def set_geofence(self, geofence: Geofence | None):
+        """Filters every later setpoint batch through a geofence, None removes it.
+
+        Args:
+            geofence (Geofence | None): geofence to apply, its `violations` counts the filtered setpoints of each drone
+        """
+        self.geofence = geofence
 
-    def set_setpoints(self, setpoints: np.ndarray):
+    def set_setpoints(self, setpoints: np.ndarray, modes: np.ndarray | None = None):
         """Sets setpoints for each drone, setpoints must be ndarray where len(setpoints) == len(UAVs).
 
+        Drones without a live link hold on to their setpoint and fly to it once they reconnect.
+
         Args:
             setpoints (np.ndarray): (n, 4) array for setpoint corresponding to (x, y, z, yaw) or (vx, vy, vz, vyaw)
+            modes (np.ndarray | None): (n, ) mask of drones whose setpoints are positions, the rest are velocities, None keeps the current modes
         """
         assert len(setpoints) == len(
             self.UAVs
         ), "number of setpoints must be equal to number of drones"
 
-        for setpoint, UAV in zip(setpoints, self.UAVs):
-            UAV.set_setpoint(setpoint)
+        with self.setpoint_lock:
+            pos_control = (
+                self.pos_control
+                if modes is None
+                else np.broadcast_to(np.asarray(modes, dtype=bool), (self.num_drones,))
+            )
+            if self.geofence is not None:
+                setpoints = self.geofence.apply(
+                    setpoints, pos_control, time.monotonic(), self.position_estimate
+                )
+
+            if modes is None:
+                for setpoint, UAV in zip(setpoints, self.UAVs):
+                    UAV.set_setpoint(setpoint)
+            else:
+                for setpoint, mode, UAV in zip(
+                    setpoints, pos_control.tolist(), self.UAVs
+                ):
+                    UAV.set_setpoint(setpoint, mode)
+
+    def start_recording(self):
+        """Starts logging every drone's telemetry paired with its setpoint in force, for fitting the digital twin."""
+        for UAV in self.UAVs:
+            UAV.start_recording()
+
+    def stop_recording(self, path_prefix: str | None = None) -> List[dict]:
+        """Stops recording and returns one flight log per drone.
+
+        Args:
+            path_prefix (str | None): if given, drone i's log is also saved as <path_prefix>_<i>.npz
+
+        Returns:
+            List[dict]: flight logs, see `DroneController.stop_recording`
+        """
+        return [
+            UAV.stop_recording(None if path_prefix is None else f"{path_prefix}_{i}")
+            for i, UAV in enumerate(self.UAVs)
+        ]
+
+    def play(
+        self, source, rate_hz: float | None = None, max_prefetch: int = 64
+    ) -> SetpointStream:
+        """Streams setpoint frames from a lazy source at a fixed rate, blocking until the source runs out.
+
+        Frames are prefetched on a background thread, and a frame that is not ready in time holds the previous setpoints.
+
+        Args:
+            source: iterable or async iterable of (n, 4) setpoint frames
+            rate_hz (float | None): frames consumed per second, defaults to the fastest control rate in the swarm
+            max_prefetch (int): most frames to buffer ahead
+
+        Returns:
+            SetpointStream: the finished stream, holding the frame and under-run counts
+        """
+        period = (
+            min(UAV.period for UAV in self.UAVs) if rate_hz is None else 1.0 / rate_hz
+        )
+        stream = SetpointStream(source, max_prefetch)
+        stream.prefill()
+
+        # deadlines are kept on an absolute schedule so that slow frames do not accumulate drift
+        deadline = time.monotonic()
+        try:
+            while (frame := stream.next_frame()) is not None:
+                self.set_setpoints(frame)
+                deadline += period
+                time.sleep(max(deadline - time.monotonic(), 0.0))
+        finally:
+            stream.close()
+
+        return stream
+
+    def play_show(self, show: Show | str, max_prefetch: int = 64) -> SetpointStream:
+        """Plays a compiled show at its own frame rate, see `Show`.
+
+        The swarm should already be armed and holding the first frame of the show.
+
+        Args:
+            show (Show | str): show, or path of a binary show file
+            max_prefetch (int): most frames to buffer ahead
+
+        Returns:
+            SetpointStream: the finished stream, holding the frame and under-run counts
+        """
+        if isinstance(show, str):
+            show = Show.load(show)
+        assert (
+            show.num_drones == self.num_drones
+        ), f"show is for {show.num_drones} drones, swarm has {self.num_drones}."
+
+        return self.play(show, show.rate_hz, max_prefetch)
+
+    def set_formation(self, formation: RelativeFormation | None):
+        """Holds the drones in a formation relative to a virtual leader.
+
+        A background thread resolves every drone's setpoint in one batch at the fastest control rate in the swarm,
+        so that only the leader needs updating from here on, see `set_leader`.
+
+        Args:
+            formation (RelativeFormation | None): formation to hold, None returns to streamed setpoints
+        """
+        if formation is not None:
+            assert (
+                formation.num_drones == self.num_drones
+            ), f"formation is for {formation.num_drones} drones, swarm has {self.num_drones}."
+
+        # the previous holder is stopped before anything else is sent, even when the formation is the same one
+        if self.formation_thread is not None:
+            self.formation_stop.set()
+            self.formation_thread.join()
+            self.formation_thread = None
+        self.formation = formation
+
+        if formation is not None:
+            self.set_pos_control(True)
+            self.formation_stop = threading.Event()
+            self.formation_thread = threading.Thread(
+                name="formation",
+                target=self._hold_formation,
+                args=(formation, self.formation_stop),
+            )
+            self.formation_thread.daemon = True
+            self.formation_thread.start()
+
+    def set_leader(
+        self, pose: np.ndarray, velocity: np.ndarray | None = None, scale: float = 1.0
+    ):
+        """Moves the virtual leader of the formation, see `RelativeFormation.set_leader`.
+
+        Args:
+            pose (np.ndarray): [x, y, z, yaw] pose of the leader
+            velocity (np.ndarray | None): [vx, vy, vz, vyaw] velocity to carry the leader along until the next update
+            scale (float): factor applied to the formation offsets
+        """
+        formation = self.formation
+        assert formation is not None, "must set a formation before moving its leader."
+
+        # the formation thread never resolves a half updated leader
+        with self.setpoint_lock:
+            now = time.monotonic()
+            formation.set_leader(pose, velocity, scale, now)
+            self.set_setpoints(formation.resolve(now))
+
+    def _hold_formation(self, formation: RelativeFormation, stop: threading.Event):
+        """Resolves the formation at the control rate until it is replaced.
+
+        Args:
+            formation (RelativeFormation): formation to hold
+            stop (threading.Event): set when the formation is replaced
+        """
+        period = min(UAV.period for UAV in self.UAVs)
+        while not stop.is_set():
+            with self.setpoint_lock:
+                self.set_setpoints(formation.resolve(time.monotonic()))
+            stop.wait(period)
+
+    def upload_trajectory(self, trajectory: Trajectory, trajectory_id: int = 1):
+        """Uploads each drone's share of a trajectory into its onboard trajectory memory.
+
+        Args:
+            trajectory (Trajectory): trajectory for all drones, drone i flies trajectory.coefficients[i]
+            trajectory_id (int): id to register the trajectory under in the high-level commander
+        """
+        assert (
+            trajectory.num_drones == self.num_drones
+        ), f"trajectory must be for {self.num_drones} drones, got {trajectory.num_drones}."
+        assert (
+            trajectory.num_pieces <= Trajectory.max_pieces
+        ), f"trajectory has {trajectory.num_pieces} pieces, onboard memory only fits {Trajectory.max_pieces}."
+
+        for coefficients, UAV in zip(trajectory.coefficients, self.UAVs):
+            UAV.upload_trajectory(trajectory.durations, coefficients, trajectory_id)
+
+    def start_trajectory(self, trajectory_id: int = 1, time_scale: float = 1.0):
+        """Starts the uploaded trajectory on all drones at once.
+
+        Args:
+            trajectory_id (int): id of a previously uploaded trajectory
+            time_scale (float): time factor, >1.0 is slower, <1.0 is faster
+        """
+        # fire the start packets back to back so drones start within a few ms of each other
+        for UAV in self.UAVs:
+            UAV.start_trajectory(trajectory_id, time_scale)
+
+    def stop_trajectory(self):
+        """Returns all drones to streamed setpoints."""
+        for UAV in self.UAVs:
+            UAV.stop_trajectory()
 
     def sleep(self, seconds: float):
         """sleep.
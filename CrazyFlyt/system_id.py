@@ -0,0 +1,358 @@
+"""System identification of the digital twin from recorded flight logs."""
+import concurrent.futures
+import copy
+import os
+import shutil
+
+import numpy as np
+import yaml
+
+from .point_mass import PointMassAviary
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "models")
+
+# fitted parameters and where they live in the model yaml, every entry of a list is scaled together
+PARAMETERS = {
+    "total_thrust": ("motor_params", "total_thrust"),
+    "motor_tau": ("motor_params", "tau"),
+    "drag_coef": ("drag_params", "drag_coef_xyz"),
+    "ang_pos_kp": ("control_params", "ang_pos", "kp"),
+    "lin_vel_kp": ("control_params", "lin_vel", "kp"),
+    "lin_vel_ki": ("control_params", "lin_vel", "ki"),
+    "lin_vel_kd": ("control_params", "lin_vel", "kd"),
+    "lin_pos_kp": ("control_params", "lin_pos", "kp"),
+    "z_pos_kp": ("control_params", "z_pos", "kp"),
+    "z_vel_kp": ("control_params", "z_vel", "kp"),
+    "z_vel_ki": ("control_params", "z_vel", "ki"),
+    "z_vel_kd": ("control_params", "z_vel", "kd"),
+}
+
+# physical parameters, which mean the same in the PyBullet twin as in the point mass model
+PHYSICAL_PARAMETERS = ("total_thrust", "motor_tau", "drag_coef")
+
+
+def load_flight_log(path: str) -> dict:
+    """Loads a flight log saved by `DroneController.stop_recording`.
+
+    Args:
+        path (str): path to the .npz file
+    """
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def _read(params: dict, path: tuple):
+    """Reads a nested entry of the model parameters.
+
+    Args:
+        params (dict): parsed model yaml
+        path (tuple): keys leading to the entry
+    """
+    for key in path:
+        params = params[key]
+    return params
+
+
+def _scaled_params(params: dict, names: tuple, scales: np.ndarray) -> dict:
+    """Returns a copy of the model parameters with the named entries multiplied by `scales`.
+
+    Args:
+        params (dict): parsed model yaml
+        names (tuple): names of the fitted parameters, keys of `PARAMETERS`
+        scales (np.ndarray): (k, ) multipliers for each named parameter
+    """
+    params = copy.deepcopy(params)
+    for name, scale in zip(names, scales):
+        *path, key = PARAMETERS[name]
+        entry = _read(params, path)
+        value = np.asarray(entry[key], dtype=np.float64) * scale
+        entry[key] = value.tolist() if value.ndim else float(value)
+    return params
+
+
+def _replay(
+    log: dict,
+    model_dir: str,
+    drone_model: str,
+    names: tuple,
+    scales: np.ndarray,
+    control_hz: int,
+) -> np.ndarray:
+    """Replays the setpoints of one flight log on a swarm of candidate models and scores how well each tracks the recorded flight.
+
+    Every candidate is one drone of a point mass swarm, so a whole population is simulated as a single batch.
+
+    Args:
+        log (dict): flight log, see `DroneController.stop_recording`
+        model_dir (str): directory holding the base drone model
+        drone_model (str): name of the base drone model
+        names (tuple): names of the fitted parameters, keys of `PARAMETERS`
+        scales (np.ndarray): (p, k) multipliers on the base parameters for each of p candidates
+        control_hz (int): control rate of the simulation
+
+    Returns:
+        np.ndarray: (p, ) mean squared position error of each candidate
+    """
+    num_candidates = len(scales)
+    times = log["time"] - log["time"][0]
+    states = log["states"]
+
+    env = PointMassAviary(
+        start_pos=np.repeat(states[:1, :3], num_candidates, axis=0),
+        start_orn=np.repeat(
+            np.array([[0.0, 0.0, states[0, 3]]]), num_candidates, axis=0
+        ),
+        model_dir=model_dir,
+        drone_model=drone_model,
+        control_hz=control_hz,
+    )
+
+    # swap in per candidate parameters, scaling along the leading candidate axis
+    params = copy.deepcopy(env.params)
+    for i, name in enumerate(names):
+        *path, key = PARAMETERS[name]
+        entry = _read(params, path)
+        base = np.asarray(entry[key], dtype=np.float64)
+        entry[key] = base * scales[:, i].reshape((-1,) + (1,) * base.ndim)
+    env.apply_params(params)
+
+    # drones recorded in the air start out hovering, with the integrator holding up their weight
+    if states[0, 2] > 0.05:
+        hover = np.sqrt(env.mass * env.gravity / env.total_thrust)
+        env.throttle = np.broadcast_to(hover, (num_candidates,)).copy()
+        env.z_integral = np.broadcast_to(hover / env.z_vel[1], (num_candidates,)).copy()
+
+    # zero order hold of the recorded setpoints, sampling the simulated positions every control step
+    num_steps = int(np.ceil(times[-1] / env.update_period)) + 1
+    sample = np.searchsorted(times, np.arange(num_steps) * env.update_period, "right")
+    positions = np.zeros((num_steps, num_candidates, 3))
+    setpoints = log["setpoints"][:, [0, 1, 3, 2]]
+    mode, armed = None, None
+    for step in range(num_steps):
+        index = sample[step] - 1
+        if log["pos_control"][index] != mode:
+            mode = log["pos_control"][index]
+            env.set_mode(7 if mode else 6)
+        if log["armed"][index] != armed:
+            armed = log["armed"][index]
+            env.set_armed(bool(armed))
+        env.set_all_setpoints(np.broadcast_to(setpoints[index], (num_candidates, 4)))
+        positions[step] = env.pos
+        env.step()
+
+    # compare against the telemetry at the nearest simulated step
+    steps = np.clip(np.round(times / env.update_period).astype(int), 0, num_steps - 1)
+    error = positions[steps] - states[:, None, :3]
+    return np.mean(np.sum(error**2, axis=-1), axis=0)
+
+
+class SystemIdentifier:
+    """SystemIdentifier.
+
+    Fits the thrust, motor lag, drag and controller gains of a drone model to recorded flight logs.
+    Each log's setpoints are replayed on many candidate models at once using the point mass model,
+    with logs and slices of the population spread over worker processes,
+    and the candidates are refined with the cross entropy method over log scale multipliers of the base parameters.
+
+    The fitted parameters are those the point mass model is sensitive to.
+    Thrust, motor lag and drag are physical and carry over to the PyBullet twin as they are,
+    but the controller gains take the point mass meanings, the angular position gain for one is a tilt rate gain with no attitude or rate loops below it.
+    So `write_model` gives the PyBullet twin only the physical parameters, and the point mass model the whole fit.
+    """
+
+    def __init__(
+        self,
+        logs: list[dict | str],
+        model_dir: str = MODEL_DIR,
+        drone_model: str = "cf2x",
+        parameters: tuple = tuple(PARAMETERS),
+        control_hz: int = 120,
+        num_workers: int | None = None,
+        seed: int = 0,
+    ):
+        """__init__.
+
+        Args:
+            logs (list[dict | str]): flight logs, or paths to them, see `DroneController.stop_recording`
+            model_dir (str): directory holding the base drone model
+            drone_model (str): name of the base drone model
+            parameters (tuple): names of the parameters to fit, keys of `PARAMETERS`
+            control_hz (int): control rate of the replays
+            num_workers (int | None): number of worker processes, None uses one per CPU
+            seed (int): seed for the parameter search
+        """
+        assert len(logs) > 0, "need at least one flight log to fit to."
+        for name in parameters:
+            assert (
+                name in PARAMETERS
+            ), f"unknown parameter {name}, expected one of {list(PARAMETERS)}."
+
+        self.logs = [
+            load_flight_log(log) if isinstance(log, str) else log for log in logs
+        ]
+        for log in self.logs:
+            assert len(log["time"]) > 1, "flight logs need at least two samples."
+
+        self.model_dir = model_dir
+        self.drone_model = drone_model
+        self.parameters = tuple(parameters)
+        self.control_hz = control_hz
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.rng = np.random.default_rng(seed)
+
+        with open(PointMassAviary.params_path(model_dir, drone_model)) as f:
+            self.base_params = yaml.safe_load(f)
+
+        # multipliers on the base parameters, starting from the base model
+        self.scales = np.ones((len(self.parameters),))
+        self.history = []
+
+    def cost(
+        self,
+        scales: np.ndarray,
+        pool: concurrent.futures.Executor | None = None,
+    ) -> np.ndarray:
+        """Mean squared position error over all logs for each candidate.
+
+        Args:
+            scales (np.ndarray): (p, k) multipliers on the base parameters for each of p candidates
+            pool (concurrent.futures.Executor | None): workers to replay on, None starts a pool for this call only
+
+        Returns:
+            np.ndarray: (p, ) cost of each candidate
+        """
+        if pool is None:
+            with concurrent.futures.ProcessPoolExecutor(self.num_workers) as pool:
+                return self.cost(scales, pool)
+
+        scales = np.atleast_2d(scales)
+        chunks = np.array_split(
+            np.arange(len(scales)),
+            max(1, min(len(scales), self.num_workers // len(self.logs))),
+        )
+        tasks = [(log, chunk) for log in self.logs for chunk in chunks]
+
+        futures = [
+            pool.submit(
+                _replay,
+                log,
+                self.model_dir,
+                self.drone_model,
+                self.parameters,
+                scales[chunk],
+                self.control_hz,
+            )
+            for log, chunk in tasks
+        ]
+
+        costs = np.zeros((len(scales),))
+        for (_, chunk), future in zip(tasks, futures):
+            costs[chunk] += future.result()
+
+        return costs / len(self.logs)
+
+    def fit(
+        self,
+        iterations: int = 20,
+        population: int = 64,
+        elite_fraction: float = 0.2,
+        init_std: float = 0.3,
+        min_std: float = 0.01,
+        verbose: bool = True,
+    ) -> dict:
+        """Searches for the parameters that best reproduce the flight logs.
+
+        Args:
+            iterations (int): number of search generations
+            population (int): candidates simulated per generation
+            elite_fraction (float): fraction of the best candidates used to update the search distribution
+            init_std (float): initial spread of the log scale multipliers
+            min_std (float): smallest spread of the log scale multipliers, keeps the search from collapsing early
+            verbose (bool): print the best cost every generation
+
+        Returns:
+            dict: fitted value of each parameter
+        """
+        mean = np.log(self.scales)
+        std = np.full_like(mean, init_std)
+        num_elite = max(2, int(population * elite_fraction))
+
+        # one pool of workers for the whole search, not one per generation
+        with concurrent.futures.ProcessPoolExecutor(self.num_workers) as pool:
+            best_cost = self.cost(self.scales[None], pool)[0]
+
+            for iteration in range(iterations):
+                samples = mean + std * self.rng.standard_normal((population, len(mean)))
+                samples[0] = mean
+
+                costs = self.cost(np.exp(samples), pool)
+                elite = samples[np.argsort(costs)[:num_elite]]
+                mean = elite.mean(axis=0)
+                std = elite.std(axis=0) + min_std
+
+                if costs.min() < best_cost:
+                    best_cost = costs.min()
+                    self.scales = np.exp(samples[np.argmin(costs)])
+                self.history.append(best_cost)
+
+                if verbose:
+                    print(
+                        f"Iteration {iteration}: best mean squared error {best_cost:.5f} m^2."
+                    )
+
+        return self.fitted_values
+
+    @property
+    def fitted_values(self) -> dict:
+        """Current value of each fitted parameter."""
+        params = _scaled_params(self.base_params, self.parameters, self.scales)
+        return {name: _read(params, PARAMETERS[name]) for name in self.parameters}
+
+    def write_model(self, output_dir: str, drone_model: str | None = None) -> str:
+        """Writes the fitted model as a copy of the base model with updated yaml files.
+
+        The whole fit goes into a point mass yaml file, see `PointMassAviary.params_path`, flown with
+        `Simulator(start_states, backend="point_mass", model_dir=output_dir, drone_model=drone_model)`.
+        The PyBullet yaml only takes the fitted `PHYSICAL_PARAMETERS`, and keeps its base controller gains,
+        flown with `Simulator(start_states, model_dir=output_dir, drone_model=drone_model)`.
+
+        Args:
+            output_dir (str): directory to create the model folder in
+            drone_model (str | None): name of the new model, defaults to the base model name
+
+        Returns:
+            str: path to the written point mass yaml file
+        """
+        drone_model = drone_model or self.drone_model
+        target = os.path.join(output_dir, drone_model)
+        shutil.copytree(
+            os.path.join(self.model_dir, self.drone_model), target, dirs_exist_ok=True
+        )
+
+        # PyFlyt expects <drone_model>/<drone_model>.urdf and .yaml
+        for extension in ("urdf", "yaml", "point_mass.yaml"):
+            source = os.path.join(target, f"{self.drone_model}.{extension}")
+            destination = os.path.join(target, f"{drone_model}.{extension}")
+            if source != destination and os.path.exists(source):
+                os.replace(source, destination)
+
+        path = os.path.join(target, f"{drone_model}.point_mass.yaml")
+        with open(path, "w") as f:
+            yaml.safe_dump(
+                _scaled_params(self.base_params, self.parameters, self.scales),
+                f,
+                sort_keys=False,
+            )
+
+        # the PyBullet twin takes the fitted physical values over its own
+        pybullet_path = os.path.join(target, f"{drone_model}.yaml")
+        with open(pybullet_path) as f:
+            pybullet_params = yaml.safe_load(f)
+        for name, value in self.fitted_values.items():
+            if name in PHYSICAL_PARAMETERS:
+                *keys, key = PARAMETERS[name]
+                _read(pybullet_params, keys)[key] = value
+        with open(pybullet_path, "w") as f:
+            yaml.safe_dump(pybullet_params, f, sort_keys=False)
+
+        return path
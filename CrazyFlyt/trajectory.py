@@ -0,0 +1,130 @@
+"""Piecewise polynomial trajectories that can be flown onboard by the Crazyflie high-level commander."""
+from typing import Callable
+
+import numpy as np
+
+
+class Trajectory:
+    """Trajectory.
+
+    Piecewise polynomial trajectories for a swarm of drones.
+    The layout follows the Crazyflie `Poly4D` trajectory memory:
+    every piece has a duration, and 8 coefficients in ascending powers of time for each of x, y, z and yaw.
+    All drones share the same piece durations so that a synchronized start keeps them in lockstep.
+    """
+
+    # the onboard trajectory memory is 4096 bytes, each Poly4D piece takes 132 bytes
+    max_pieces = 31
+    num_coefficients = 8
+
+    def __init__(self, durations: np.ndarray, coefficients: np.ndarray):
+        """__init__.
+
+        Args:
+            durations (np.ndarray): (m, ) array of durations for each of the m pieces
+            coefficients (np.ndarray): (n, m, 4, 8) array of polynomial coefficients for n drones, m pieces, [x, y, z, yaw]
+        """
+        durations = np.asarray(durations, dtype=np.float64)
+        coefficients = np.asarray(coefficients, dtype=np.float64)
+
+        assert (
+            coefficients.ndim == 4
+        ), f"coefficients must be a (n, m, 4, 8) array, got {coefficients.shape}."
+        assert coefficients.shape[1:] == (
+            len(durations),
+            4,
+            self.num_coefficients,
+        ), f"coefficients must be a (n, {len(durations)}, 4, {self.num_coefficients}) array, got {coefficients.shape}."
+        assert np.all(durations > 0.0), "all piece durations must be positive."
+
+        self.durations = durations
+        self.coefficients = coefficients
+        self.start_times = np.concatenate(([0.0], np.cumsum(durations)[:-1]))
+
+    @classmethod
+    def from_waypoints(cls, times: np.ndarray, waypoints: np.ndarray):
+        """Fits a smooth trajectory through timed waypoints using cubic Hermite pieces.
+
+        Velocities at each waypoint are taken from central differences, and are zero at both ends so that drones start and finish at rest.
+
+        Args:
+            times (np.ndarray): (k, ) strictly increasing array of times for each waypoint
+            waypoints (np.ndarray): (n, k, 4) array of [x, y, z, yaw] waypoints for n drones
+        """
+        times = np.asarray(times, dtype=np.float64)
+        waypoints = np.asarray(waypoints, dtype=np.float64)
+        assert waypoints.ndim == 3 and waypoints.shape[1:] == (
+            len(times),
+            4,
+        ), f"waypoints must be a (n, {len(times)}, 4) array, got {waypoints.shape}."
+        assert len(times) >= 2, "need at least 2 waypoints to form a trajectory."
+
+        # central difference velocities, zero at the endpoints
+        velocities = np.zeros_like(waypoints)
+        velocities[:, 1:-1] = (waypoints[:, 2:] - waypoints[:, :-2]) / (
+            times[2:] - times[:-2]
+        )[None, :, None]
+
+        # cubic hermite coefficients for all drones and pieces at once
+        T = np.diff(times)[None, :, None]
+        p0, p1 = waypoints[:, :-1], waypoints[:, 1:]
+        v0, v1 = velocities[:, :-1], velocities[:, 1:]
+
+        coefficients = np.zeros((*p0.shape, cls.num_coefficients))
+        coefficients[..., 0] = p0
+        coefficients[..., 1] = v0
+        coefficients[..., 2] = (3.0 * (p1 - p0) - (2.0 * v0 + v1) * T) / T**2
+        coefficients[..., 3] = (2.0 * (p0 - p1) + (v0 + v1) * T) / T**3
+
+        return cls(np.diff(times), coefficients)
+
+    @classmethod
+    def from_function(
+        cls,
+        function: Callable[[float], np.ndarray],
+        duration: float,
+        num_pieces: int = max_pieces,
+    ):
+        """Compiles a function of time into a trajectory by sampling it at evenly spaced waypoints.
+
+        Args:
+            function (Callable[[float], np.ndarray]): function mapping time in seconds to an (n, 4) array of [x, y, z, yaw] setpoints
+            duration (float): total duration of the trajectory in seconds
+            num_pieces (int): number of polynomial pieces to use
+        """
+        times = np.linspace(0.0, duration, num_pieces + 1)
+        waypoints = np.stack([function(t) for t in times], axis=1)
+        return cls.from_waypoints(times, waypoints)
+
+    @property
+    def num_drones(self):
+        """num_drones."""
+        return self.coefficients.shape[0]
+
+    @property
+    def num_pieces(self):
+        """num_pieces."""
+        return len(self.durations)
+
+    @property
+    def duration(self):
+        """duration."""
+        return float(np.sum(self.durations))
+
+    def evaluate(self, t: float) -> np.ndarray:
+        """Evaluates the trajectory for all drones, times past the end hold the final position.
+
+        Args:
+            t (float): time since the start of the trajectory in seconds
+
+        Returns:
+            np.ndarray: (n, 4) array of [x, y, z, yaw] setpoints
+        """
+        t = min(max(t, 0.0), self.duration)
+        piece = min(
+            int(np.searchsorted(self.start_times, t, side="right")) - 1,
+            self.num_pieces - 1,
+        )
+        powers = (t - self.start_times[piece]) ** np.arange(self.num_coefficients)
+
+        return self.coefficients[:, piece] @ powers
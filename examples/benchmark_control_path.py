@@ -0,0 +1,91 @@
+"""Benchmarks the packed setpoint and telemetry path of the DroneController against the previous conversions, no drones needed."""
+import math
+import struct
+import timeit
+
+import numpy as np
+from cflib.crazyflie.commander import TYPE_POSITION
+from cflib.crazyflie.log import LogConfig
+
+from CrazyFlyt.drone_controller import POSITION_LOG, PositionLogConfig, pack_setpoint
+
+NUM_DRONES = 100
+CONTROL_HZ = 40.0
+TELEMETRY_HZ = 100.0
+FRAME_HZ = 10.0
+REPEATS = 20000
+
+rad_to_deg = np.array([1.0, 1.0, 1.0, math.pi / 180.0])
+setpoint = np.array([0.5, -0.25, 1.0, 0.3])
+
+
+def send_previous():
+    """Previous control tick, converts and packs the setpoint on every send."""
+    return struct.pack("<Bffff", TYPE_POSITION, *(setpoint * rad_to_deg))
+
+
+def set_packed():
+    """Packed path, converts and packs once when the setpoint is set."""
+    return pack_setpoint(setpoint, rad_to_deg, True)
+
+
+def make_telemetry(packed: bool):
+    """Builds a position log block and the callback it drives.
+
+    Args:
+        packed (bool): use the packed decoder instead of the dictionary based one
+    """
+    position_estimate = np.zeros((4,))
+
+    def previous_callback(timestamp, data, logconf):
+        position_estimate[0] = data["stateEstimate.x"]
+        position_estimate[1] = data["stateEstimate.y"]
+        position_estimate[2] = data["stateEstimate.z"]
+        position_estimate[3] = data["stateEstimate.yaw"] / 180.0 * math.pi
+
+    def packed_callback(timestamp, x, y, z, yaw):
+        position_estimate[:] = (x, y, z, yaw * (math.pi / 180.0))
+
+    if packed:
+        return PositionLogConfig(packed_callback)
+
+    log_config = LogConfig(name="Position", period_in_ms=10)
+    for variable in ("x", "y", "z", "yaw"):
+        log_config.add_variable(f"stateEstimate.{variable}", "float")
+    log_config.data_received_cb.add_callback(previous_callback)
+    return log_config
+
+
+if __name__ == "__main__":
+    sample = POSITION_LOG.pack(0.5, -0.25, 1.0, 17.0)
+    previous_log = make_telemetry(packed=False)
+    packed_log = make_telemetry(packed=True)
+    assert send_previous() == set_packed()
+
+    timings = dict(
+        send_previous=timeit.timeit(send_previous, number=REPEATS) / REPEATS,
+        set_packed=timeit.timeit(set_packed, number=REPEATS) / REPEATS,
+        decode_previous=timeit.timeit(
+            lambda: previous_log.unpack_log_data(sample, 0), number=REPEATS
+        )
+        / REPEATS,
+        decode_packed=timeit.timeit(
+            lambda: packed_log.unpack_log_data(sample, 0), number=REPEATS
+        )
+        / REPEATS,
+    )
+    for name, seconds in timings.items():
+        print(f"{name:>16}: {seconds * 1e6:.2f} us per call")
+
+    # previously every control tick converted, now only every new frame does, and sends reuse the payload
+    previous = NUM_DRONES * (
+        CONTROL_HZ * timings["send_previous"]
+        + TELEMETRY_HZ * timings["decode_previous"]
+    )
+    packed = NUM_DRONES * (
+        FRAME_HZ * timings["set_packed"] + TELEMETRY_HZ * timings["decode_packed"]
+    )
+    print(
+        f"{NUM_DRONES} drones at {CONTROL_HZ:g} Hz control, {TELEMETRY_HZ:g} Hz telemetry and {FRAME_HZ:g} Hz frames: "
+        f"{previous * 1e3:.1f} ms/s before, {packed * 1e3:.1f} ms/s packed, {previous / packed:.1f}x less time on the GIL."
+    )
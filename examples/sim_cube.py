@@ -5,7 +5,7 @@ from signal import SIGINT, signal
 
 import numpy as np
 
-from CrazyFlyt import Simulator
+from CrazyFlyt import Simulator, formations
 
 
 def shutdown_handler(*_):
@@ -21,17 +21,11 @@ def shutdown_handler(*_):
 if __name__ == "__main__":
     signal(SIGINT, shutdown_handler)
 
-    # the cube is made up of 3x3x3 drones
+    # the cube is made up of 2x2x2 drones
     dim_drones = 2
 
-    # use meshgrid to form the coordinates for drones to form the cube
-    lin_range = np.array([-0.4, 0.4])
-    lin_range = np.linspace(start=lin_range[0], stop=lin_range[1], num=dim_drones)
-    grid_x, grid_y, grid_z = np.meshgrid(lin_range, lin_range, lin_range)
-    grid_x, grid_y, grid_z = grid_x.flatten(), grid_y.flatten(), grid_z.flatten()
-
     # The cube is centered around offset
-    cube = np.stack([grid_x, grid_y, grid_z], axis=-1)
+    cube = formations.cube(dim_drones, 0.4, (0.0, 0.0, 0.0))[:, :3]
     offset = np.array([[0.0, 0.0, 0.8]])
 
     # define cube rotation per timestep
@@ -0,0 +1,54 @@
+"""Simulates one swarm split across several worker processes, driven in lockstep by a coordinator."""
+import functools
+import multiprocessing
+import os
+from signal import SIGINT, signal
+
+from CrazyFlyt import Coordinator, Simulator, formations, serve_worker
+
+NUM_WORKERS = 3
+BASE_PORT = 5770
+
+
+def shutdown_handler(*_):
+    """shutdown_handler.
+
+    Args:
+        _: args
+    """
+    print("ctrl-c invoked")
+    os._exit(1)
+
+
+if __name__ == "__main__":
+    signal(SIGINT, shutdown_handler)
+
+    # every worker owns a row of 4 drones, here a headless point mass simulation stands in for its radios
+    workers = []
+    for i in range(NUM_WORKERS):
+        start_states = formations.line(4, (0.0, float(i), 0.0), (3.0, float(i), 0.0))
+        make_swarm = functools.partial(Simulator, start_states, backend="point_mass")
+        worker = multiprocessing.Process(
+            target=serve_worker, args=(make_swarm, "127.0.0.1", BASE_PORT + i)
+        )
+        worker.start()
+        workers.append(worker)
+
+    # the coordinator sees all the workers as one swarm of 12 drones
+    swarm = Coordinator([("127.0.0.1", BASE_PORT + i) for i in range(NUM_WORKERS)])
+    swarm.set_pos_control(True)
+    swarm.arm([True] * swarm.num_drones)
+
+    # fly the whole swarm into a circle
+    swarm.set_setpoints(formations.circle(swarm.num_drones, 2.0, (1.5, 1.0, 1.0)))
+    swarm.sleep(8)
+
+    print(f"Aggregated positions:\n{swarm.position_estimate}")
+    print(f"Ticks missed by each worker: {swarm.missed_ticks}")
+
+    # disarm, then stop the workers
+    swarm.arm([False] * swarm.num_drones)
+    swarm.sleep(1)
+    swarm.end()
+    for worker in workers:
+        worker.join()
@@ -0,0 +1,50 @@
+"""Simulates a swarm of CrazyFlie drones holding a formation around a moving virtual leader."""
+import math
+import os
+from signal import SIGINT, signal
+
+from CrazyFlyt import RelativeFormation, Simulator, formations
+
+
+def shutdown_handler(*_):
+    """shutdown_handler.
+
+    Args:
+        _: args
+    """
+    print("ctrl-c invoked")
+    os._exit(1)
+
+
+if __name__ == "__main__":
+    signal(SIGINT, shutdown_handler)
+
+    # here we spawn drones in a 3x3 grid 1 meter off the ground
+    start_states = formations.grid((3, 3, 1), (0.6, 0.6, 1.0), (0.0, 0.0, 1.0))
+
+    # spawn in the drones and enable all of them
+    swarm = Simulator(start_states=start_states)
+    swarm.arm([True] * swarm.num_drones)
+
+    # every drone holds its spot in the grid relative to a leader in the middle of it
+    swarm.set_formation(RelativeFormation.from_positions(start_states))
+    swarm.sleep(3)
+
+    # only the leader is sent from here on, it is carried along its velocity between updates
+    for i in range(20):
+        heading = 0.1 * math.pi * i
+        swarm.set_leader(
+            [math.cos(heading), math.sin(heading), 1.5, heading],
+            velocity=[-0.3 * math.sin(heading), 0.3 * math.cos(heading), 0.0, 0.3],
+            scale=1.0 + 0.5 * math.sin(heading),
+        )
+        swarm.sleep(1)
+
+    # back to streamed setpoints, hold where the formation ended
+    swarm.set_formation(None)
+    swarm.set_setpoints(swarm.get_states())
+    swarm.sleep(2)
+
+    # disarm all drones
+    swarm.arm([0] * swarm.num_drones)
+    swarm.sleep(4)
@@ -6,9 +6,15 @@ from signal import SIGINT, signal
 
 import numpy as np
 
-from CrazyFlyt import Simulator, SwarmController
+from CrazyFlyt import (
+    Geofence,
+    LinkPlanner,
+    Simulator,
+    SwarmController,
+    formations,
+    sequences,
+)
 
-global DIM_DRONES
 DIM_DRONES = 2
 
 
@@ -51,15 +57,8 @@ def get_args():
 
 def fake_handler():
     """fake_handler."""
-    global DIM_DRONES
     # here we spawn drones in a circle
-    theta = np.arange(0, 2 * math.pi, 2 * math.pi / (DIM_DRONES**3))
-    distance = 2.0
-    x = distance * np.cos(theta)
-    y = distance * np.sin(theta)
-    z = np.ones_like(x) * 0.05
-    yaw = np.zeros_like(x)
-    start_states = np.stack((x, y, z, yaw), axis=-1)
+    start_states = formations.circle(DIM_DRONES**3, 2.0, (0.0, 0.0, 0.05))
 
     # spawn in a drone
     UAVs = Simulator(start_states)
@@ -80,6 +79,9 @@ def real_handler():
     URIs.append("radio://0/10/2M/E7E7E7E7E2")
     URIs.append("radio://1/30/2M/E7E7E7E7E4")
 
+    # spread the drones evenly over both radios
+    URIs = LinkPlanner(URIs, dongles=[0, 1]).plan()
+
     # connect to a drone
     UAVs = SwarmController(URIs)
     UAVs.set_pos_control(True)
@@ -87,44 +89,6 @@ def real_handler():
     return UAVs
 
 
-def get_circle(radius: float, height: float):
-    """get_circle.
-
-    Args:
-        radius (float): radius
-        height (float): height
-    """
-    global DIM_DRONES
-
-    theta = np.arange(0, 2 * math.pi, 2 * math.pi / (DIM_DRONES**3))
-    x = radius * np.cos(theta)
-    y = radius * np.sin(theta)
-    z = np.ones_like(x) * height
-
-    return np.stack((x, y, z), axis=-1)
-
-
-def get_cube(length: float):
-    """get_cube.
-
-    Args:
-        length (float): length of the cube
-    """
-    global DIM_DRONES
-
-    lin_range = np.array([-length, length])
-    lin_range = np.linspace(start=lin_range[0], stop=lin_range[1], num=DIM_DRONES)
-    height_range = np.array([-length, length])
-    height_range = np.linspace(
-        start=height_range[0], stop=height_range[1], num=DIM_DRONES
-    )
-
-    grid_x, grid_y, grid_z = np.meshgrid(lin_range, lin_range, height_range)
-    grid_x, grid_y, grid_z = grid_x.flatten(), grid_y.flatten(), grid_z.flatten()
-
-    return np.stack([grid_x, grid_y, grid_z], axis=-1)
-
-
 if __name__ == "__main__":
     args = get_args()
     signal(SIGINT, shutdown_handler)
@@ -139,13 +103,17 @@ if __name__ == "__main__":
         print("Guess this is life now.")
         exit()
 
+    # keep every setpoint inside the flying area
+    UAVs.set_geofence(
+        Geofence(lower=np.array([-3.0, -3.0, 0.0]), upper=np.array([3.0, 3.0, 3.0]))
+    )
+
     # offsets for cube
     cube_offset = np.array([[0.0, 0.0, 2.0]])
     rotation_radius = np.array([[0.3, 0.0, 0.15]])
 
     # form the cube coordinates
-    cube = get_cube(0.5)
-    cube_orn = np.zeros_like(cube)
+    cube = formations.cube(DIM_DRONES, 0.5, (0.0, 0.0, 0.0))[:, :3]
 
     # define cube rotation per timestep
     r = 1.0 / 1000.0
@@ -170,7 +138,8 @@ if __name__ == "__main__":
     R2 = Rx @ Ry @ Rz
 
     # reshuffle drones according to cube pos, then arm all and launch
-    UAVs.reshuffle(cube + cube_offset + rotation_radius)
+    xyz = cube + cube_offset + rotation_radius
+    UAVs.reshuffle(np.concatenate((xyz, np.zeros((UAVs.num_drones, 1))), axis=-1))
     UAVs.arm([True] * UAVs.num_drones)
     UAVs.sleep(5)
 
@@ -193,15 +162,9 @@ if __name__ == "__main__":
             UAVs.sleep(0.01)
 
     # circle targets 1 meter above ground
-    circle = get_circle(1.0, 1.0)
-    UAVs.reshuffle(circle)
-    UAVs.sleep(5)
-
-    # circle targets on the ground
-    circle = get_circle(1.0, -1.0)
-    UAVs.reshuffle(circle)
+    UAVs.reshuffle(formations.circle(UAVs.num_drones, 1.0, (0.0, 0.0, 1.0)))
     UAVs.sleep(5)
 
-    UAVs.arm([False] * UAVs.num_drones)
-    UAVs.sleep(2)
+    # land in staggered waves, disarming each drone once it touches down
+    sequences.land(UAVs)
     UAVs.end()
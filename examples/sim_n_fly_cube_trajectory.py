@@ -0,0 +1,143 @@
+"""Controls CrazyFlie drones flying a rotating cube that is uploaded onboard as a trajectory, can be done in either simulation or reality."""
+import argparse
+import math
+import os
+from signal import SIGINT, signal
+
+import numpy as np
+
+from CrazyFlyt import LinkPlanner, Simulator, SwarmController, Trajectory, formations
+
+DIM_DRONES = 2
+
+
+def shutdown_handler(*_):
+    """shutdown_handler.
+
+    Args:
+        _: args
+    """
+    print("ctrl-c invoked")
+    os._exit(1)
+
+
+def get_args():
+    """get_args."""
+    parser = argparse.ArgumentParser(
+        description="Fly a bunch of CrazyFlie drones in a cube."
+    )
+
+    parser.add_argument(
+        "--simulate",
+        type=bool,
+        nargs="?",
+        const=True,
+        default=False,
+        help="Use simulation.",
+    )
+
+    parser.add_argument(
+        "--hardware",
+        type=bool,
+        nargs="?",
+        const=True,
+        default=False,
+        help="Run on actual drones.",
+    )
+
+    return parser.parse_args()
+
+
+def fake_handler():
+    """fake_handler."""
+    # here we spawn drones in a circle
+    start_states = formations.circle(DIM_DRONES**3, 2.0, (0.0, 0.0, 0.05))
+
+    # spawn in a drone
+    UAVs = Simulator(start_states)
+    UAVs.set_pos_control(True)
+
+    return UAVs
+
+
+def real_handler():
+    """real_handler."""
+    URIs = []
+    URIs.append("radio://0/10/2M/E7E7E7E7E7")
+    URIs.append("radio://1/10/2M/E7E7E7E7E1")
+    URIs.append("radio://1/10/2M/E7E7E7E7E6")
+    URIs.append("radio://1/10/2M/E7E7E7E7E5")
+    URIs.append("radio://0/30/2M/E7E7E7E7E0")
+    URIs.append("radio://0/10/2M/E7E7E7E7E3")
+    URIs.append("radio://0/10/2M/E7E7E7E7E2")
+    URIs.append("radio://1/30/2M/E7E7E7E7E4")
+
+    # spread the drones evenly over both radios
+    URIs = LinkPlanner(URIs, dongles=[0, 1]).plan()
+
+    # connect to a drone
+    UAVs = SwarmController(URIs)
+    UAVs.set_pos_control(True)
+
+    return UAVs
+
+
+def get_rotating_cube(t: float):
+    """get_rotating_cube.
+
+    Args:
+        t (float): time in seconds since the start of the show
+    """
+    cube = formations.cube(DIM_DRONES, 0.5, (0.0, 0.0, 0.0))[:, :3]
+
+    # spin about z while slowly rocking about x
+    c, s = math.cos(0.5 * t), math.sin(0.5 * t)
+    Rz = np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+    c, s = math.cos(0.3 * math.sin(0.2 * t)), math.sin(0.3 * math.sin(0.2 * t))
+    Rx = np.array([[1.0, 0.0, 0.0], [0.0, c, -s], [0.0, s, c]])
+
+    xyz = (Rx @ Rz @ cube.T).T + np.array([[0.0, 0.0, 2.0]])
+
+    return np.concatenate((xyz, np.zeros((len(xyz), 1))), axis=-1)
+
+
+if __name__ == "__main__":
+    args = get_args()
+    signal(SIGINT, shutdown_handler)
+
+    # get the swarm handler
+    UAVs = None
+    if args.simulate:
+        UAVs = fake_handler()
+    elif args.hardware:
+        UAVs = real_handler()
+    else:
+        print("Guess this is life now.")
+        exit()
+
+    # compile the whole show into piecewise polynomials before flying
+    show_duration = 30.0
+    trajectory = Trajectory.from_function(get_rotating_cube, show_duration)
+
+    # reshuffle drones to the start of the show, then arm all and launch
+    UAVs.reshuffle(get_rotating_cube(0.0))
+    UAVs.arm([True] * UAVs.num_drones)
+    UAVs.sleep(5)
+
+    # upload and fly the show onboard, no setpoints are streamed from here on
+    UAVs.upload_trajectory(trajectory)
+    UAVs.start_trajectory()
+    UAVs.sleep(show_duration)
+    UAVs.stop_trajectory()
+
+    # circle targets 1 meter above ground
+    UAVs.reshuffle(formations.circle(UAVs.num_drones, 1.0, (0.0, 0.0, 1.0)))
+    UAVs.sleep(5)
+
+    # circle targets on the ground
+    UAVs.reshuffle(formations.circle(UAVs.num_drones, 1.0, (0.0, 0.0, -1.0)))
+    UAVs.sleep(5)
+
+    UAVs.arm([False] * UAVs.num_drones)
+    UAVs.sleep(2)
+    UAVs.end()
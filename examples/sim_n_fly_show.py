@@ -0,0 +1,171 @@
+"""Compiles the rotating cube into a binary show file, validates it offline, then flies it in simulation or reality."""
+import argparse
+import math
+import os
+from signal import SIGINT, signal
+
+import numpy as np
+
+from CrazyFlyt import (
+    Geofence,
+    LinkPlanner,
+    Show,
+    Simulator,
+    SwarmController,
+    formations,
+    sequences,
+)
+
+DIM_DRONES = 2
+SHOW_FILE = "cube.show"
+
+
+def shutdown_handler(*_):
+    """shutdown_handler.
+
+    Args:
+        _: args
+    """
+    print("ctrl-c invoked")
+    os._exit(1)
+
+
+def get_args():
+    """get_args."""
+    parser = argparse.ArgumentParser(
+        description="Compile, check and fly a show on a bunch of CrazyFlie drones."
+    )
+
+    parser.add_argument(
+        "--simulate",
+        type=bool,
+        nargs="?",
+        const=True,
+        default=False,
+        help="Use simulation.",
+    )
+
+    parser.add_argument(
+        "--hardware",
+        type=bool,
+        nargs="?",
+        const=True,
+        default=False,
+        help="Run on actual drones.",
+    )
+
+    parser.add_argument(
+        "--point_mass",
+        type=bool,
+        nargs="?",
+        const=True,
+        default=False,
+        help="Simulate with the point mass backend instead of PyBullet.",
+    )
+
+    return parser.parse_args()
+
+
+def fake_handler(point_mass: bool):
+    """fake_handler.
+
+    Args:
+        point_mass (bool): use the point mass backend
+    """
+    # here we spawn drones in a circle
+    start_states = formations.circle(DIM_DRONES**3, 2.0, (0.0, 0.0, 0.05))
+
+    # spawn in a drone
+    UAVs = Simulator(start_states, backend="point_mass" if point_mass else "pybullet")
+    UAVs.set_pos_control(True)
+
+    return UAVs
+
+
+def real_handler():
+    """real_handler."""
+    URIs = []
+    URIs.append("radio://0/10/2M/E7E7E7E7E7")
+    URIs.append("radio://1/10/2M/E7E7E7E7E1")
+    URIs.append("radio://1/10/2M/E7E7E7E7E6")
+    URIs.append("radio://1/10/2M/E7E7E7E7E5")
+    URIs.append("radio://0/30/2M/E7E7E7E7E0")
+    URIs.append("radio://0/10/2M/E7E7E7E7E3")
+    URIs.append("radio://0/10/2M/E7E7E7E7E2")
+    URIs.append("radio://1/30/2M/E7E7E7E7E4")
+
+    # spread the drones evenly over both radios
+    URIs = LinkPlanner(URIs, dongles=[0, 1]).plan()
+
+    # connect to a drone
+    UAVs = SwarmController(URIs)
+    UAVs.set_pos_control(True)
+
+    return UAVs
+
+
+def get_rotating_cube(t: float):
+    """get_rotating_cube.
+
+    Args:
+        t (float): time in seconds since the start of the show
+    """
+    cube = formations.cube(DIM_DRONES, 0.5, (0.0, 0.0, 0.0))[:, :3]
+
+    # spin about z while slowly rocking about x
+    c, s = math.cos(0.5 * t), math.sin(0.5 * t)
+    Rz = np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+    c, s = math.cos(0.3 * math.sin(0.2 * t)), math.sin(0.3 * math.sin(0.2 * t))
+    Rx = np.array([[1.0, 0.0, 0.0], [0.0, c, -s], [0.0, s, c]])
+
+    xyz = (Rx @ Rz @ cube.T).T + np.array([[0.0, 0.0, 2.0]])
+    return np.concatenate((xyz, np.zeros((len(xyz), 1))), axis=-1)
+
+
+if __name__ == "__main__":
+    args = get_args()
+    signal(SIGINT, shutdown_handler)
+
+    # compile the show and check it before anything flies
+    geofence = Geofence(
+        lower=np.array([-3.0, -3.0, 0.0]), upper=np.array([3.0, 3.0, 3.0])
+    )
+    show = Show.from_function(get_rotating_cube, 30.0)
+    report = show.validate(min_separation=0.3, geofence=geofence)
+    report.update(
+        {f"simulated {name}": check for name, check in show.simulate().items()}
+    )
+    for name, check in report.items():
+        print(
+            f"{name}: {'pass' if check['passed'] else 'FAIL'}, worst {check['worst']:.3f}, limit {check['limit']:.3f}"
+        )
+    if not all(check["passed"] for check in report.values()):
+        print("Show failed validation.")
+        exit()
+    show.save(SHOW_FILE)
+
+    # get the swarm handler
+    UAVs = None
+    if args.simulate:
+        UAVs = fake_handler(args.point_mass)
+    elif args.hardware:
+        UAVs = real_handler()
+    else:
+        print("Guess this is life now.")
+        exit()
+
+    UAVs.set_geofence(geofence)
+
+    # take off, then assign drones to the first frame, column i of the show is then flown by drone i
+    sequences.takeoff(UAVs)
+    show = Show.load(SHOW_FILE)
+    UAVs.reshuffle(show.frame(0))
+    UAVs.sleep(5)
+
+    # play the show straight from the file
+    stream = UAVs.play_show(show)
+    print(f"Played {stream.frames} frames with {stream.underruns} under-runs.")
+
+    # land in staggered waves, disarming each drone once it touches down
+    sequences.land(UAVs)
+    UAVs.end()
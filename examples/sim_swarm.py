@@ -4,7 +4,7 @@ from signal import SIGINT, signal
 
 import numpy as np
 
-from CrazyFlyt import Simulator
+from CrazyFlyt import Simulator, formations
 
 
 def shutdown_handler(*_):
@@ -20,22 +20,9 @@ def shutdown_handler(*_):
 if __name__ == "__main__":
     signal(SIGINT, shutdown_handler)
 
-    # here we spawn drones in a 3x3x2 grid
-    drones_per_len = 3
-    drones_per_height = 2
-
-    lin_range = [-1, 1]
-    lin_range = np.linspace(start=lin_range[0], stop=lin_range[1], num=drones_per_len)
-    height_range = [1.0, 2.0]
-    height_range = np.linspace(
-        start=height_range[0], stop=height_range[1], num=drones_per_height
-    )
-
-    grid_x, grid_y, grid_z = np.meshgrid(lin_range, lin_range, height_range)
-    grid_x, grid_y, grid_z = grid_x.flatten(), grid_y.flatten(), grid_z.flatten()
-
-    # define the starting state as an [n, 4] array for n drones
-    start_states = np.stack([grid_x, grid_y, grid_z, np.zeros_like(grid_x)], axis=-1)
+    # here we spawn drones in a 3x3x2 grid, spanning [-1, 1] in x and y and [1, 2] in z
+    # the starting state is an [n, 4] array for n drones
+    start_states = formations.grid((3, 3, 2), (1.0, 1.0, 1.0), (0.0, 0.0, 1.5))
 
     # spawn in the drones according to the positions and enable all of them
     swarm = Simulator(start_states=start_states)
@@ -0,0 +1,26 @@
+"""Shared fixtures for the CrazyFlyt tests."""
+import socket
+
+import numpy as np
+import pytest
+
+from CrazyFlyt import Simulator
+
+
+def free_port() -> int:
+    """Asks the OS for a UDP port that is free right now."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def line_states():
+    """Three drones on the ground along the x axis."""
+    return np.array([[0.0, 0.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0], [2.0, 0.0, 0.0, 0.0]])
+
+
+@pytest.fixture
+def point_mass(line_states):
+    """Headless point mass simulation of three drones."""
+    return Simulator(line_states, backend="point_mass", render=False)
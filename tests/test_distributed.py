@@ -0,0 +1,76 @@
+"""Coordinator and Worker lockstep over loopback with local worker processes."""
+import functools
+import multiprocessing
+import socket
+
+import numpy as np
+
+from CrazyFlyt import Coordinator, Simulator, Worker, formations, serve_worker
+from CrazyFlyt.distributed import MSG_TICK, TICK
+from CrazyFlyt.network_bridge import HEADER
+
+from .conftest import free_port
+
+
+def test_lockstep_with_local_processes():
+    """Two worker processes fly their shards as one swarm, arming and disarming through the ticks."""
+    ports = [free_port() for _ in range(2)]
+    workers = []
+    for i, port in enumerate(ports):
+        start_states = formations.line(2, (0.0, float(i), 0.0), (1.0, float(i), 0.0))
+        make_swarm = functools.partial(
+            Simulator, start_states, backend="point_mass", render=False
+        )
+        worker = multiprocessing.Process(
+            target=serve_worker, args=(make_swarm, "127.0.0.1", port)
+        )
+        worker.start()
+        workers.append(worker)
+
+    try:
+        swarm = Coordinator([("127.0.0.1", port) for port in ports], rate_hz=20.0)
+        assert swarm.num_drones == 4
+
+        targets = np.array(
+            [
+                [0.0, 0.0, 1.0, 0.0],
+                [1.0, 0.0, 1.0, 0.0],
+                [0.0, 1.0, 1.0, 0.0],
+                [1.0, 1.0, 1.0, 0.0],
+            ]
+        )
+        swarm.set_pos_control(True)
+        swarm.arm([True] * 4)
+        swarm.set_setpoints(targets)
+        swarm.sleep(4.0)
+
+        assert np.all(swarm.connected)
+        np.testing.assert_allclose(
+            swarm.position_estimate[:, :3], targets[:, :3], atol=0.15
+        )
+
+        swarm.arm([False] * 4)
+        swarm.sleep(0.5)
+        swarm.end()
+    finally:
+        for worker in workers:
+            worker.join(timeout=10.0)
+            if worker.is_alive():
+                worker.terminate()
+
+    assert all(worker.exitcode == 0 for worker in workers)
+
+
+def test_worker_drops_malformed_ticks(line_states):
+    """A short tick is counted and dropped instead of taking the worker down."""
+    worker = Worker(Simulator(line_states, backend="point_mass", render=False), port=0)
+    raw = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        packet = HEADER.pack(MSG_TICK, 1, 3, 1, 0.0) + TICK.pack(0.05) + b"\x00" * 8
+        worker._handle(packet, raw.getsockname())
+        worker._handle(b"\x04", raw.getsockname())
+        assert worker.dropped_packets == 2
+        assert worker.ticks == 0
+    finally:
+        raw.close()
+        worker.close()
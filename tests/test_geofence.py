@@ -0,0 +1,41 @@
+"""Vectorized geofence clipping."""
+import numpy as np
+
+from CrazyFlyt import Geofence
+
+
+def test_positions_are_contained():
+    """Position setpoints outside the box are projected onto it and counted."""
+    geofence = Geofence(
+        lower=np.array([-1.0, -1.0, 0.0]), upper=np.array([1.0, 1.0, 2.0])
+    )
+    setpoints = np.array([[0.5, 0.5, 1.0, 0.3], [3.0, -2.0, 5.0, 0.0]])
+    filtered = geofence.apply(setpoints, True, 0.0)
+
+    np.testing.assert_array_equal(filtered[0], setpoints[0])
+    np.testing.assert_array_equal(filtered[1], [1.0, -1.0, 2.0, 0.0])
+    np.testing.assert_array_equal(geofence.violations, [0, 1])
+
+
+def test_velocities_are_limited_at_the_edge():
+    """Velocities are clipped to the top speed, and stop pointing outwards at the edge."""
+    geofence = Geofence(
+        lower=np.array([-1.0, -1.0, 0.0]),
+        upper=np.array([1.0, 1.0, 2.0]),
+        max_velocity=np.array([0.5, 0.5, 0.5, 1.0]),
+    )
+    positions = np.array([[0.0, 0.0, 1.0, 0.0], [1.0, 0.0, 1.0, 0.0]])
+    setpoints = np.array([[2.0, 0.0, 0.0, 0.0], [0.4, 0.2, 0.0, 0.0]])
+    filtered = geofence.apply(setpoints, False, 0.0, positions)
+
+    np.testing.assert_allclose(filtered, [[0.5, 0.0, 0.0, 0.0], [0.0, 0.2, 0.0, 0.0]])
+
+
+def test_mixed_modes_and_rate_limit():
+    """Each drone is filtered in its own mode, and position setpoints move no faster than the rate limit."""
+    geofence = Geofence(max_position_rate=np.array([1.0, 1.0, 1.0, 1.0]))
+    geofence.apply(np.zeros((2, 4)), np.array([True, False]), 0.0)
+    filtered = geofence.apply(np.full((2, 4), 5.0), np.array([True, False]), 0.5)
+
+    np.testing.assert_allclose(filtered[0], 0.5)
+    np.testing.assert_allclose(filtered[1], 5.0)
@@ -0,0 +1,135 @@
+"""Loopback tests of the GroundStation and RemoteSwarm."""
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from CrazyFlyt import GroundStation, RemoteSwarm
+from CrazyFlyt.network_bridge import HEADER, MSG_ARM, MSG_SETPOINTS
+
+
+@pytest.fixture
+def station(point_mass):
+    """GroundStation serving the point mass swarm from a background thread."""
+    station = GroundStation(point_mass, port=0)
+    running = True
+
+    def serve():
+        while running:
+            station.poll()
+            point_mass.sleep(station.period)
+            time.sleep(station.period)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    yield station
+    running = False
+    thread.join()
+    station.close()
+
+
+@pytest.fixture
+def client(station):
+    """RemoteSwarm subscribed to the station."""
+    client = RemoteSwarm(port=station.address[1])
+    yield client
+    client.end()
+
+
+def wait_for(condition, timeout: float = 5.0):
+    """Polls a condition until it holds or the timeout runs out."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_round_trip(station, client, point_mass):
+    """Setpoints and modes reach the swarm, telemetry and acks come back."""
+    assert client.num_drones == point_mass.num_drones
+
+    setpoints = np.array(
+        [[0.0, 0.0, 1.0, 0.0], [0.1, 0.0, 0.0, 0.0], [2.0, 0.0, 1.0, 0.0]]
+    )
+    client.set_setpoints(setpoints, np.array([True, False, True]))
+    wait_for(lambda: client.ack_sequence == client.sequence)
+
+    np.testing.assert_array_equal(point_mass.pos_control, [True, False, True])
+    np.testing.assert_allclose(point_mass.setpoints, setpoints, atol=1e-6)
+    assert np.isfinite(client.latency)
+
+    client.arm(np.array([True, False, True]))
+    wait_for(lambda: np.any(point_mass.armed))
+    np.testing.assert_array_equal(point_mass.armed, [True, False, True])
+    np.testing.assert_allclose(
+        client.position_estimate, point_mass.position_estimate, atol=0.1
+    )
+
+
+def test_malformed_packets_are_dropped(station, client, point_mass):
+    """Short, odd length and mis-sized packets are counted and do not stop the station."""
+    raw = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    n = point_mass.num_drones
+    bad = [
+        b"\x01",
+        HEADER.pack(MSG_SETPOINTS, 0, n, 1, 0.0) + b"\x00" * 8,
+        HEADER.pack(MSG_SETPOINTS, 0, n, 1, 0.0) + b"\x00" * (20 * n + 2),
+        HEADER.pack(MSG_ARM, 0, n, 1, 0.0) + b"\x00" * 4,
+        HEADER.pack(MSG_ARM, 0, n + 1, 1, 0.0) + b"\x00" * 4 * (n + 1),
+    ]
+    for packet in bad:
+        raw.sendto(packet, station.address)
+    raw.close()
+    wait_for(lambda: station.dropped_packets == len(bad))
+
+    # the station keeps serving well formed packets
+    client.set_setpoints(np.ones((n, 4)))
+    wait_for(lambda: client.ack_sequence == client.sequence)
+    assert not np.any(point_mass.armed)
+
+
+def test_acks_are_per_client(station, client, point_mass):
+    """One client resubscribing does not reset the sequencing of another."""
+    other = RemoteSwarm(port=station.address[1])
+    try:
+        for _ in range(3):
+            client.set_setpoints(np.ones((point_mass.num_drones, 4)))
+        wait_for(lambda: client.ack_sequence == client.sequence)
+
+        other.sock.sendto(HEADER.pack(0, 0, 0, 0, time.time()), station.address)
+        time.sleep(0.1)
+        address = ("127.0.0.1", client.sock.getsockname()[1])
+        assert station.acks[address][0] == client.sequence
+    finally:
+        other.end()
+
+
+def test_silent_subscribers_expire(point_mass):
+    """Subscribers that stop talking are dropped after the timeout."""
+    station = GroundStation(point_mass, port=0, subscriber_timeout=0.2)
+    try:
+        raw = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        raw.sendto(HEADER.pack(0, 0, 0, 0, time.time()), station.address)
+        time.sleep(0.05)
+        station.poll()
+        assert len(station.subscribers) == 1
+
+        time.sleep(0.3)
+        station.poll()
+        assert len(station.subscribers) == 0
+        raw.close()
+    finally:
+        station.close()
+
+
+def test_spin_is_paced_to_the_wall_clock(point_mass):
+    """A headless simulation is not served faster than real time."""
+    station = GroundStation(point_mass, port=0)
+    try:
+        start = time.monotonic()
+        station.spin(0.5)
+        assert time.monotonic() - start >= 0.45
+    finally:
+        station.close()
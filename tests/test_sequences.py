@@ -0,0 +1,29 @@
+"""Takeoff and landing sequences on the point mass simulator."""
+import numpy as np
+import pytest
+
+from CrazyFlyt import sequences
+
+
+def test_takeoff_and_land_on_simulated_clock(point_mass):
+    """Both sequences time themselves off the simulator and end with the swarm back on the ground, disarmed."""
+    start = point_mass.elapsed_time
+    airborne = sequences.takeoff(point_mass, height=1.0, timeout=10.0)
+    assert np.all(airborne)
+    assert point_mass.elapsed_time - start < 10.0
+
+    start = point_mass.elapsed_time
+    taken = sequences.land(point_mass, timeout=10.0)
+    assert taken == pytest.approx(point_mass.elapsed_time - start, abs=0.1)
+    assert not np.any(point_mass.armed)
+    np.testing.assert_allclose(point_mass.position_estimate[:, 2], 0.0, atol=0.05)
+
+
+def test_sequences_refuse_remote_swarms():
+    """Swarms without local setpoints and link state are turned away."""
+
+    class Remote:
+        num_drones = 1
+
+    with pytest.raises(AssertionError):
+        sequences.takeoff(Remote())
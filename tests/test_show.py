@@ -0,0 +1,51 @@
+"""Binary show files."""
+import numpy as np
+import pytest
+
+from CrazyFlyt import Show
+
+
+@pytest.fixture
+def show():
+    """Two drones circling for two seconds."""
+    return Show.from_function(
+        lambda t: np.array(
+            [[np.cos(t), np.sin(t), 1.0, 0.0], [-np.cos(t), -np.sin(t), 1.5, 0.0]]
+        ),
+        duration=2.0,
+        rate_hz=25.0,
+    )
+
+
+def test_save_and_load(show, tmp_path):
+    """A saved show loads back memory mapped with the same frames."""
+    path = str(tmp_path / "circle.cfshow")
+    show.save(path)
+    loaded = Show.load(path)
+
+    assert isinstance(loaded.data, np.memmap)
+    assert loaded.rate_hz == show.rate_hz
+    assert (loaded.num_frames, loaded.num_drones) == (show.num_frames, show.num_drones)
+    np.testing.assert_array_equal(loaded.frames, show.frames)
+    np.testing.assert_allclose(
+        loaded.frame(0), [[1.0, 0.0, 1.0, 0.0], [-1.0, 0.0, 1.5, 0.0]], atol=1e-3
+    )
+
+
+def test_corruption_fails_the_checksum(show, tmp_path):
+    """Flipping a byte of the frame data is caught on load."""
+    path = tmp_path / "circle.cfshow"
+    show.save(str(path))
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(AssertionError):
+        Show.load(str(path))
+    Show.load(str(path), verify=False)
+
+
+def test_simulate_accepts_render(show):
+    """Passing `render` through to the simulator does not clash with the headless default."""
+    result = show.simulate(settle=1.0, render=False)
+    assert set(result) == {"separation", "tracking"}
@@ -0,0 +1,53 @@
+"""Point mass simulator behaviour."""
+import numpy as np
+
+from CrazyFlyt import RelativeFormation
+
+
+def test_reshuffle_permutes_drones(point_mass, line_states):
+    """Reshuffling assigns every target to the nearest drone and reorders the drones to match."""
+    targets = line_states[[2, 0, 1]].copy()
+    targets[:, 2] = 1.0
+
+    cost = point_mass.reshuffle(targets)
+
+    np.testing.assert_allclose(cost, 1.0)
+    np.testing.assert_allclose(
+        point_mass.position_estimate[:, :2], targets[:, :2], atol=1e-6
+    )
+
+    point_mass.arm([True] * point_mass.num_drones)
+    point_mass.sleep(4.0)
+    np.testing.assert_allclose(
+        point_mass.position_estimate[:, :3], targets[:, :3], atol=0.1
+    )
+
+
+def test_profiling_twice_does_not_double_count(point_mass):
+    """Enabling profiling again wraps the original step phases, not the previous wrappers."""
+    point_mass.enable_profiling()
+    point_mass.sleep(0.5)
+    first = point_mass.profiler.summary()
+
+    point_mass.enable_profiling()
+    point_mass.sleep(0.5)
+    second = point_mass.profiler.summary()
+
+    assert second["control"]["count"] == first["control"]["count"]
+    assert second["physics"]["count"] == first["physics"]["count"]
+
+
+def test_reshuffle_keeps_formation_slots(point_mass, line_states):
+    """A held formation is reordered with the drones, so every drone keeps flying to its own slot."""
+    slots = line_states[[2, 1, 0]].copy()
+    slots[:, 2] = 1.0
+    point_mass.set_formation(RelativeFormation.from_positions(slots))
+    point_mass.sleep(0.1)
+    before = np.array(point_mass.setpoints)
+
+    targets = line_states[[2, 0, 1]].copy()
+    point_mass.reshuffle(targets)
+
+    np.testing.assert_allclose(point_mass.setpoints, before[[2, 0, 1]], atol=1e-9)
+    point_mass.sleep(0.1)
+    np.testing.assert_allclose(point_mass.setpoints, before[[2, 0, 1]], atol=1e-9)
@@ -0,0 +1,53 @@
+"""Seqlock protected shared memory state bus."""
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+from CrazyFlyt import StateBus
+
+
+@pytest.fixture
+def bus():
+    """A fresh bus for three drones."""
+    bus = StateBus(f"cftest_{os.getpid()}_{uuid.uuid4().hex[:8]}", 3)
+    yield bus
+    bus.close()
+
+
+def test_publish_and_read(bus):
+    """Readers see the last publish and the sequence counts completed publishes."""
+    states = np.arange(12.0).reshape(3, 4)
+    setpoints = -states
+    bus.publish(states, setpoints, 1.5)
+
+    reader = StateBus(bus.shm.name)
+    try:
+        read_states, read_setpoints, timestamp = reader.read()
+    finally:
+        reader.close()
+
+    np.testing.assert_array_equal(read_states, states)
+    np.testing.assert_array_equal(read_setpoints, setpoints)
+    assert timestamp == 1.5
+    assert bus.sequence == 2
+
+
+def test_in_place_publish(bus):
+    """Rows written between begin and commit are published together."""
+    bus.begin(2.0)
+    assert bus.sequence % 2 == 1
+    bus.states[1] = 7.0
+    bus.commit()
+
+    states, _, timestamp = bus.read()
+    np.testing.assert_array_equal(states[1], 7.0)
+    assert timestamp == 2.0
+
+
+def test_read_times_out_on_an_open_publish(bus):
+    """A publisher that died midway makes reads fail instead of hang."""
+    bus.begin(3.0)
+    with pytest.raises(TimeoutError):
+        bus.read(timeout=0.05)
@@ -0,0 +1,35 @@
+"""Trajectory fitting and its layout in the onboard trajectory memory."""
+import struct
+
+import numpy as np
+
+from CrazyFlyt import Trajectory
+from CrazyFlyt.drone_controller import poly4d_pieces
+
+
+def test_waypoints_are_hit():
+    """The fitted polynomials pass through every waypoint."""
+    times = np.array([0.0, 1.0, 2.5, 4.0])
+    waypoints = np.random.default_rng(0).uniform(-1.0, 1.0, (2, len(times), 4))
+    trajectory = Trajectory.from_waypoints(times, waypoints)
+
+    assert trajectory.num_drones == 2
+    assert trajectory.num_pieces == 3
+    for k, t in enumerate(times):
+        np.testing.assert_allclose(trajectory.evaluate(t), waypoints[:, k], atol=1e-9)
+
+
+def test_poly4d_packing():
+    """Each piece packs into 132 bytes as x, y, z and yaw coefficients followed by the duration."""
+    coefficients = np.arange(2 * 4 * 8, dtype=np.float64).reshape(2, 4, 8)
+    durations = np.array([0.5, 1.5])
+    pieces = poly4d_pieces(durations, coefficients)
+
+    data = b"".join(piece.pack() for piece in pieces)
+    assert len(data) == 132 * len(pieces)
+    assert Trajectory.max_pieces * 132 <= 4096
+
+    for i, duration in enumerate(durations):
+        values = struct.unpack_from("<33f", data, 132 * i)
+        np.testing.assert_allclose(values[:32], coefficients[i].ravel())
+        assert values[32] == duration